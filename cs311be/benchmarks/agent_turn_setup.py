@@ -0,0 +1,103 @@
+"""
+Per-turn setup cost of the interview agent: rebuilding the FunctionTools and the
+FunctionAgent on every /chat/chatDomain call versus reusing the ones built at startup.
+
+Setup only, no LLM calls, so the numbers are the same for any backend. With --turns N
+it also runs N full agent turns against the offline backend both ways.
+
+    cd cs311be
+    LLM_BACKEND=offline python -m benchmarks.agent_turn_setup --iterations 2000 --turns 50
+"""
+import os
+import time
+import asyncio
+import argparse
+import statistics
+
+os.environ.setdefault("LLM_BACKEND", "offline")
+os.environ.setdefault("AGENT_LOG_TOOL_CALLS", "0")
+
+from llama_index.core.agent.workflow import FunctionAgent
+from llama_index.core.memory import ChatMemoryBuffer
+from src.engines.llm_engine import LLMEngine
+from src.services.chatbot_tools import ChatbotTools
+from src.engines.chatbot_agent import Agent
+from src.prompts.prompt import system_prompt
+
+
+def _tools_without_stores() -> ChatbotTools:
+    # get_tools only wraps bound methods; skip the vector store and Mongo setup
+    tools = ChatbotTools.__new__(ChatbotTools)
+    tools._tools = None
+    return tools
+
+
+def per_turn_setup(tools: ChatbotTools, llm) -> FunctionAgent:
+    """What handle_query used to do on every turn."""
+    return FunctionAgent(name="qa_agent", tools=tools._build_tools(), system_prompt=system_prompt, llm=llm)
+
+
+def reused_setup(agent: FunctionAgent, tools: ChatbotTools) -> FunctionAgent:
+    tools.get_tools()
+    return agent
+
+
+def _time(fn, iterations: int):
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1e6)
+    samples.sort()
+    return statistics.mean(samples), samples[len(samples) // 2], samples[int(len(samples) * 0.99)]
+
+
+async def _turn(agent: Agent, i: int, rebuild: bool):
+    memory = ChatMemoryBuffer.from_defaults(token_limit=4000)
+    if rebuild:
+        await per_turn_setup(agent.tools, agent.llm).run(f"Xin chào {i}", memory=memory)
+    else:
+        await agent.handle_query(f"Xin chào {i}", memory)
+
+
+async def _turns(agent: Agent, turns: int):
+    """Mean ms per turn for (rebuild, reuse), interleaved after a warm-up so both see the same loop state."""
+    for i in range(5):
+        await _turn(agent, i, rebuild=True)
+        await _turn(agent, i, rebuild=False)
+    totals = {True: 0.0, False: 0.0}
+    for i in range(turns):
+        for rebuild in (True, False):
+            started = time.perf_counter()
+            await _turn(agent, i, rebuild)
+            totals[rebuild] += (time.perf_counter() - started) * 1000
+    return totals[True] / turns, totals[False] / turns
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--turns", type=int, default=0, help="also run N offline agent turns each way")
+    args = parser.parse_args()
+
+    llm = LLMEngine().turn_llm
+    tools = _tools_without_stores()
+    agent = per_turn_setup(tools, llm)
+
+    for name, fn in (
+        ("rebuild tools + FunctionAgent", lambda: per_turn_setup(tools, llm)),
+        ("reuse (cached tools, shared agent)", lambda: reused_setup(agent, tools)),
+    ):
+        mean, p50, p99 = _time(fn, args.iterations)
+        print(f"{name:<36} mean {mean:9.1f} us   p50 {p50:9.1f} us   p99 {p99:9.1f} us")
+
+    if args.turns:
+        chat_agent = Agent.__new__(Agent)
+        chat_agent.llm, chat_agent.tools, chat_agent.system_prompt, chat_agent.handlers = llm, tools, system_prompt, []
+        chat_agent.agent = agent
+        rebuild_ms, reuse_ms = asyncio.run(_turns(chat_agent, args.turns))
+        print(f"{'full offline turn, rebuild':<36} mean {rebuild_ms:9.2f} ms")
+        print(f"{'full offline turn, reuse':<36} mean {reuse_ms:9.2f} ms")
+
+if __name__ == "__main__":
+    main()
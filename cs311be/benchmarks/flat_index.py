@@ -0,0 +1,154 @@
+"""
+Retrieval latency and per-worker memory of the question bank served from Chroma
+(VectorIndexRetriever over the persistent collection) versus the memory-mapped flat
+export (FlatIndexRetriever).
+
+Builds a throwaway Chroma collection from the src/data banks (offline hashed embeddings,
+optionally grown with --scale perturbed copies), exports it with
+VectorStoreManager.export_flat, then starts --workers processes per backend. Each one
+loads its backend, runs the same queries, and reports p50/p99 latency plus how much its
+RSS and PSS (RSS with shared pages split between the processes mapping them) grew.
+
+    cd cs311be
+    LLM_BACKEND=offline python -m benchmarks.flat_index --workers 4 --queries 500 --scale 4
+"""
+import os
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+import multiprocessing as mp
+
+os.environ.setdefault("LLM_BACKEND", "offline")
+
+from typing import Dict
+import numpy as np
+from src.engines.flat_index import VECTORS_FILE, export_path
+
+TOP_K = 10
+
+
+def _memory_kb() -> Dict[str, int]:
+    """Rss / Pss / Private of this process from /proc (Linux)."""
+    values = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if parts[0].rstrip(":") in ("Rss", "Pss", "Private_Clean", "Private_Dirty"):
+                values[parts[0].rstrip(":")] = int(parts[1])
+    values["Private"] = values.pop("Private_Clean", 0) + values.pop("Private_Dirty", 0)
+    return values
+
+
+def _worker(backend: str, chroma_path: str, flat_dir: str, queries_path: str, barrier, results):
+    from llama_index.core import VectorStoreIndex
+    from llama_index.core.embeddings import MockEmbedding
+    from llama_index.core.retrievers import VectorIndexRetriever
+    from llama_index.core.schema import QueryBundle
+    from src.engines.flat_index import FlatIndex, FlatIndexRetriever
+
+    queries = np.load(queries_path)
+    embed_model = MockEmbedding(embed_dim=queries.shape[1])
+    before = _memory_kb()
+    started = time.perf_counter()
+    if backend == "chroma":
+        import chromadb
+        from llama_index.vector_stores.chroma import ChromaVectorStore
+        collection = chromadb.PersistentClient(path=chroma_path).get_collection("question_collection")
+        index = VectorStoreIndex.from_vector_store(ChromaVectorStore(chroma_collection=collection), embed_model=embed_model)
+        retriever = VectorIndexRetriever(index=index, similarity_top_k=TOP_K, embed_model=embed_model)
+    else:
+        retriever = FlatIndexRetriever(FlatIndex(flat_dir), embed_model, similarity_top_k=TOP_K)
+    bundles = [QueryBundle(query_str="", embedding=q.tolist()) for q in queries]
+    first = retriever.retrieve(bundles[0])
+    cold_ms = (time.perf_counter() - started) * 1000
+    latencies = []
+    for bundle in bundles:
+        t = time.perf_counter()
+        retriever.retrieve(bundle)
+        latencies.append((time.perf_counter() - t) * 1000)
+    # Measure while every worker of this backend has its index mapped
+    barrier.wait()
+    after = _memory_kb()
+    barrier.wait()
+    results.put({
+        "cold_ms": cold_ms,
+        "latencies": latencies,
+        "top": [n.node.get_content() for n in first],
+        **{f"{key}_mb": (after[key] - before[key]) / 1024 for key in ("Rss", "Pss", "Private")},
+    })
+
+
+def _build(workdir: str, scale: int):
+    import chromadb
+    from src.engines.offline_backend import hashed_embedding
+    from src.engines.question_bank import load_question_nodes
+    from src.engines.vector_store import VectorStoreManager
+
+    nodes = load_question_nodes()
+    base = np.asarray([hashed_embedding(node.text) for node in nodes], dtype=np.float32)
+    rng = np.random.default_rng(0)
+    ids, texts, metadatas, vectors = [], [], [], []
+    for copy in range(scale):
+        noise = 0 if copy == 0 else rng.normal(0, 0.05, base.shape).astype(np.float32)
+        suffix = "" if copy == 0 else f" [{copy}]"
+        for node, vector in zip(nodes, base + noise):
+            ids.append(f"{node.node_id}{suffix}")
+            texts.append(node.text + suffix)
+            metadatas.append({k: v for k, v in node.metadata.items() if k != "answer"})
+            vectors.append(vector)
+    chroma_path = os.path.join(workdir, "chroma")
+    collection = chromadb.PersistentClient(path=chroma_path).get_or_create_collection("question_collection")
+    for start in range(0, len(ids), 4000):
+        end = start + 4000
+        collection.add(ids=ids[start:end], documents=texts[start:end], metadatas=metadatas[start:end], embeddings=vectors[start:end])
+    flat_dir = os.path.join(workdir, "flat")
+    VectorStoreManager(path=chroma_path).export_flat("question_collection", flat_dir)
+    queries = np.asarray([hashed_embedding(node.text.split("?")[0][:40]) for node in nodes], dtype=np.float32)
+    return chroma_path, flat_dir, queries, len(ids)
+
+
+def main(args):
+    workdir = tempfile.mkdtemp(prefix="flat_index_bench_")
+    try:
+        started = time.perf_counter()
+        chroma_path, flat_dir, queries, count = _build(workdir, args.scale)
+        rng = np.random.default_rng(1)
+        queries = queries[rng.choice(len(queries), size=min(args.queries, len(queries)), replace=False)]
+        queries_path = os.path.join(workdir, "queries.npy")
+        np.save(queries_path, queries)
+        flat_mb = os.path.getsize(os.path.join(export_path(flat_dir), VECTORS_FILE)) / 2**20
+        print(f"{count} vectors x {queries.shape[1]} dims (flat file {flat_mb:.1f} MB), built in {time.perf_counter() - started:.1f} s; "
+              f"{args.workers} workers x {len(queries)} queries, top_k {TOP_K}\n")
+
+        ctx = mp.get_context("spawn")
+        tops = {}
+        for backend in ("chroma", "flat"):
+            barrier, results = ctx.Barrier(args.workers), ctx.Queue()
+            workers = [ctx.Process(target=_worker, args=(backend, chroma_path, flat_dir, queries_path, barrier, results)) for _ in range(args.workers)]
+            for w in workers:
+                w.start()
+            reports = [results.get() for _ in workers]
+            for w in workers:
+                w.join()
+            latencies = [ms for r in reports for ms in r["latencies"]]
+            tops[backend] = reports[0]["top"]
+            print(
+                f"{backend:<7} p50 {statistics.median(latencies):7.3f} ms   p99 {np.percentile(latencies, 99):7.3f} ms   "
+                f"cold {statistics.mean(r['cold_ms'] for r in reports):7.1f} ms   per worker: "
+                f"RSS +{statistics.mean(r['Rss_mb'] for r in reports):6.1f} MB   PSS +{statistics.mean(r['Pss_mb'] for r in reports):6.1f} MB   "
+                f"private +{statistics.mean(r['Private_mb'] for r in reports):6.1f} MB"
+            )
+        overlap = len(set(tops["chroma"]) & set(tops["flat"]))
+        print(f"\nfirst query top-{TOP_K} overlap (HNSW vs exact): {overlap}/{TOP_K}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--scale", type=int, default=1, help="Copies of the bank (with perturbed vectors) to index")
+    main(parser.parse_args())
@@ -0,0 +1,96 @@
+"""
+First-stage recall and latency of dense, BM25 and hybrid (RRF) retrieval over the
+src/data question banks.
+
+Each sampled question is looked up with a short keyword-style query made of its rarest
+terms, as _generate_keywords produces them, and once more with the diacritics dropped.
+Recall@k is the share of queries whose question comes back in the top k.
+
+    cd cs311be
+    LLM_BACKEND=offline python -m benchmarks.hybrid_retrieval --sample 300
+"""
+import os
+import time
+import random
+import asyncio
+import argparse
+import statistics
+
+os.environ.setdefault("LLM_BACKEND", "offline")
+
+from typing import List
+import numpy as np
+from llama_index.core import VectorStoreIndex
+from llama_index.core.retrievers import VectorIndexRetriever
+from llama_index.core.schema import QueryBundle
+from src.engines.embedding_service import get_embedding_service
+from src.engines.lexical_index import HybridRetriever, LexicalIndex, STOPWORDS, fold_diacritics, tokenize
+from src.engines.llm_engine import LLMEngine
+from src.engines.question_bank import load_question_nodes
+
+
+def keyword_query(text: str, document_frequency, terms: int) -> str:
+    """The `terms` rarest syllables of a question, in their original order."""
+    tokens = [t for t in dict.fromkeys(tokenize(text)) if t not in STOPWORDS and len(t) > 1]
+    rarest = set(sorted(tokens, key=lambda t: document_frequency.get(t, 0))[:terms])
+    return " ".join(t for t in tokens if t in rarest)
+
+
+def _percentile(samples: List[float], q: float) -> float:
+    return float(np.percentile(samples, q)) if samples else 0.0
+
+
+async def main(args):
+    engine = LLMEngine()
+    nodes = load_question_nodes()
+    started = time.perf_counter()
+    index = VectorStoreIndex(nodes=nodes, embed_model=engine.embed_model)
+    dense_ms = (time.perf_counter() - started) * 1000
+    lexical = LexicalIndex(nodes)
+    print(f"{len(nodes)} questions; dense index {dense_ms:.0f} ms, lexical index {lexical.build_ms:.0f} ms ({lexical.stats()['terms']} terms)\n")
+
+    document_frequency = {}
+    for node in nodes:
+        for token in set(tokenize(node.text)):
+            document_frequency[token] = document_frequency.get(token, 0) + 1
+    random.seed(args.seed)
+    sample = random.sample(nodes, min(args.sample, len(nodes)))
+
+    dense = VectorIndexRetriever(index=index, similarity_top_k=args.top_k)
+    hybrid = HybridRetriever(dense, lexical, top_k=args.top_k)
+    embedding_service = get_embedding_service(engine.embed_model)
+
+    for label, fold in (("keywords", False), ("keywords, no diacritics", True)):
+        queries = [keyword_query(node.text, document_frequency, args.terms) for node in sample]
+        if fold:
+            queries = [fold_diacritics(q) for q in queries]
+        vectors = await embedding_service.embed_many(queries)
+        bundles = [QueryBundle(query_str=q, embedding=v) for q, v in zip(queries, vectors)]
+        hits = {"dense": 0, "bm25": 0, "hybrid": 0}
+        latency = {"dense": [], "bm25": [], "hybrid": []}
+        for node, query, bundle in zip(sample, queries, bundles):
+            for name, run in (
+                ("dense", lambda: dense.retrieve(bundle)),
+                ("bm25", lambda: lexical.search(query, args.top_k)),
+                ("hybrid", lambda: hybrid.retrieve(bundle)),
+            ):
+                t = time.perf_counter()
+                results = run()
+                latency[name].append((time.perf_counter() - t) * 1000)
+                hits[name] += any(r.node.get_content().strip() == node.text.strip() for r in results)
+        print(f"{label} ({len(sample)} queries, e.g. '{queries[0]}'):")
+        for name in hits:
+            print(
+                f"  {name:<7} recall@{args.top_k} {hits[name] / len(sample):6.1%}   "
+                f"p50 {statistics.median(latency[name]):7.3f} ms   p99 {_percentile(latency[name], 99):7.3f} ms"
+            )
+        print()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sample", type=int, default=300)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--terms", type=int, default=3, help="Syllables per keyword query")
+    parser.add_argument("--seed", type=int, default=7)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,149 @@
+"""
+Question selection at interview start: the LLM rerank (one batched call, or one call per
+keyword) versus the local embedding rerank (cosine to CV/JD + MMR, no LLM call), on the
+question banks in src/data/*.csv.
+
+For every profile the keywords are retrieved once and both selectors rank the same
+candidate sets. Reported: selection time, LLM calls, how often the local pick is the
+LLM's pick (top-1) or within the local top 3, and near-duplicate picks (cosine >= 0.9).
+
+With the offline backend the LLM picks are not judgements, so agreement is only
+meaningful with LLM_BACKEND pointing at a real model:
+
+    cd cs311be
+    LLM_BACKEND=offline python -m benchmarks.local_rerank --runs 3
+    python -m benchmarks.local_rerank --per-keyword
+"""
+import os
+import time
+import asyncio
+import argparse
+import statistics
+
+os.environ.setdefault("LLM_BACKEND", "offline")
+
+from typing import Any, List
+import numpy as np
+from llama_index.core import VectorStoreIndex
+from llama_index.core.retrievers import VectorIndexRetriever
+from src.engines.local_rerank import normalize_rows
+from src.engines.question_bank import DATA_DIR, load_question_nodes
+from src.engines.llm_telemetry import get_llm_telemetry
+from benchmarks.start_interview import _NoStorage
+from src.engines.llm_engine import LLMEngine
+from src.engines.embedding_service import get_embedding_service
+from src.services.chatbot_tools import ChatbotTools
+
+PROFILES = [
+    {
+        "user_project": "Xây dựng REST API với FastAPI và PostgreSQL, cache Redis, triển khai Docker trên AWS, viết unit test với pytest.",
+        "job_description": "Backend engineer: Python, thiết kế API, cơ sở dữ liệu SQL, tối ưu truy vấn, CI/CD.",
+        "keywords": ["REST API", "SQL index", "Redis cache", "Docker", "unit test", "CI/CD", "transaction", "ORM"],
+    },
+    {
+        "user_project": "Huấn luyện mô hình phân loại văn bản tiếng Việt với PyTorch và transformer, đánh giá bằng F1, triển khai mô hình qua API.",
+        "job_description": "AI engineer: deep learning, NLP, xử lý dữ liệu, đưa mô hình học máy lên production.",
+        "keywords": ["transformer", "overfitting", "gradient descent", "NLP tokenization", "precision recall", "CNN", "embedding", "regularization"],
+    },
+    {
+        "user_project": "Xây dựng giao diện React với TypeScript, quản lý state bằng Redux, tối ưu hiệu năng render.",
+        "job_description": "Frontend developer: JavaScript, React, TypeScript, CSS, hiệu năng trình duyệt.",
+        "keywords": ["React hooks", "virtual DOM", "closure JavaScript", "TypeScript generic", "CSS flexbox", "Redux", "event loop", "promise"],
+    },
+]
+
+
+def _tools(retriever: VectorIndexRetriever, engine: LLMEngine) -> ChatbotTools:
+    tools = ChatbotTools.__new__(ChatbotTools)
+    tools.engine = engine
+    tools.llm = engine.openai_llm
+    tools.embed_model = engine.embed_model
+    tools.embedding_service = get_embedding_service(tools.embed_model)
+    tools.interview_storage = _NoStorage()
+    tools._tools = None
+    tools.qa_retriever = retriever
+    tools._get_retriever_by_source = lambda source=None: retriever
+    return tools
+
+
+async def _candidates(tools: ChatbotTools, retriever, keywords: List[str]):
+    queries = await tools._embed_queries(keywords)
+    candidate_sets = await asyncio.gather(*(tools._retrieve_candidates(q, kw, retriever) for q, kw in zip(queries, keywords)))
+    return queries, list(candidate_sets)
+
+
+async def _llm_picks(tools: ChatbotTools, keywords, candidate_sets, profile, per_keyword: bool):
+    selections = None
+    if not per_keyword:
+        selections = await tools._select_nodes_batch(keywords, candidate_sets, profile["user_project"], profile["job_description"])
+    if selections is None:
+        selections = await asyncio.gather(*(
+            tools._select_node_index(nodes, profile["user_project"], profile["job_description"], {}) for nodes in candidate_sets
+        ))
+    return list(selections)
+
+
+def _near_duplicates(picked_vectors: List[Any], threshold: float = 0.9) -> int:
+    if len(picked_vectors) < 2:
+        return 0
+    matrix = normalize_rows(picked_vectors)
+    similarity = matrix @ matrix.T
+    return int((np.triu(similarity, k=1) >= threshold).sum())
+
+
+async def main(args):
+    engine = LLMEngine()
+    nodes = load_question_nodes()
+    started = time.perf_counter()
+    index = VectorStoreIndex(nodes=nodes, embed_model=engine.embed_model)
+    retriever = VectorIndexRetriever(index=index, similarity_top_k=args.top_k)
+    print(f"{len(nodes)} questions from {DATA_DIR} indexed in {(time.perf_counter() - started) * 1000:.0f} ms, top_k {args.top_k}\n")
+
+    tools = _tools(retriever, engine)
+    telemetry = get_llm_telemetry()
+    timings = {"llm": [], "local": []}
+    calls = {"llm": 0, "local": 0}
+    keywords_total = top1 = top3 = 0
+    duplicates = {"llm": 0, "local": 0}
+    for profile in PROFILES:
+        keywords = profile["keywords"]
+        queries, candidate_sets = await _candidates(tools, retriever, keywords)
+        vectors = await tools._candidate_vectors([n for nodes in candidate_sets for n in nodes], retriever)
+        for _ in range(args.runs):
+            telemetry.reset()
+            t = time.perf_counter()
+            llm = await _llm_picks(tools, keywords, candidate_sets, profile, args.per_keyword)
+            timings["llm"].append((time.perf_counter() - t) * 1000)
+            calls["llm"] += telemetry.stats()["totals"]["calls"]
+
+            telemetry.reset()
+            t = time.perf_counter()
+            orders = await tools._select_nodes_local(keywords, queries, candidate_sets, profile["user_project"], profile["job_description"], retriever)
+            timings["local"].append((time.perf_counter() - t) * 1000)
+            calls["local"] += telemetry.stats()["totals"]["calls"]
+
+        for nodes, llm_pick, order in zip(candidate_sets, llm, orders):
+            if not nodes or llm_pick is None:
+                continue
+            keywords_total += 1
+            top1 += order[0] == llm_pick
+            top3 += llm_pick in order[:3]
+        duplicates["llm"] += _near_duplicates([vectors[nodes[i].text.strip()] for nodes, i in zip(candidate_sets, llm) if nodes and i is not None])
+        duplicates["local"] += _near_duplicates([vectors[nodes[order[0]].text.strip()] for nodes, order in zip(candidate_sets, orders) if nodes])
+
+    runs = len(PROFILES) * args.runs
+    mode = "per-keyword" if args.per_keyword else "batched"
+    for name, label in (("llm", f"LLM ({mode})"), ("local", "local MMR")):
+        print(
+            f"{label:<20} mean {statistics.mean(timings[name]):8.2f} ms   best {min(timings[name]):8.2f} ms   "
+            f"LLM calls/start {calls[name] / runs:4.1f}   near-duplicate picks {duplicates[name]}"
+        )
+    print(f"\nagreement over {keywords_total} keywords: top-1 {top1 / max(1, keywords_total):.0%}   LLM pick in local top-3 {top3 / max(1, keywords_total):.0%}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--per-keyword", action="store_true", help="Compare against one LLM rerank call per keyword")
+    asyncio.run(main(parser.parse_args()))
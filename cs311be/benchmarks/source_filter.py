@@ -0,0 +1,136 @@
+"""
+Latency and candidate-set precision of source-scoped retrieval over the src/data banks,
+as the collection grows bank by bank.
+
+At each step a throwaway Chroma collection (offline hashed embeddings) holds the first
+N banks in a shuffled order, and is exported as a flat index. Each sampled question is
+looked up with a keyword query made of its rarest terms, once over the whole collection
+and once filtered to the banks resolve_sources() picks for the question's own source:
+on Chroma with its where-filter ("chroma-where"), through the manager's cached
+partition of the matching rows ("chroma"), and on the flat export ("flat").
+Precision@k is the share of the top k that comes from those banks; hit@k the share of
+queries whose question is in the top k.
+
+    cd cs311be
+    LLM_BACKEND=offline python -m benchmarks.source_filter --steps 4 --sample 200
+"""
+import os
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import statistics
+
+os.environ.setdefault("LLM_BACKEND", "offline")
+
+from collections import defaultdict
+import numpy as np
+from llama_index.core.embeddings import MockEmbedding
+from llama_index.core.retrievers import VectorIndexRetriever
+from llama_index.core.schema import QueryBundle
+from benchmarks.hybrid_retrieval import keyword_query
+from src.engines.flat_index import FlatIndex, FlatIndexRetriever
+from src.engines.lexical_index import tokenize
+from src.engines.offline_backend import hashed_embedding
+from src.engines.question_bank import load_question_nodes, resolve_sources
+from src.engines.vector_store import VectorStoreManager, metadata_filters
+
+COLLECTION = "question_collection"
+
+
+def _build(workdir: str, nodes, vectors):
+    manager = VectorStoreManager(path=os.path.join(workdir, "chroma"))
+    collection = manager.collection(COLLECTION)
+    for start in range(0, len(nodes), 4000):
+        batch = nodes[start:start + 4000]
+        collection.add(
+            ids=[n.node_id for n in batch],
+            documents=[n.text for n in batch],
+            metadatas=[{k: v for k, v in n.metadata.items() if k != "answer"} for n in batch],
+            embeddings=vectors[start:start + 4000],
+        )
+    flat_dir = os.path.join(workdir, "flat")
+    manager.export_flat(COLLECTION, flat_dir)
+    return manager, FlatIndex(flat_dir)
+
+
+def _run(retriever, bundles, targets, relevant, top_k):
+    latencies, precision, hits = [], [], 0
+    for bundle, target, allowed in zip(bundles, targets, relevant):
+        t = time.perf_counter()
+        results = retriever(bundle, allowed)
+        latencies.append((time.perf_counter() - t) * 1000)
+        precision.append(sum(r.node.metadata.get("source") in allowed for r in results) / top_k)
+        hits += any(r.node.node_id == target for r in results)
+    return latencies, statistics.mean(precision), hits / len(bundles)
+
+
+def main(args):
+    all_nodes = load_question_nodes()
+    by_source = defaultdict(list)
+    for node in all_nodes:
+        by_source[node.metadata["source"]].append(node)
+    banks = sorted(by_source)
+    random.seed(args.seed)
+    random.shuffle(banks)
+    vectors = {node.node_id: hashed_embedding(node.text) for node in all_nodes}
+    embed_model = MockEmbedding(embed_dim=len(next(iter(vectors.values()))))
+    document_frequency = defaultdict(int)
+    for node in all_nodes:
+        for token in set(tokenize(node.text)):
+            document_frequency[token] += 1
+    print(f"{len(all_nodes)} questions in {len(banks)} banks; top_k {args.top_k}, {args.sample} queries per step\n")
+    print(f"{'banks':>5} {'vectors':>7}  {'backend':<12} {'scope':<8} {'p50 ms':>8} {'p99 ms':>8} {'prec@k':>7} {'hit@k':>6}  {'scope size':>10}")
+
+    for step in range(1, args.steps + 1):
+        included = banks[:max(1, round(len(banks) * step / args.steps))]
+        nodes = [node for bank in included for node in by_source[bank]]
+        relevant_of = {bank: set(resolve_sources(bank, included) or [bank]) for bank in included}
+        sample = random.Random(args.seed + step).sample(nodes, min(args.sample, len(nodes)))
+        queries = [keyword_query(node.text, document_frequency, args.terms) or node.text for node in sample]
+        bundles = [QueryBundle(query_str=q, embedding=hashed_embedding(q)) for q in queries]
+        targets = [node.node_id for node in sample]
+        relevant = [relevant_of[node.metadata["source"]] for node in sample]
+        scope = statistics.mean(sum(len(by_source[b]) for b in allowed) for allowed in relevant)
+
+        workdir = tempfile.mkdtemp(prefix="source_filter_bench_")
+        try:
+            manager, flat = _build(workdir, nodes, [vectors[n.node_id] for n in nodes])
+            index = manager.index(COLLECTION, embed_model=embed_model)
+            runners = {
+                "chroma-where": lambda filters: VectorIndexRetriever(
+                    index=index, similarity_top_k=args.top_k, filters=metadata_filters(filters), embed_model=embed_model
+                ),
+                "chroma": lambda filters: manager.retriever(COLLECTION, top_k=args.top_k, filters=filters, embed_model=embed_model, path=manager.path),
+                "flat": lambda filters: FlatIndexRetriever(flat, embed_model, similarity_top_k=args.top_k, filters=filters),
+            }
+            for backend, make in runners.items():
+                # Unfiltered, "chroma" is the same search as "chroma-where"
+                for label, scoped in (("all", False), ("source", True)) if backend != "chroma" else (("source", True),):
+                    # Warm the per-filter caches (Chroma segments, flat row subsets) first
+                    for allowed in {frozenset(a) for a in relevant}:
+                        make({"source": sorted(allowed)} if scoped else None).retrieve(bundles[0])
+                    latencies, precision, hit = _run(
+                        lambda bundle, allowed: make({"source": sorted(allowed)} if scoped else None).retrieve(bundle),
+                        bundles, targets, relevant, args.top_k,
+                    )
+                    print(
+                        f"{len(included):>5} {len(nodes):>7}  {backend:<12} {label:<8} {statistics.median(latencies):8.2f} "
+                        f"{np.percentile(latencies, 99):8.2f} {precision:7.1%} {hit:6.1%}  {scope if scoped else len(nodes):10.0f}"
+                    )
+            partitions = manager.stats()["partitions"].values()
+            print(f"{'':>14}{len(partitions)} partitions cached, built in {statistics.mean(p['load_ms'] for p in partitions):.1f} ms on average")
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+        print()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--steps", type=int, default=4, help="Collection sizes, from 1/steps of the banks to all of them")
+    parser.add_argument("--sample", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--terms", type=int, default=3, help="Syllables per keyword query")
+    parser.add_argument("--seed", type=int, default=7)
+    main(parser.parse_args())
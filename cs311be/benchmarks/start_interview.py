@@ -0,0 +1,114 @@
+"""
+Wall-clock time and upstream calls/prompt tokens of ChatbotTools.start_interview: the
+previous keyword-by-keyword loop (retrieve, rerank, rewrite, one after the other) versus
+concurrent retrieval, one batched rerank and one batched rewrite
+(START_INTERVIEW_BATCH_RERANK=0 for the per-keyword rerank fallback).
+
+Runs against the offline backend and an in-memory index of synthetic questions, so only
+the orchestration differs; OFFLINE_LLM_LATENCY_MS sets the simulated round trip.
+
+    cd cs311be
+    LLM_BACKEND=offline OFFLINE_LLM_LATENCY_MS=400 python -m benchmarks.start_interview --number 10 --runs 3
+"""
+import os
+import time
+import asyncio
+import argparse
+import statistics
+
+os.environ.setdefault("LLM_BACKEND", "offline")
+
+from typing import Any, Dict
+from llama_index.core import VectorStoreIndex
+from llama_index.core.retrievers import VectorIndexRetriever
+from llama_index.core.schema import TextNode
+from src.engines.llm_engine import LLMEngine
+from src.engines.embedding_service import get_embedding_service
+from src.engines.llm_telemetry import get_llm_telemetry
+from src.services.chatbot_tools import ChatbotTools
+
+PLAN = "Chủ đề 1: Python backend (4 câu hỏi), Chủ đề 2: Machine Learning (3 câu hỏi), Chủ đề 3: System design (3 câu hỏi)"
+USER_PROJECT = "Xây dựng API FastAPI cho hệ thống gợi ý, huấn luyện mô hình phân loại văn bản với PyTorch, triển khai Docker và Kubernetes."
+JOB_DESCRIPTION = "Backend/AI engineer: Python, FastAPI, MongoDB, vector database, triển khai mô hình học máy lên production."
+TOPICS = ["FastAPI", "MongoDB", "Docker", "Kubernetes", "PyTorch", "vector database", "caching", "message queue", "CI/CD", "REST API"]
+ANGLES = ["Bạn sẽ tối ưu", "Hãy mô tả cách bạn triển khai", "Khi nào bạn chọn", "Làm sao để giám sát", "Bạn xử lý sự cố"]
+
+
+class _NoStorage:
+    def create_session(self, **kwargs):
+        pass
+
+
+def _tools() -> ChatbotTools:
+    # Skip the Chroma store and Mongo; everything else is the real code path
+    tools = ChatbotTools.__new__(ChatbotTools)
+    tools.engine = LLMEngine()
+    tools.llm = tools.engine.openai_llm
+    tools.embed_model = tools.engine.embed_model
+    tools.embedding_service = get_embedding_service(tools.embed_model)
+    tools.interview_storage = _NoStorage()
+    tools._tools = None
+    retriever = _retriever(tools.embed_model)
+    tools.qa_retriever = retriever
+    tools._get_retriever_by_source = lambda source=None: retriever
+    return tools
+
+
+def _retriever(embed_model) -> VectorIndexRetriever:
+    nodes = [
+        TextNode(text=f"{angle} {topic} trong dự án thực tế? ({i})", metadata={"source": "backend", "index": i})
+        for i, (topic, angle) in enumerate((t, a) for t in TOPICS for a in ANGLES)
+    ]
+    index = VectorStoreIndex(nodes=nodes, embed_model=embed_model)
+    return VectorIndexRetriever(index=index, similarity_top_k=10)
+
+
+async def sequential_start(tools: ChatbotTools, number: str) -> Dict[str, Any]:
+    """The start_interview loop before the fan-out: one keyword at a time."""
+    keywords = await tools._generate_keywords(PLAN, USER_PROJECT, JOB_DESCRIPTION, number)
+    retriever = tools._get_retriever_by_source()
+    queries = await tools._embed_queries(keywords)
+    collected: Dict[str, Dict[str, Any]] = {}
+    for i, kw in enumerate(keywords):
+        nodes = await retriever.aretrieve(queries[i])
+        if nodes:
+            node = await tools.re_rank_nodes(nodes, USER_PROJECT, JOB_DESCRIPTION, collected)
+            text_key = (node.text or "").strip()
+            if text_key and text_key not in collected:
+                collected[text_key] = {"text": node.text, "metadata": dict(node.metadata or {})}
+    return {"total_questions": len(collected)}
+
+
+async def concurrent_start(tools: ChatbotTools, number: str) -> Dict[str, Any]:
+    return await tools.start_interview(PLAN, "backend", "bench", USER_PROJECT, JOB_DESCRIPTION, number)
+
+
+async def _time(fn, tools, number: str, runs: int):
+    samples, questions = [], 0
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = await fn(tools, number)
+        samples.append((time.perf_counter() - started) * 1000)
+        questions = result.get("total_questions", 0)
+    return statistics.mean(samples), min(samples), questions
+
+
+async def main(args):
+    tools = _tools()
+    print(f"{args.number} keywords, {args.runs} runs, offline LLM latency {os.getenv('OFFLINE_LLM_LATENCY_MS', '50')} ms\n")
+    telemetry = get_llm_telemetry()
+    for name, fn in (("sequential", sequential_start), ("concurrent", concurrent_start)):
+        telemetry.reset()
+        mean_ms, best_ms, questions = await _time(fn, tools, args.number, args.runs)
+        totals = telemetry.stats()["totals"]
+        print(
+            f"{name:<11} mean {mean_ms:8.1f} ms   best {best_ms:8.1f} ms   questions {questions}   "
+            f"LLM calls/run {totals['calls'] / args.runs:5.1f}   prompt tokens/run {totals['prompt_tokens'] / args.runs:8.0f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", default="10", help="Questions (keywords) per interview")
+    parser.add_argument("--runs", type=int, default=3)
+    asyncio.run(main(parser.parse_args()))
@@ -1,3 +1,4 @@
+import asyncio
 import uvicorn
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
@@ -6,11 +7,14 @@ from fastapi.responses import JSONResponse
 from fastapi import status, Request
 
 from src.routers.mock_agent_router import router as mock_agent_router
+from src.engines.llm_clients import get_client_registry
+from src.engines.vector_store import HYBRID_RETRIEVAL, get_vector_store_manager
 
 from src.routers import (
     chatbot_router,
     resume_router,
-    db_router
+    db_router,
+    metrics_router
 )
 app = FastAPI()
 
@@ -29,11 +33,29 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
     content = {'status_code': 422, 'detail': exc_str, 'headers': None}
     return JSONResponse(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, content=content)
 
+@app.on_event("startup")
+async def build_lexical_index():
+    # Built off the event loop so the first interview does not pay for it
+    if HYBRID_RETRIEVAL:
+        future = asyncio.get_running_loop().run_in_executor(None, get_vector_store_manager().lexical_index)
+        future.add_done_callback(_log_lexical_index_failure)
+        app.state.lexical_index_build = future
+
+def _log_lexical_index_failure(future):
+    if not future.cancelled() and future.exception() is not None:
+        # The first hybrid retrieval builds it again
+        print(f"[main] Lexical index warm-up failed: {future.exception()!r}")
+
+@app.on_event("shutdown")
+async def close_llm_clients():
+    await get_client_registry().aclose()
+
 # Include routers
 app.include_router(chatbot_router)
 app.include_router(resume_router)
 app.include_router(db_router)
 app.include_router(mock_agent_router)
+app.include_router(metrics_router)
 if __name__ == "__main__":
     uvicorn.run(
         "main:app",
@@ -0,0 +1,123 @@
+import os
+import time
+import threading
+from functools import lru_cache
+from typing import Any, Dict, Optional
+from dotenv import load_dotenv
+from llama_index.core.agent.workflow.workflow_events import (
+    AgentOutput,
+    AgentStream,
+    ToolCall,
+    ToolCallResult,
+)
+from src.engines.llm_telemetry import Histogram
+load_dotenv()
+
+# Print every tool call and result of an agent turn (the previous default behaviour)
+AGENT_LOG_TOOL_CALLS = os.getenv("AGENT_LOG_TOOL_CALLS", "1").lower() in ("1", "true", "yes")
+
+
+class AgentTurn:
+    """Per-turn state shared by the handlers of one agent run."""
+
+    def __init__(self, query: str):
+        self.query = query
+        self.started = time.monotonic()
+        self.first_delta_at: Optional[float] = None
+        self.tool_started: Dict[str, float] = {}
+        self.llm_steps = 0
+        self.tool_calls = 0
+        self.response: Any = None
+        self.error: Optional[BaseException] = None
+
+    @property
+    def elapsed_ms(self) -> float:
+        return (time.monotonic() - self.started) * 1000
+
+
+class AgentEventHandler:
+    """
+    Hook into an agent turn. Agent.run_turn calls on_start once, on_event for every
+    workflow event in order, then on_finish with the final response or the error.
+    Handlers are shared across concurrent turns, so keep per-turn state on the turn.
+    """
+
+    async def on_start(self, turn: AgentTurn):
+        pass
+
+    async def on_event(self, turn: AgentTurn, event: Any):
+        pass
+
+    async def on_finish(self, turn: AgentTurn):
+        pass
+
+
+class ToolLogHandler(AgentEventHandler):
+    """Prints tool calls and their results."""
+
+    async def on_event(self, turn: AgentTurn, event: Any):
+        if isinstance(event, ToolCallResult):
+            print(f"Result from calling tool {event.tool_name}:\n\n{event.tool_output}")
+        elif isinstance(event, ToolCall):
+            print(f"Calling tool {event.tool_name} with arguments:\n\n{event.tool_kwargs}")
+
+
+class AgentMetrics(AgentEventHandler):
+    """Process-wide turn latency, time to first streamed token, LLM steps and per-tool timings."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.turns = 0
+        self.errors = 0
+        self.llm_steps = 0
+        self.turn_ms = Histogram()
+        self.first_delta_ms = Histogram()
+        self.tools: Dict[str, Dict[str, Any]] = {}
+
+    async def on_event(self, turn: AgentTurn, event: Any):
+        now = time.monotonic()
+        if isinstance(event, AgentStream):
+            if turn.first_delta_at is None and event.delta:
+                turn.first_delta_at = now
+        elif isinstance(event, AgentOutput):
+            turn.llm_steps += 1
+        elif isinstance(event, ToolCallResult):
+            started = turn.tool_started.pop(event.tool_id, None)
+            error = bool(getattr(event.tool_output, "is_error", False))
+            with self._lock:
+                tool = self.tools.setdefault(event.tool_name, {"calls": 0, "errors": 0, "latency_ms": Histogram()})
+                tool["calls"] += 1
+                tool["errors"] += error
+                if started is not None:
+                    tool["latency_ms"].observe((now - started) * 1000)
+        elif isinstance(event, ToolCall):
+            turn.tool_calls += 1
+            turn.tool_started[event.tool_id] = now
+
+    async def on_finish(self, turn: AgentTurn):
+        with self._lock:
+            self.turns += 1
+            self.errors += turn.error is not None
+            self.llm_steps += turn.llm_steps
+            self.turn_ms.observe(turn.elapsed_ms)
+            if turn.first_delta_at is not None:
+                self.first_delta_ms.observe((turn.first_delta_at - turn.started) * 1000)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "turns": self.turns,
+                "errors": self.errors,
+                "llm_steps_per_turn": round(self.llm_steps / self.turns, 2) if self.turns else 0.0,
+                "turn_ms": self.turn_ms.stats(),
+                "first_delta_ms": self.first_delta_ms.stats(),
+                "tools": {
+                    name: {"calls": t["calls"], "errors": t["errors"], "latency_ms": t["latency_ms"].stats()}
+                    for name, t in self.tools.items()
+                },
+            }
+
+
+@lru_cache(maxsize=1)
+def get_agent_metrics() -> AgentMetrics:
+    return AgentMetrics()
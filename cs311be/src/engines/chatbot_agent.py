@@ -1,23 +1,45 @@
+from typing import Any, AsyncIterator, List, Optional, Sequence
 from llama_index.core.agent.workflow.function_agent import FunctionAgent
 from llama_index.core.agent.workflow.workflow_events import (
     AgentInput,
     AgentOutput,
-    ToolCall,
-    ToolCallResult,
     AgentStream,
 )
 from llama_index.core.memory.chat_memory_buffer import ChatMemoryBuffer
 from src.engines.llm_engine import LLMEngine
 from src.services.chatbot_tools import ChatbotTools
 from src.prompts.prompt import *
+from src.engines.llm_telemetry import default_call_site
+from src.engines.agent_events import (
+    AGENT_LOG_TOOL_CALLS,
+    AgentEventHandler,
+    AgentTurn,
+    ToolLogHandler,
+    get_agent_metrics,
+)
+
+
+async def _dispatch(handlers: Sequence[AgentEventHandler], hook: str, *args: Any):
+    """Call `hook` on every handler; a failing handler never breaks the turn."""
+    for handler in handlers:
+        try:
+            await getattr(handler, hook)(*args)
+        except Exception as e:
+            print(f"[Agent] {type(handler).__name__}.{hook} failed: {e}")
+
+
 class Agent:    
     """
     QAAgent class that initializes a FunctionAgent, takes queries, and returns responses.
+
+    The FunctionAgent and its tools are built once and shared by every turn: a run keeps
+    its state in its own workflow context and in the memory passed in, so concurrent
+    turns do not interfere.
     """
 
-    def __init__(self):
+    def __init__(self, handlers: Optional[Sequence[AgentEventHandler]] = None):
         config = LLMEngine()
-        self.llm = config.openai_llm
+        self.llm = config.turn_llm
         self.tools = ChatbotTools()
         self.system_prompt = system_prompt
         self.agent = FunctionAgent(
@@ -26,51 +48,71 @@ class Agent:
             tools=self.tools.get_tools(),
             system_prompt=self.system_prompt,
         )
+        # Called for every turn; callers can add per-turn handlers (e.g. a stream sink)
+        if handlers is None:
+            handlers = [get_agent_metrics()] + ([ToolLogHandler()] if AGENT_LOG_TOOL_CALLS else [])
+        self.handlers: List[AgentEventHandler] = list(handlers)
+
     async def run(self, query: str, memory: ChatMemoryBuffer):
-        return self.agent.run(query, memory)
+        # Workflow tasks copy this context, so the agent's own steps are labelled chat_agent
+        with default_call_site("chat_agent"):
+            return self.agent.run(query, memory=memory)
+
+    async def run_turn(
+        self,
+        query: str,
+        memory: ChatMemoryBuffer,
+        handlers: Sequence[AgentEventHandler] = (),
+        turn: Optional[AgentTurn] = None,
+    ) -> AsyncIterator[Any]:
+        """
+        Run one turn, passing every workflow event to the handlers and yielding it.
+        The final response is left on `turn.response`.
+        """
+        turn = turn or AgentTurn(query)
+        handlers = [*self.handlers, *handlers]
+        await _dispatch(handlers, "on_start", turn)
+        with default_call_site("chat_agent"):
+            handler = self.agent.run(query, memory=memory)
+        try:
+            async for event in handler.stream_events():
+                await _dispatch(handlers, "on_event", turn, event)
+                yield event
+            turn.response = await handler
+        except BaseException as e:
+            turn.error = e
+            raise
+        finally:
+            if not handler.done():
+                # The consumer went away (e.g. a closed stream): stop the workflow too
+                await handler.cancel_run()
+            await _dispatch(handlers, "on_finish", turn)
+
     async def stream_query(self, query: str, memory: ChatMemoryBuffer):
         """
         Streaming response from the agent.
         Can add tool call and tool call result to the stream.
         
         """
-        handler = self.agent.run(query, memory=memory)
-        async for event in handler.stream_events():
+        async for event in self.run_turn(query, memory):
             if isinstance(event, AgentStream):
                 yield event.delta
-    async def handle_query(self, query: str, memory: ChatMemoryBuffer) -> str:
+
+    async def handle_query(self, query: str, memory: ChatMemoryBuffer, handlers: Sequence[AgentEventHandler] = ()) -> str:
         """
         Handles a query by running it through the agent.
         Args:
             query (str): The user query.
             memory: memory to pass into the agent.
+            handlers: extra event handlers for this turn only.
         Returns:
             str: The response from the agent.
         """
-        # Update tools with user_id context
-        tools = self.tools.get_tools()
-        
-        agent = FunctionAgent(
-            name="qa_agent",
-            tools=tools,
-            system_prompt=self.system_prompt,
-            llm=self.llm,
-        )
-        #response = await agent.run(query, memory=memory)
-        handler = agent.run(query, memory=memory)
-
-        async for event in handler.stream_events():
-            if isinstance(event, ToolCallResult):
-                print(
-                    f"Result from calling tool {event.tool_name}:\n\n{event.tool_output}"
-                )
-            if isinstance(event, ToolCall):
-                print(
-                    f"Calling tool {event.tool_name} with arguments:\n\n{event.tool_kwargs}"
-                )
+        turn = AgentTurn(query)
+        async for _ in self.run_turn(query, memory, handlers, turn):
+            pass
+        return str(turn.response)
 
-        response = await handler
-        return str(response)
     async def translate_to_english(self, query: str) -> str:
         """
         Handles a query by running it through the agent.
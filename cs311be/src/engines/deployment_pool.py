@@ -0,0 +1,337 @@
+import os
+import json
+import time
+import hashlib
+import asyncio
+import threading
+from typing import Any, Callable, Dict, List, Optional, Sequence
+from urllib.parse import urlparse
+from dotenv import load_dotenv
+from llama_index.core.base.llms.types import (
+    ChatMessage,
+    ChatResponse,
+    ChatResponseAsyncGen,
+    ChatResponseGen,
+    CompletionResponse,
+    CompletionResponseAsyncGen,
+    CompletionResponseGen,
+    LLMMetadata,
+)
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.llms.function_calling import FunctionCallingLLM
+from llama_index.core.llms.llm import ToolSelection
+from src.engines.llm_scheduler import get_llm_scheduler, is_rate_limited, is_retryable, LLM_SCHED_MAX_RETRIES
+load_dotenv()
+
+# Extra members per logical deployment, keyed by the deployment name the engines are
+# configured with. Each member may set azure_endpoint, api_key (or api_key_env),
+# api_version, deployment and model; missing fields fall back to the base deployment:
+# {"gpt-4o": [{"azure_endpoint": "https://eastus2.openai.azure.com/", "api_key_env": "EASTUS2_KEY"}]}
+LLM_POOLS = json.loads(os.getenv("LLM_POOLS", "") or "{}")
+# Consecutive non-429 failures after which a member is ejected
+LLM_POOL_EJECT_AFTER = int(os.getenv("LLM_POOL_EJECT_AFTER", "3"))
+# First ejection length; doubles on each repeated ejection up to the max
+LLM_POOL_EJECT_SECONDS = float(os.getenv("LLM_POOL_EJECT_SECONDS", "15"))
+LLM_POOL_EJECT_MAX_SECONDS = float(os.getenv("LLM_POOL_EJECT_MAX_SECONDS", "300"))
+# Smoothing factor of each member's latency average
+LLM_POOL_EWMA_ALPHA = float(os.getenv("LLM_POOL_EWMA_ALPHA", "0.2"))
+
+
+def pool_member_configs(deployment: Optional[str], base: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Connection settings of every member of `deployment`'s pool ([] when it has none)."""
+    extras = LLM_POOLS.get(deployment or "")
+    if not extras:
+        return []
+    members = [dict(base)]
+    for extra in extras:
+        member = dict(base)
+        member.update({k: v for k, v in extra.items() if k != "api_key_env"})
+        if extra.get("api_key_env"):
+            member["api_key"] = os.getenv(extra["api_key_env"])
+        members.append(member)
+    return members
+
+
+def key_fingerprint(api_key: Optional[str]) -> str:
+    """Short, non-reversible tag of an API key, to tell members on one resource apart."""
+    return hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:6]
+
+
+def member_name(deployment: str, azure_endpoint: Optional[str], api_key: Optional[str] = None) -> str:
+    """
+    Unique per (deployment, resource, key), e.g. gpt-4o@eastus2/3fa9c1; used for its
+    scheduler, so members sharing a resource but not a key get their own quota state.
+    """
+    host = urlparse(azure_endpoint or "").hostname or ""
+    name = f"{deployment}@{host.split('.')[0]}" if host else deployment
+    return f"{name}/{key_fingerprint(api_key)}" if api_key else name
+
+
+class PoolMember:
+    def __init__(self, name: str, llm: Any):
+        self.name = name
+        self.llm = llm
+        self.outstanding = 0
+        self.requests = 0
+        self.failures = 0
+        self.rate_limited = 0
+        self.consecutive_failures = 0
+        self.ejections = 0
+        self.ejected_until = 0.0
+        self.latency_ms: Optional[float] = None
+
+    def available(self, now: float) -> bool:
+        return now >= self.ejected_until and now >= get_llm_scheduler().get(self.name).cooldown_until
+
+    def score(self, default_ms: float) -> float:
+        """Expected wait: recent latency scaled by the requests already outstanding."""
+        return (self.latency_ms if self.latency_ms is not None else default_ms) * (self.outstanding + 1)
+
+    def observe(self, latency_ms: Optional[float], error: Optional[BaseException] = None):
+        if error is None:
+            self.consecutive_failures = 0
+            if latency_ms is not None:
+                self.latency_ms = latency_ms if self.latency_ms is None else (
+                    self.latency_ms + LLM_POOL_EWMA_ALPHA * (latency_ms - self.latency_ms)
+                )
+            return
+        self.failures += 1
+        if is_rate_limited(error):
+            # Quota, not health: the member's scheduler cooldown already steers traffic away
+            self.rate_limited += 1
+            return
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= LLM_POOL_EJECT_AFTER:
+            period = min(LLM_POOL_EJECT_MAX_SECONDS, LLM_POOL_EJECT_SECONDS * (2 ** self.ejections))
+            self.ejected_until = time.monotonic() + period
+            self.ejections += 1
+            self.consecutive_failures = 0
+            print(f"[DeploymentPool] Ejected {self.name} for {period:g}s after repeated failures")
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "failures": self.failures,
+            "rate_limited": self.rate_limited,
+            "latency_ewma_ms": round(self.latency_ms, 1) if self.latency_ms is not None else None,
+            "ejected": now < self.ejected_until,
+            "ejected_for_s": round(max(0.0, self.ejected_until - now), 1),
+            "ejections": self.ejections,
+            "cooling_down": now < get_llm_scheduler().get(self.name).cooldown_until,
+        }
+
+
+class DeploymentPool:
+    """
+    Spreads one logical deployment over N (endpoint, key, deployment) members.
+
+    Requests go to the member with the lowest latency x (outstanding + 1). Members that
+    keep failing are ejected for a growing period, members cooling down after a 429 are
+    skipped, and a retryable failure moves the request to another member instead of
+    waiting out the backoff on the same one.
+    """
+
+    def __init__(self, name: str, members: List[PoolMember]):
+        self.name = name
+        self.members = members
+        self._lock = threading.Lock()
+        self.failovers = 0
+
+    def pressure(self) -> Optional[str]:
+        """
+        Router view of the whole pool: "cooldown" when no member can take a request now,
+        "queue" when every usable member's scheduler already has a full queue, else None.
+        """
+        now = time.monotonic()
+        scheduler = get_llm_scheduler()
+        with self._lock:
+            usable = [m for m in self.members if m.available(now)]
+            if not usable:
+                return "cooldown"
+            if all(scheduler.get(m.name).waiting >= scheduler.get(m.name).capacity for m in usable):
+                return "queue"
+            return None
+
+    def pick(self, exclude: Sequence[str] = ()) -> PoolMember:
+        now = time.monotonic()
+        with self._lock:
+            candidates = [m for m in self.members if m.name not in exclude] or list(self.members)
+            healthy = [m for m in candidates if m.available(now)]
+            if healthy:
+                known = [m.latency_ms for m in healthy if m.latency_ms is not None]
+                default_ms = sum(known) / len(known) if known else 1.0
+                member = min(healthy, key=lambda m: (m.score(default_ms), m.outstanding, m.requests))
+            else:
+                # Nobody is healthy: use whoever recovers first rather than failing outright
+                member = min(candidates, key=lambda m: max(m.ejected_until, get_llm_scheduler().get(m.name).cooldown_until))
+            member.outstanding += 1
+            member.requests += 1
+            return member
+
+    def _release(self, member: PoolMember, latency_ms: Optional[float], error: Optional[BaseException] = None):
+        with self._lock:
+            member.outstanding = max(0, member.outstanding - 1)
+            member.observe(latency_ms, error)
+
+    async def arun(self, call: Callable[[Any], Any]):
+        """Await call(member_llm), failing over to other members on retryable errors."""
+        tried: List[str] = []
+        attempt = 0
+        while True:
+            if len(tried) >= len(self.members):
+                # Every member has failed once: back off before going around again
+                await asyncio.sleep(get_llm_scheduler().get(tried[-1]).backoff_delay(attempt))
+                tried.clear()
+            member = self.pick(exclude=tried)
+            started = time.monotonic()
+            try:
+                result = await call(member.llm)
+            except Exception as e:
+                self._release(member, None, e)
+                if not is_retryable(e) or attempt >= LLM_SCHED_MAX_RETRIES:
+                    raise
+                tried.append(member.name)
+                attempt += 1
+                self.failovers += 1
+                continue
+            except BaseException:
+                # Cancelled (e.g. a lost hedge): not the member's fault
+                self._release(member, None)
+                raise
+            self._release(member, (time.monotonic() - started) * 1000)
+            return result
+
+    def run(self, call: Callable[[Any], Any]):
+        """Sync counterpart of arun; the member's own client retries, no failover."""
+        member = self.pick()
+        started = time.monotonic()
+        try:
+            result = call(member.llm)
+        except BaseException as e:
+            self._release(member, None, e if isinstance(e, Exception) else None)
+            raise
+        self._release(member, (time.monotonic() - started) * 1000)
+        return result
+
+    async def astream(self, open_stream: Callable[[Any], Any]):
+        """Open a stream on the picked member and keep it outstanding until the stream ends."""
+        member = self.pick()
+        try:
+            stream = await open_stream(member.llm)
+        except BaseException as e:
+            self._release(member, None, e if isinstance(e, Exception) else None)
+            raise
+
+        async def gen():
+            error = None
+            try:
+                async for chunk in stream:
+                    yield chunk
+            except Exception as e:
+                error = e
+                raise
+            finally:
+                self._release(member, None, error)
+
+        return gen()
+
+    def stream(self, open_stream: Callable[[Any], Any]):
+        member = self.pick()
+        error = None
+        try:
+            yield from open_stream(member.llm)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self._release(member, None, error)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "failovers": self.failovers,
+                "members": {m.name: m.stats() for m in self.members},
+            }
+
+
+class PooledLLM(FunctionCallingLLM):
+    """
+    Function-calling LLM backed by a DeploymentPool.
+
+    Reports the logical deployment as its engine, so response-cache keys and routing
+    are the same as for a single deployment; tool preparation and parsing are delegated
+    to the first member.
+    """
+
+    _pool: DeploymentPool = PrivateAttr()
+
+    def __init__(self, pool: DeploymentPool, **kwargs: Any):
+        super().__init__(**kwargs)
+        self._pool = pool
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "pooled_llm"
+
+    @property
+    def pool(self) -> DeploymentPool:
+        return self._pool
+
+    @property
+    def _base(self) -> Any:
+        return self._pool.members[0].llm
+
+    @property
+    def metadata(self) -> LLMMetadata:
+        return self._base.metadata
+
+    @property
+    def model(self) -> str:
+        return self._base.model
+
+    @property
+    def engine(self) -> str:
+        return self._pool.name
+
+    @property
+    def temperature(self) -> float:
+        return self._base.temperature
+
+    @property
+    def max_tokens(self) -> Optional[int]:
+        return self._base.max_tokens
+
+    def _prepare_chat_with_tools(self, tools: Sequence[Any], **kwargs: Any) -> Dict[str, Any]:
+        return self._base._prepare_chat_with_tools(tools, **kwargs)
+
+    def _validate_chat_with_tools_response(self, response: ChatResponse, tools: Sequence[Any], **kwargs: Any) -> ChatResponse:
+        return self._base._validate_chat_with_tools_response(response, tools, **kwargs)
+
+    def get_tool_calls_from_response(self, response: ChatResponse, error_on_no_tool_call: bool = True, **kwargs: Any) -> List[ToolSelection]:
+        return self._base.get_tool_calls_from_response(response, error_on_no_tool_call=error_on_no_tool_call, **kwargs)
+
+    def chat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponse:
+        return self._pool.run(lambda llm: llm.chat(messages, **kwargs))
+
+    def complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        return self._pool.run(lambda llm: llm.complete(prompt, formatted=formatted, **kwargs))
+
+    def stream_chat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponseGen:
+        return self._pool.stream(lambda llm: llm.stream_chat(messages, **kwargs))
+
+    def stream_complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponseGen:
+        return self._pool.stream(lambda llm: llm.stream_complete(prompt, formatted=formatted, **kwargs))
+
+    async def achat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponse:
+        return await self._pool.arun(lambda llm: llm.achat(messages, **kwargs))
+
+    async def acomplete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        return await self._pool.arun(lambda llm: llm.acomplete(prompt, formatted=formatted, **kwargs))
+
+    async def astream_chat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponseAsyncGen:
+        return await self._pool.astream(lambda llm: llm.astream_chat(messages, **kwargs))
+
+    async def astream_complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponseAsyncGen:
+        return await self._pool.astream(lambda llm: llm.astream_complete(prompt, formatted=formatted, **kwargs))
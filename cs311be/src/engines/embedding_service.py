@@ -0,0 +1,225 @@
+import os
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set
+import numpy as np
+from dotenv import load_dotenv
+load_dotenv()
+
+# Requests arriving within this window are sent upstream as one multi-input call
+EMBED_BATCH_WINDOW_MS = float(os.getenv("EMBED_BATCH_WINDOW_MS", "5"))
+EMBED_MAX_BATCH = int(os.getenv("EMBED_MAX_BATCH", "64"))
+EMBED_CACHE_DIR = os.path.abspath(os.getenv("EMBED_CACHE_DIR", "./temp/embedding_cache"))
+EMBED_MEMORY_CACHE_ENTRIES = int(os.getenv("EMBED_MEMORY_CACHE_ENTRIES", "4096"))
+# Set to 0 to keep the cache in memory only
+EMBED_DISK_CACHE = os.getenv("EMBED_DISK_CACHE", "1") == "1"
+
+
+def text_key(model: str, text: str) -> str:
+    return hashlib.sha256(f"{model}\x00{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingDiskCache:
+    """text-hash -> float32 vector, one .npy file per entry."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.npy")
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        try:
+            return np.load(self._path(key), allow_pickle=False)
+        except (OSError, ValueError):
+            return None
+
+    def set(self, key: str, vector: np.ndarray) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, vector.astype(np.float32, copy=False), allow_pickle=False)
+        os.replace(tmp_path, path)
+
+    def get_many(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        found = {}
+        for key in keys:
+            vector = self.get(key)
+            if vector is not None:
+                found[key] = vector
+        return found
+
+    def set_many(self, items: Dict[str, np.ndarray]) -> None:
+        for key, vector in items.items():
+            self.set(key, vector)
+
+
+class EmbeddingService:
+    """
+    Micro-batching, caching front end for a llama-index embedding model.
+
+    Texts requested within EMBED_BATCH_WINDOW_MS of each other go upstream as a single
+    multi-input call. Vectors are cached by text hash in memory (LRU) and on disk as
+    float32, and concurrent requests for the same text share one result.
+    """
+
+    def __init__(self, embed_model, model_label: str):
+        self.embed_model = embed_model
+        self.model_label = model_label
+        self.disk = EmbeddingDiskCache(os.path.join(EMBED_CACHE_DIR, hashlib.sha1(model_label.encode()).hexdigest()[:12])) if EMBED_DISK_CACHE else None
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._memory_lock = threading.Lock()
+        self._futures: Dict[str, asyncio.Future] = {}
+        self._pending: Dict[str, str] = {}  # key -> text waiting for the next flush
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        # The loop only keeps weak references to tasks; a collected flush would strand its waiters
+        self._flushing: Set[asyncio.Task] = set()
+        self.requests = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.coalesced = 0
+        self.upstream_calls = 0
+        self.upstream_texts = 0
+
+    def _remember(self, key: str, vector: np.ndarray):
+        with self._memory_lock:
+            self._memory[key] = vector
+            self._memory.move_to_end(key)
+            while len(self._memory) > EMBED_MEMORY_CACHE_ENTRIES:
+                self._memory.popitem(last=False)
+
+    def _from_memory(self, key: str) -> Optional[np.ndarray]:
+        with self._memory_lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+            return vector
+
+    async def embed(self, text: str) -> List[float]:
+        return (await self.embed_many([text]))[0]
+
+    async def embed_many(self, texts: List[str]) -> List[List[float]]:
+        """Embed several texts; cache misses from all concurrent callers share one upstream call."""
+        self.requests += len(texts)
+        keys = [text_key(self.model_label, text) for text in texts]
+        vectors: Dict[str, np.ndarray] = {}
+
+        for key in keys:
+            vector = self._from_memory(key)
+            if vector is not None:
+                self.memory_hits += 1
+                vectors[key] = vector
+
+        missing = [key for key in dict.fromkeys(keys) if key not in vectors and key not in self._futures]
+        if missing and self.disk:
+            found = await asyncio.to_thread(self.disk.get_many, missing)
+            for key, vector in found.items():
+                self.disk_hits += 1
+                self._remember(key, vector)
+                vectors[key] = vector
+
+        waits = {}
+        for key, text in zip(keys, texts):
+            if key in vectors or key in waits:
+                continue
+            future = self._futures.get(key)
+            if future is None:
+                future = asyncio.get_running_loop().create_future()
+                self._futures[key] = future
+                self._pending[key] = text
+                self._schedule_flush()
+            else:
+                self.coalesced += 1
+            waits[key] = future
+
+        for key, future in waits.items():
+            vectors[key] = await asyncio.shield(future)
+        return [vectors[key].tolist() for key in keys]
+
+    def _schedule_flush(self):
+        if len(self._pending) >= EMBED_MAX_BATCH:
+            if self._flush_handle:
+                self._flush_handle.cancel()
+                self._flush_handle = None
+            self._start_flush()
+        elif self._flush_handle is None:
+            loop = asyncio.get_running_loop()
+            self._flush_handle = loop.call_later(EMBED_BATCH_WINDOW_MS / 1000, self._start_flush)
+
+    def _start_flush(self):
+        task = asyncio.ensure_future(self._flush())
+        self._flushing.add(task)
+        task.add_done_callback(self._flushing.discard)
+
+    async def _flush(self):
+        self._flush_handle = None
+        batch = self._pending
+        self._pending = {}
+        if not batch:
+            return
+        keys = list(batch)
+        try:
+            self.upstream_calls += 1
+            self.upstream_texts += len(keys)
+            embeddings = await self.embed_model.aget_text_embedding_batch([batch[key] for key in keys])
+            if len(embeddings) != len(keys):
+                raise ValueError(f"Expected {len(keys)} embeddings, got {len(embeddings)}")
+        except BaseException as e:
+            for key in keys:
+                future = self._futures.pop(key, None)
+                if future and not future.done():
+                    future.set_exception(e if isinstance(e, Exception) else RuntimeError("Embedding batch cancelled"))
+                    # Avoid "exception never retrieved" when every waiter has gone away
+                    future.exception()
+            if not isinstance(e, Exception):
+                raise
+            return
+
+        results = {}
+        for key, embedding in zip(keys, embeddings):
+            vector = np.asarray(embedding, dtype=np.float32)
+            results[key] = vector
+            self._remember(key, vector)
+            future = self._futures.pop(key, None)
+            if future and not future.done():
+                future.set_result(vector)
+        if self.disk:
+            try:
+                await asyncio.to_thread(self.disk.set_many, results)
+            except Exception as e:
+                print(f"[EmbeddingService] Disk cache write failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "model": self.model_label,
+            "requests": self.requests,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "coalesced": self.coalesced,
+            "upstream_calls": self.upstream_calls,
+            "upstream_texts": self.upstream_texts,
+            "avg_batch_size": round(self.upstream_texts / self.upstream_calls, 2) if self.upstream_calls else 0.0,
+        }
+
+
+_services: Dict[str, EmbeddingService] = {}
+_services_lock = threading.Lock()
+
+
+def get_embedding_service(embed_model) -> EmbeddingService:
+    """One shared EmbeddingService per embedding deployment."""
+    label = f"{getattr(embed_model, 'model_name', '')}:{getattr(embed_model, 'azure_deployment', '') or ''}"
+    with _services_lock:
+        service = _services.get(label)
+        if service is None:
+            service = EmbeddingService(embed_model, label)
+            _services[label] = service
+        return service
+
+
+def embedding_stats() -> Dict[str, Any]:
+    return {label: service.stats() for label, service in _services.items()}
@@ -0,0 +1,266 @@
+import os
+import json
+import time
+import shutil
+import argparse
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from llama_index.core.callbacks import CallbackManager
+from llama_index.core.retrievers import BaseRetriever
+from llama_index.core.schema import NodeWithScore, QueryBundle, TextNode
+
+VECTORS_FILE = "vectors.npy"
+METADATA_FILE = "metadata.json"
+# Names the live export version inside an index directory (a file rather than a
+# symlink, which Windows only lets administrators create)
+CURRENT_FILE = "current.txt"
+
+
+def _current_version(directory: str) -> Optional[str]:
+    try:
+        with open(os.path.join(directory, CURRENT_FILE), encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def export_path(directory: str) -> str:
+    """Directory holding the live files of a flat index (exports predating versions had none)."""
+    version = _current_version(directory)
+    return os.path.join(directory, version) if version else directory
+
+
+def has_flat_index(directory: str) -> bool:
+    return os.path.exists(os.path.join(export_path(directory), METADATA_FILE))
+
+
+def filter_key(filters: Dict[str, Any]) -> Tuple:
+    """Hashable, order-independent form of a dict filter, for caching per filter."""
+    return tuple(sorted((k, tuple(sorted(v)) if isinstance(v, (list, tuple, set)) else v) for k, v in filters.items()))
+
+
+def metadata_mask(metadatas: Sequence[Dict[str, Any]], filters: Dict[str, Any]) -> np.ndarray:
+    """Rows whose metadata matches every key of `filters`; a list value means any of."""
+    allowed = {k: set(v) if isinstance(v, (list, tuple, set)) else {v} for k, v in filters.items()}
+    return np.fromiter(
+        (all((metadata or {}).get(k) in values for k, values in allowed.items()) for metadata in metadatas),
+        dtype=bool, count=len(metadatas),
+    )
+
+
+def write_flat_index(
+    directory: str,
+    ids: Sequence[str],
+    texts: Sequence[str],
+    metadatas: Sequence[Dict[str, Any]],
+    embeddings: Any,
+) -> Dict[str, Any]:
+    """
+    Write unit-normalized float32 vectors as one contiguous .npy plus a JSON table of
+    [id, text, metadata] rows in the same order. Each export goes to a fresh version
+    directory that current.txt is then pointed at with one atomic rename, so
+    a reader sees either the old pair of files or the new one, never a mix. Running
+    workers keep their old mapping until they reload; the previous version is kept for
+    readers that read the pointer just before the switch, older ones are removed.
+    """
+    os.makedirs(directory, exist_ok=True)
+    vectors = np.ascontiguousarray(embeddings, dtype=np.float32)
+    if vectors.ndim != 2 or len(vectors) != len(ids):
+        raise ValueError(f"expected {len(ids)} vectors, got shape {vectors.shape}")
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors /= np.where(norms == 0, 1.0, norms)
+    export_id = f"{time.time_ns():x}-{os.getpid()}"
+    table = {
+        "export_id": export_id,
+        "dim": int(vectors.shape[1]) if len(vectors) else 0,
+        "count": len(ids),
+        "exported_at": time.time(),
+        "rows": [[node_id, text or "", metadata or {}] for node_id, text, metadata in zip(ids, texts, metadatas)],
+    }
+    version = f"v-{export_id}"
+    version_dir = os.path.join(directory, version)
+    os.makedirs(version_dir)
+    np.save(os.path.join(version_dir, VECTORS_FILE), vectors)
+    with open(os.path.join(version_dir, METADATA_FILE), "w", encoding="utf-8") as f:
+        json.dump(table, f, ensure_ascii=False)
+
+    previous = _current_version(directory)
+    current = os.path.join(directory, CURRENT_FILE)
+    tmp_path = f"{current}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(tmp_path, current)
+    for entry in os.listdir(directory):
+        path = os.path.join(directory, entry)
+        if entry.startswith("v-") and entry not in (version, previous):
+            shutil.rmtree(path, ignore_errors=True)
+        elif entry in (VECTORS_FILE, METADATA_FILE):
+            # Unversioned files of an older export
+            os.remove(path)
+    return {"directory": directory, "export_id": export_id, "count": table["count"], "dim": table["dim"]}
+
+
+class FlatIndex:
+    """
+    Read-only exact-search index: the vectors are memory-mapped, so every worker of the
+    host shares the same page-cache copy, and a query is one matrix-vector product over
+    the whole bank followed by argpartition for the top k.
+    """
+
+    def __init__(self, directory: str):
+        started = time.monotonic()
+        # Resolve the link once so both files come from the same export
+        path = export_path(directory)
+        with open(os.path.join(path, METADATA_FILE), encoding="utf-8") as f:
+            table = json.load(f)
+        self._setup(
+            directory,
+            [row[0] for row in table["rows"]],
+            [row[1] for row in table["rows"]],
+            [row[2] for row in table["rows"]],
+            np.load(os.path.join(path, VECTORS_FILE), mmap_mode="r"),
+        )
+        self.export_id = table.get("export_id")
+        self.load_ms = round((time.monotonic() - started) * 1000, 1)
+
+    @classmethod
+    def from_rows(
+        cls,
+        ids: Sequence[str],
+        texts: Sequence[str],
+        metadatas: Sequence[Dict[str, Any]],
+        embeddings: Any,
+        label: str = "<memory>",
+    ) -> "FlatIndex":
+        """In-memory index over rows already at hand, e.g. one partition of a Chroma collection."""
+        started = time.monotonic()
+        index = cls.__new__(cls)
+        vectors = np.array(embeddings, dtype=np.float32).reshape(len(ids), -1) if len(ids) else np.zeros((0, 0), dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors /= np.where(norms == 0, 1.0, norms)
+        index._setup(label, list(ids), [text or "" for text in texts], [metadata or {} for metadata in metadatas], vectors)
+        index.export_id = None
+        index.load_ms = round((time.monotonic() - started) * 1000, 1)
+        return index
+
+    def _setup(self, directory: str, ids: List[str], texts: List[str], metadatas: List[Dict[str, Any]], vectors: np.ndarray):
+        self.directory = directory
+        self.vectors = vectors
+        self.ids: List[str] = ids
+        self.texts: List[str] = texts
+        self.metadatas: List[Dict[str, Any]] = metadatas
+        self._rows = {node_id: row for row, node_id in enumerate(self.ids)}
+        if len(self.ids) != len(self.vectors):
+            raise ValueError(f"{directory}: {len(self.vectors)} vectors but {len(self.ids)} metadata rows")
+        self._rows_cache: Dict[Tuple, Any] = {}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def rows(self, filters: Optional[Dict[str, Any]]):
+        """
+        Rows matching `filters`, cached per filter: a slice when they are contiguous (a
+        bank exported in file order), so the product runs on a view of the mapping.
+        """
+        if not filters:
+            return None
+        key = filter_key(filters)
+        rows = self._rows_cache.get(key)
+        if rows is None:
+            rows = np.flatnonzero(metadata_mask(self.metadatas, filters))
+            if len(rows) and rows[-1] - rows[0] + 1 == len(rows):
+                rows = slice(int(rows[0]), int(rows[-1]) + 1)
+            self._rows_cache[key] = rows
+        return rows
+
+    def search(self, embedding: Sequence[float], top_k: int = 10, filters: Optional[Dict[str, Any]] = None) -> List[Tuple[int, float]]:
+        """(row, cosine) of the best `top_k` rows matching `filters`, best first."""
+        rows = self.rows(filters)
+        vectors = self.vectors if rows is None else self.vectors[rows]
+        if not len(vectors):
+            return []
+        query = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        scores = vectors @ (query / norm if norm else query)
+        k = min(top_k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        if isinstance(rows, slice):
+            return [(rows.start + int(i), float(scores[i])) for i in top]
+        if rows is not None:
+            return [(int(rows[i]), float(scores[i])) for i in top]
+        return [(int(i), float(scores[i])) for i in top]
+
+    def node(self, row: int) -> TextNode:
+        return TextNode(id_=self.ids[row], text=self.texts[row], metadata=dict(self.metadatas[row]))
+
+    def node_by_id(self, node_id: str) -> Optional[TextNode]:
+        row = self._rows.get(node_id)
+        return self.node(row) if row is not None else None
+
+    def nodes(self) -> List[TextNode]:
+        return [self.node(row) for row in range(len(self.ids))]
+
+    def embeddings(self, ids: Sequence[str]) -> Dict[str, np.ndarray]:
+        """Stored (normalized) vectors of the given node ids; unknown ids are left out."""
+        return {node_id: self.vectors[self._rows[node_id]] for node_id in ids if node_id in self._rows}
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "directory": self.directory,
+            "export_id": self.export_id,
+            "vectors": len(self.ids),
+            "dim": int(self.vectors.shape[1]) if self.vectors.ndim == 2 else 0,
+            "bytes": int(self.vectors.nbytes),
+            "load_ms": self.load_ms,
+        }
+
+
+class FlatIndexRetriever(BaseRetriever):
+    """Drop-in for VectorIndexRetriever over a FlatIndex; takes the same dict filters."""
+
+    def __init__(
+        self,
+        index: FlatIndex,
+        embed_model: Any,
+        similarity_top_k: int = 10,
+        filters: Optional[Dict[str, Any]] = None,
+        callback_manager: Optional[CallbackManager] = None,
+    ):
+        self.index = index
+        self.embed_model = embed_model
+        self.similarity_top_k = similarity_top_k
+        self.filters = filters
+        super().__init__(callback_manager=callback_manager)
+
+    def embeddings(self, ids: Sequence[str]) -> Dict[str, np.ndarray]:
+        return self.index.embeddings(ids)
+
+    def _results(self, embedding: Sequence[float]) -> List[NodeWithScore]:
+        return [
+            NodeWithScore(node=self.index.node(row), score=score)
+            for row, score in self.index.search(embedding, self.similarity_top_k, self.filters)
+        ]
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        embedding = query_bundle.embedding
+        if embedding is None:
+            embedding = self.embed_model.get_query_embedding(query_bundle.query_str)
+        return self._results(embedding)
+
+    async def _aretrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        embedding = query_bundle.embedding
+        if embedding is None:
+            embedding = await self.embed_model.aget_query_embedding(query_bundle.query_str)
+        return self._results(embedding)
+
+
+if __name__ == "__main__":
+    # python -m src.engines.flat_index --collection question_collection
+    from src.engines.vector_store import FLAT_INDEX_DIR, get_vector_store_manager
+
+    parser = argparse.ArgumentParser(description="Export a Chroma collection to a memory-mapped flat index")
+    parser.add_argument("--collection", default="question_collection")
+    parser.add_argument("--out", default=None, help=f"Target directory (default: {FLAT_INDEX_DIR}/<collection>)")
+    args = parser.parse_args()
+    print(get_vector_store_manager().export_flat(args.collection, args.out))
@@ -0,0 +1,328 @@
+import os
+import time
+import asyncio
+import threading
+from collections import deque
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence
+from dotenv import load_dotenv
+from llama_index.core.base.llms.types import (
+    ChatMessage,
+    ChatResponse,
+    ChatResponseAsyncGen,
+    ChatResponseGen,
+    CompletionResponse,
+    CompletionResponseAsyncGen,
+    CompletionResponseGen,
+    LLMMetadata,
+)
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.llms.function_calling import FunctionCallingLLM
+from llama_index.core.llms.llm import ToolSelection
+from src.engines.llm_telemetry import llm_call_context
+load_dotenv()
+
+# Opt-in: wrap latency-critical LLM calls (interview turns) in HedgedLLM
+LLM_HEDGING = os.getenv("LLM_HEDGING", "0").lower() in ("1", "true", "yes")
+# Fire the duplicate once the primary is slower than this percentile of recent calls
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "0.9"))
+# Hedge delay used until LLM_HEDGE_MIN_SAMPLES latencies have been observed
+LLM_HEDGE_INITIAL_DELAY_MS = float(os.getenv("LLM_HEDGE_INITIAL_DELAY_MS", "3000"))
+LLM_HEDGE_MIN_DELAY_MS = float(os.getenv("LLM_HEDGE_MIN_DELAY_MS", "300"))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+# At most this fraction of calls may be hedged, so a slow deployment cannot double the load
+LLM_HEDGE_BUDGET = float(os.getenv("LLM_HEDGE_BUDGET", "0.2"))
+# Hard overall deadline for a hedged call (whole stream for streaming calls)
+LLM_HEDGE_DEADLINE_S = float(os.getenv("LLM_HEDGE_DEADLINE_S", "45"))
+
+PRIMARY = "primary"
+SECONDARY = "secondary"
+
+
+class HedgeStats:
+    def __init__(self):
+        self.calls = 0
+        self.hedged = 0
+        self.secondary_wins = 0
+        self.primary_wins_after_hedge = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.latencies: deque = deque(maxlen=500)
+
+    def stats(self, delay_ms: float) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "hedged": self.hedged,
+            "hedge_rate": round(self.hedged / self.calls, 3) if self.calls else 0.0,
+            "secondary_wins": self.secondary_wins,
+            "primary_wins_after_hedge": self.primary_wins_after_hedge,
+            "win_rate": round(self.secondary_wins / self.hedged, 3) if self.hedged else 0.0,
+            "timeouts": self.timeouts,
+            "errors": self.errors,
+            "hedge_delay_ms": round(delay_ms, 1),
+        }
+
+
+class _Empty:
+    """First-chunk marker for a stream that ended without yielding."""
+
+
+class Hedger:
+    """
+    Runs a call against a primary deployment and, if it has not answered by the hedge
+    delay (a percentile of that deployment's recent latencies), races a duplicate on a
+    secondary deployment. The first success wins and the loser is cancelled; a hard
+    deadline bounds the whole call. Streams are hedged on time to first chunk.
+    """
+
+    def __init__(
+        self,
+        percentile: float = LLM_HEDGE_PERCENTILE,
+        initial_delay_ms: float = LLM_HEDGE_INITIAL_DELAY_MS,
+        min_delay_ms: float = LLM_HEDGE_MIN_DELAY_MS,
+        min_samples: int = LLM_HEDGE_MIN_SAMPLES,
+        budget: float = LLM_HEDGE_BUDGET,
+        deadline_s: float = LLM_HEDGE_DEADLINE_S,
+    ):
+        self.percentile = percentile
+        self.initial_delay_ms = initial_delay_ms
+        self.min_delay_ms = min_delay_ms
+        self.min_samples = min_samples
+        self.budget = budget
+        self.deadline_s = deadline_s
+        self._lock = threading.Lock()
+        self._stats: Dict[str, HedgeStats] = {}
+
+    def _get(self, key: str) -> HedgeStats:
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = HedgeStats()
+            return stats
+
+    def delay_ms(self, key: str) -> float:
+        latencies = sorted(self._get(key).latencies)
+        if len(latencies) < self.min_samples:
+            return self.initial_delay_ms
+        return max(self.min_delay_ms, latencies[min(len(latencies) - 1, int(self.percentile * len(latencies)))])
+
+    def _may_hedge(self, stats: HedgeStats) -> bool:
+        return stats.hedged < self.budget * stats.calls
+
+    async def _race(self, key: str, primary: Callable[[], Awaitable[Any]], secondary: Optional[Callable[[], Awaitable[Any]]]):
+        """(winner, result) of the first successful call; cancels whatever is still running."""
+        stats = self._get(key)
+        stats.calls += 1
+        started = time.monotonic()
+        deadline = started + self.deadline_s
+        tasks: Dict[asyncio.Task, str] = {asyncio.ensure_future(primary()): PRIMARY}
+        errors: List[BaseException] = []
+        hedge_at = started + self.delay_ms(key) / 1000 if secondary else None
+        hedged = False
+        try:
+            while tasks:
+                now = time.monotonic()
+                if now >= deadline:
+                    stats.timeouts += 1
+                    raise TimeoutError(f"LLM call exceeded the {self.deadline_s:g}s deadline")
+                wake_at = min(deadline, hedge_at) if hedge_at else deadline
+                done, _ = await asyncio.wait(set(tasks), timeout=max(0.0, wake_at - now), return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    if hedge_at and time.monotonic() >= hedge_at:
+                        hedge_at = None
+                        if self._may_hedge(stats):
+                            stats.hedged += 1
+                            hedged = True
+                            tasks[asyncio.ensure_future(secondary())] = SECONDARY
+                    continue
+                for task in done:
+                    role = tasks.pop(task)
+                    if task.exception() is not None:
+                        errors.append(task.exception())
+                        continue
+                    elapsed_ms = (time.monotonic() - started) * 1000
+                    if role == PRIMARY:
+                        stats.latencies.append(elapsed_ms)
+                        if hedged:
+                            stats.primary_wins_after_hedge += 1
+                    else:
+                        stats.secondary_wins += 1
+                        # The primary was at least this slow; keeps the percentile honest
+                        stats.latencies.append(elapsed_ms)
+                    return role, task.result()
+                if not tasks:
+                    # Everything launched has failed (a primary error before the hedge
+                    # delay is not failed over: the scheduler has already retried it)
+                    break
+            stats.errors += 1
+            raise errors[-1]
+        finally:
+            for task in tasks:
+                task.cancel()
+            if tasks:
+                # A loser that finished anyway may hold an open stream
+                for result in await asyncio.gather(*tasks, return_exceptions=True):
+                    await _close_stream(result)
+
+    async def run(self, key: str, primary: Callable[[], Awaitable[Any]], secondary: Optional[Callable[[], Awaitable[Any]]] = None):
+        _, result = await self._race(key, primary, secondary)
+        return result
+
+    async def stream(self, key: str, open_primary: Callable[[], Awaitable[Any]], open_secondary: Optional[Callable[[], Awaitable[Any]]] = None):
+        """Hedge a stream on its first chunk, then yield the winner under the same deadline."""
+        started = time.monotonic()
+
+        def first_chunk(open_stream):
+            async def opened():
+                stream = await open_stream()
+                try:
+                    return stream, await stream.__anext__()
+                except StopAsyncIteration:
+                    return stream, _Empty
+                except BaseException:
+                    await _close_stream((stream, None))
+                    raise
+            return opened
+
+        _, (stream, first) = await self._race(
+            f"{key}:ttfb", first_chunk(open_primary), first_chunk(open_secondary) if open_secondary else None
+        )
+
+        async def gen():
+            try:
+                if first is _Empty:
+                    return
+                yield first
+                while True:
+                    remaining = started + self.deadline_s - time.monotonic()
+                    if remaining <= 0:
+                        self._get(f"{key}:ttfb").timeouts += 1
+                        raise TimeoutError(f"LLM stream exceeded the {self.deadline_s:g}s deadline")
+                    try:
+                        chunk = await asyncio.wait_for(stream.__anext__(), timeout=remaining)
+                    except StopAsyncIteration:
+                        return
+                    except asyncio.TimeoutError:
+                        self._get(f"{key}:ttfb").timeouts += 1
+                        raise TimeoutError(f"LLM stream exceeded the {self.deadline_s:g}s deadline") from None
+                    yield chunk
+            finally:
+                await _close_stream((stream, None))
+
+        return gen()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            keys = list(self._stats)
+        return {key: self._stats[key].stats(self.delay_ms(key)) for key in keys}
+
+
+async def _close_stream(result: Any):
+    """Close the async generator inside a cancelled stream race result, if any."""
+    if isinstance(result, tuple) and result and hasattr(result[0], "aclose"):
+        try:
+            await result[0].aclose()
+        except Exception:
+            pass
+
+
+@lru_cache(maxsize=1)
+def get_hedger() -> Hedger:
+    return Hedger()
+
+
+class HedgedLLM(FunctionCallingLLM):
+    """
+    Function-calling LLM that hedges its async calls from `primary` onto `secondary`.
+
+    Tool preparation and parsing are delegated to the primary, so it can stand in for
+    the Azure client in a FunctionAgent. Sync calls go to the primary unhedged.
+    """
+
+    _primary: Any = PrivateAttr()
+    _secondary: Any = PrivateAttr()
+    _hedger: Hedger = PrivateAttr()
+
+    def __init__(self, primary: FunctionCallingLLM, secondary: FunctionCallingLLM, hedger: Optional[Hedger] = None, **kwargs: Any):
+        super().__init__(**kwargs)
+        self._primary = primary
+        self._secondary = secondary
+        self._hedger = hedger or get_hedger()
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "hedged_llm"
+
+    @property
+    def metadata(self) -> LLMMetadata:
+        return self._primary.metadata
+
+    @property
+    def model(self) -> str:
+        return self._primary.model
+
+    @property
+    def engine(self) -> str:
+        return self._primary.engine
+
+    @property
+    def _key(self) -> str:
+        return self._primary.engine
+
+    def _prepare_chat_with_tools(self, tools: Sequence[Any], **kwargs: Any) -> Dict[str, Any]:
+        return self._primary._prepare_chat_with_tools(tools, **kwargs)
+
+    def _validate_chat_with_tools_response(self, response: ChatResponse, tools: Sequence[Any], **kwargs: Any) -> ChatResponse:
+        return self._primary._validate_chat_with_tools_response(response, tools, **kwargs)
+
+    def get_tool_calls_from_response(self, response: ChatResponse, error_on_no_tool_call: bool = True, **kwargs: Any) -> List[ToolSelection]:
+        return self._primary.get_tool_calls_from_response(response, error_on_no_tool_call=error_on_no_tool_call, **kwargs)
+
+    # -- sync: not hedged -----------------------------------------------------
+
+    def chat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponse:
+        return self._primary.chat(messages, **kwargs)
+
+    def complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        return self._primary.complete(prompt, formatted=formatted, **kwargs)
+
+    def stream_chat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponseGen:
+        return self._primary.stream_chat(messages, **kwargs)
+
+    def stream_complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponseGen:
+        return self._primary.stream_complete(prompt, formatted=formatted, **kwargs)
+
+    # -- async: hedged --------------------------------------------------------
+
+    async def achat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponse:
+        # Pin the caller's label; the racing tasks only see the event loop on their stack
+        with llm_call_context():
+            return await self._hedger.run(
+                self._key,
+                lambda: self._primary.achat(messages, **kwargs),
+                lambda: self._secondary.achat(messages, **kwargs),
+            )
+
+    async def acomplete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        with llm_call_context():
+            return await self._hedger.run(
+                self._key,
+                lambda: self._primary.acomplete(prompt, formatted=formatted, **kwargs),
+                lambda: self._secondary.acomplete(prompt, formatted=formatted, **kwargs),
+            )
+
+    async def astream_chat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponseAsyncGen:
+        with llm_call_context():
+            return await self._hedger.stream(
+                self._key,
+                lambda: self._primary.astream_chat(messages, **kwargs),
+                lambda: self._secondary.astream_chat(messages, **kwargs),
+            )
+
+    async def astream_complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponseAsyncGen:
+        with llm_call_context():
+            return await self._hedger.stream(
+                self._key,
+                lambda: self._primary.astream_complete(prompt, formatted=formatted, **kwargs),
+                lambda: self._secondary.astream_complete(prompt, formatted=formatted, **kwargs),
+            )
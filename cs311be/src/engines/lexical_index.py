@@ -0,0 +1,172 @@
+import re
+import time
+import unicodedata
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from llama_index.core.callbacks import CallbackManager
+from llama_index.core.retrievers import BaseRetriever
+from llama_index.core.schema import NodeWithScore, QueryBundle, TextNode
+from src.engines.flat_index import filter_key, metadata_mask
+
+# Keeps terms like c++, c#, node.js, ci/cd together
+_TOKEN = re.compile(r"\w+(?:[.#+/-]\w+)*[#+]*")
+# Frequent question words carrying no topic; bigrams containing them are kept
+STOPWORDS = frozenset(
+    "là gì của và các một những có được cho với trong khi nào như thế bạn hãy để về này đó "
+    "thì mà hay hoặc không nên làm sao tại vì từ đến giữa the a an of to in is what how why and or".split()
+)
+# Query term weights: exact syllable, syllable without diacritics, two-syllable compound
+_WEIGHTS = {"w": 1.0, "f": 0.5, "b": 1.5}
+
+
+def fold_diacritics(text: str) -> str:
+    """"thuật toán Đồ thị" -> "thuat toan Do thi"."""
+    decomposed = unicodedata.normalize("NFD", text.replace("đ", "d").replace("Đ", "D"))
+    return "".join(ch for ch in decomposed if unicodedata.category(ch) != "Mn")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-cased, NFC-normalized syllables; Vietnamese words are runs of these."""
+    return _TOKEN.findall(unicodedata.normalize("NFC", (text or "").lower()))
+
+
+def terms(text: str) -> Counter:
+    """
+    Index terms of a text: each syllable ("w:"), its diacritic-free form ("f:", so
+    "thuat toan" still matches "thuật toán"), and each pair of adjacent syllables
+    ("b:", standing in for Vietnamese compound words such as "thuật toán").
+    """
+    tokens = tokenize(text)
+    counts: Counter = Counter()
+    for token in tokens:
+        if token in STOPWORDS:
+            continue
+        counts["w:" + token] += 1
+        counts["f:" + fold_diacritics(token)] += 1
+    for left, right in zip(tokens, tokens[1:]):
+        counts[f"b:{fold_diacritics(left)}_{fold_diacritics(right)}"] += 1
+    return counts
+
+
+class LexicalIndex:
+    """
+    In-memory BM25 inverted index over question texts. Term weights are precomputed per
+    posting at build time, so a query is a few array scatter-adds plus argpartition.
+    """
+
+    def __init__(self, nodes: List[TextNode], k1: float = 1.2, b: float = 0.75):
+        started = time.monotonic()
+        self.nodes = [node for node in nodes if (node.get_content() or "").strip()]
+        doc_terms = [terms(node.get_content()) for node in self.nodes]
+        lengths = np.array([sum(counts.values()) for counts in doc_terms], dtype=np.float32)
+        avg_length = float(lengths.mean()) if len(lengths) else 1.0
+        postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        for doc_id, counts in enumerate(doc_terms):
+            for term, tf in counts.items():
+                postings[term].append((doc_id, tf))
+        n_docs = len(self.nodes)
+        self._postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        for term, entries in postings.items():
+            ids = np.fromiter((doc_id for doc_id, _ in entries), dtype=np.int32, count=len(entries))
+            tf = np.fromiter((tf for _, tf in entries), dtype=np.float32, count=len(entries))
+            idf = np.log(1.0 + (n_docs - len(entries) + 0.5) / (len(entries) + 0.5))
+            norm = k1 * (1.0 - b + b * lengths[ids] / max(avg_length, 1e-6))
+            self._postings[term] = (ids, (idf * tf * (k1 + 1.0) / (tf + norm)).astype(np.float32))
+        self._masks: Dict[Tuple, np.ndarray] = {}
+        self.build_ms = round((time.monotonic() - started) * 1000, 1)
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    def search(self, query: str, top_k: int = 10, filters: Optional[Dict[str, Any]] = None) -> List[NodeWithScore]:
+        """
+        Best BM25 matches of `query` among the documents matching `filters`, highest score
+        first; documents sharing no term are left out.
+        """
+        scores = np.zeros(len(self.nodes), dtype=np.float32)
+        for term, count in terms(query).items():
+            posting = self._postings.get(term)
+            if posting is not None:
+                ids, weights = posting
+                scores[ids] += _WEIGHTS[term[0]] * count * weights
+        if filters:
+            key = filter_key(filters)
+            mask = self._masks.get(key)
+            if mask is None:
+                mask = self._masks[key] = metadata_mask([node.metadata for node in self.nodes], filters)
+            scores[~mask] = 0.0
+        matched = int(np.count_nonzero(scores))
+        if not matched:
+            return []
+        k = min(top_k, matched)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [NodeWithScore(node=self.nodes[i], score=float(scores[i])) for i in top]
+
+    def stats(self) -> Dict[str, Any]:
+        return {"documents": len(self.nodes), "terms": len(self._postings), "build_ms": self.build_ms}
+
+
+def reciprocal_rank_fusion(result_lists: List[List[NodeWithScore]], k: int = 60) -> List[NodeWithScore]:
+    """
+    Fuse ranked lists by sum of 1 / (k + rank). Nodes are matched on their question text,
+    since a bank built from the CSVs does not share the Chroma node ids.
+    """
+    fused: Dict[str, float] = defaultdict(float)
+    first: Dict[str, NodeWithScore] = {}
+    for results in result_lists:
+        for rank, node in enumerate(results, start=1):
+            key = (node.node.get_content() or "").strip()
+            if not key:
+                continue
+            fused[key] += 1.0 / (k + rank)
+            first.setdefault(key, node)
+    ranked = sorted(fused, key=fused.get, reverse=True)
+    return [NodeWithScore(node=first[key].node, score=fused[key]) for key in ranked]
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Dense retrieval (the wrapped VectorIndexRetriever) fused with BM25 over the same
+    questions by reciprocal-rank fusion. Short technical keywords ("API FastAPI",
+    "thuật toán Dijkstra") then also find questions that contain the exact terms.
+    """
+
+    def __init__(
+        self,
+        vector_retriever: BaseRetriever,
+        lexical_index: Optional[LexicalIndex],
+        top_k: int = 10,
+        lexical_top_k: Optional[int] = None,
+        rrf_k: int = 60,
+        filters: Optional[Dict[str, Any]] = None,
+        callback_manager: Optional[CallbackManager] = None,
+    ):
+        self.vector_retriever = vector_retriever
+        # Same filters as the dense side, in dict form
+        self.filters = filters
+        self.lexical_index = lexical_index
+        self.top_k = top_k
+        self.lexical_top_k = lexical_top_k or top_k
+        self.rrf_k = rrf_k
+        # Same attribute VectorIndexRetriever has, so callers can still reach the store
+        self._vector_store = getattr(vector_retriever, "_vector_store", None)
+        super().__init__(callback_manager=callback_manager)
+
+    def embeddings(self, ids: List[str]) -> Optional[Dict[str, Any]]:
+        """Stored vectors of the dense side, when it can look them up by node id."""
+        lookup = getattr(self.vector_retriever, "embeddings", None)
+        return lookup(ids) if callable(lookup) else None
+
+    def _fuse(self, query_bundle: QueryBundle, dense: List[NodeWithScore]) -> List[NodeWithScore]:
+        if not self.lexical_index or not len(self.lexical_index):
+            return dense[:self.top_k]
+        lexical = self.lexical_index.search(query_bundle.query_str, self.lexical_top_k, self.filters)
+        return reciprocal_rank_fusion([dense, lexical], self.rrf_k)[:self.top_k]
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        return self._fuse(query_bundle, self.vector_retriever.retrieve(query_bundle))
+
+    async def _aretrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        return self._fuse(query_bundle, await self.vector_retriever.aretrieve(query_bundle))
@@ -0,0 +1,291 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Any, Dict, Optional
+from dotenv import load_dotenv
+load_dotenv()
+
+# Cache config (memory | disk | mongo | none)
+LLM_CACHE_BACKEND = os.getenv("LLM_CACHE_BACKEND", "memory").strip().lower()
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "512"))
+LLM_CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", "86400"))
+LLM_CACHE_DIR = os.path.abspath(os.getenv("LLM_CACHE_DIR", "./temp/llm_cache"))
+
+
+def make_cache_key(**parts: Any) -> str:
+    """Build a content-addressed key from every input that affects the LLM output.
+
+    Args:
+        **parts: deployment, model, system_prompt, prompt, response_format, temperature, ...
+
+    Returns:
+        str: sha256 hex digest of the canonical JSON of the parts.
+    """
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class CacheBackend:
+    """Base class for response cache backends."""
+
+    name = "base"
+    # Backends doing network/disk I/O are moved off the event loop
+    blocking = False
+
+    def __init__(self, ttl_seconds: int = LLM_CACHE_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[str]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: str) -> None:
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+    def size(self) -> int:
+        return -1
+
+    def _expired(self, created_at: float) -> bool:
+        return self.ttl_seconds > 0 and (time.time() - created_at) > self.ttl_seconds
+
+
+class InMemoryLRUBackend(CacheBackend):
+    """Process-local LRU capped at `max_entries`."""
+
+    name = "memory"
+
+    def __init__(self, max_entries: int = LLM_CACHE_MAX_ENTRIES, ttl_seconds: int = LLM_CACHE_TTL_SECONDS):
+        super().__init__(ttl_seconds)
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, created_at = item
+            if self._expired(created_at):
+                del self._data[key]
+                self.evictions += 1
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str) -> None:
+        with self._lock:
+            self._data[key] = (value, time.time())
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def size(self) -> int:
+        return len(self._data)
+
+
+class DiskCacheBackend(CacheBackend):
+    """One JSON file per entry under `directory`, sharded by key prefix.
+
+    Survives restarts and is shared by workers on the same host. The entry count is
+    capped at `max_entries`; the oldest files are removed first.
+    """
+
+    name = "disk"
+    blocking = True
+
+    def __init__(self, directory: str = LLM_CACHE_DIR, max_entries: int = LLM_CACHE_MAX_ENTRIES * 20, ttl_seconds: int = LLM_CACHE_TTL_SECONDS):
+        super().__init__(ttl_seconds)
+        self.directory = directory
+        self.max_entries = max_entries
+        self._writes_since_prune = 0
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def get(self, key: str) -> Optional[str]:
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                item = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if self._expired(item.get("created_at", 0)):
+            self._remove(path)
+            return None
+        return item.get("value")
+
+    def set(self, key: str, value: str) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"value": value, "created_at": time.time()}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        # Pruning scans the directory, so only do it every so often
+        self._writes_since_prune += 1
+        if self._writes_since_prune >= 50:
+            self._writes_since_prune = 0
+            self._prune()
+
+    def _remove(self, path: str) -> None:
+        try:
+            os.remove(path)
+            self.evictions += 1
+        except OSError:
+            pass
+
+    def _entries(self):
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(".json"):
+                    path = os.path.join(root, name)
+                    try:
+                        yield os.path.getmtime(path), path
+                    except OSError:
+                        continue
+
+    def _prune(self) -> None:
+        entries = sorted(self._entries())
+        now = time.time()
+        overflow = len(entries) - self.max_entries
+        for i, (mtime, path) in enumerate(entries):
+            if i < overflow or (self.ttl_seconds > 0 and now - mtime > self.ttl_seconds):
+                self._remove(path)
+
+    def clear(self) -> None:
+        for _, path in list(self._entries()):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def size(self) -> int:
+        return sum(1 for _ in self._entries())
+
+
+class MongoCacheBackend(CacheBackend):
+    """Cache stored in the `llm_response_cache` collection; MongoDB expires entries via a TTL index."""
+
+    name = "mongo"
+    blocking = True
+
+    def __init__(self, ttl_seconds: int = LLM_CACHE_TTL_SECONDS):
+        super().__init__(ttl_seconds)
+        from src.storage.llm_cache_storage import CRUDLLMCache
+        self.storage = CRUDLLMCache()
+        try:
+            self.storage.collection.create_index("created_at", expireAfterSeconds=max(ttl_seconds, 1))
+        except Exception as e:
+            print(f"[LLMCache] Could not create TTL index: {e}")
+
+    def get(self, key: str) -> Optional[str]:
+        doc = self.storage.find_one_doc({"_id": key})
+        if not doc:
+            return None
+        # The TTL monitor runs about once a minute, so double-check here
+        created_at = doc.get("created_at")
+        if created_at and self.ttl_seconds > 0 and datetime.utcnow() - created_at > timedelta(seconds=self.ttl_seconds):
+            return None
+        return doc.get("value")
+
+    def set(self, key: str, value: str) -> None:
+        self.storage.replace_one_doc(
+            {"_id": key},
+            {"_id": key, "value": value, "created_at": datetime.utcnow()},
+            upsert=True,
+        )
+
+    def clear(self) -> None:
+        self.storage.delete_many_doc({})
+
+    def size(self) -> int:
+        return self.storage.count_documents({})
+
+
+class LLMResponseCache:
+    """Content-addressed cache for LLM responses with hit/miss/eviction counters."""
+
+    def __init__(self, backend: CacheBackend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    async def aget(self, key: str) -> Optional[str]:
+        try:
+            if self.backend.blocking:
+                value = await asyncio.to_thread(self.backend.get, key)
+            else:
+                value = self.backend.get(key)
+        except Exception as e:
+            # Cache failures must never fail the request
+            self.errors += 1
+            print(f"[LLMCache] get failed: {e}")
+            value = None
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def aset(self, key: str, value: str) -> None:
+        try:
+            if self.backend.blocking:
+                await asyncio.to_thread(self.backend.set, key, value)
+            else:
+                self.backend.set(key, value)
+        except Exception as e:
+            self.errors += 1
+            print(f"[LLMCache] set failed: {e}")
+
+    def clear(self) -> None:
+        self.backend.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "backend": self.backend.name,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.backend.evictions,
+            "errors": self.errors,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "size": self.backend.size() if not self.backend.blocking else None,
+        }
+
+
+def create_cache_backend(name: str) -> Optional[CacheBackend]:
+    if name == "memory":
+        return InMemoryLRUBackend()
+    if name == "disk":
+        return DiskCacheBackend()
+    if name == "mongo":
+        return MongoCacheBackend()
+    return None
+
+
+@lru_cache(maxsize=1)
+def get_response_cache() -> Optional[LLMResponseCache]:
+    """Process-wide response cache, or None when LLM_CACHE_BACKEND=none."""
+    try:
+        backend = create_cache_backend(LLM_CACHE_BACKEND)
+    except Exception as e:
+        print(f"[LLMCache] Backend '{LLM_CACHE_BACKEND}' unavailable, falling back to memory: {e}")
+        backend = InMemoryLRUBackend()
+    return LLMResponseCache(backend) if backend else None
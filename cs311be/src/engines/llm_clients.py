@@ -0,0 +1,396 @@
+import os
+import asyncio
+import threading
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import httpx
+from dotenv import load_dotenv
+from llama_index.llms.azure_openai import AzureOpenAI
+from llama_index.llms.openai import OpenAI
+from llama_index.core.llms import ChatMessage
+from llama_index.core.bridge.pydantic import PrivateAttr
+from src.engines.llm_scheduler import (
+    get_llm_scheduler,
+    estimate_tokens,
+    is_rate_limited,
+    is_retryable,
+    retry_after_seconds,
+    LLM_SCHED_COMPLETION_TOKENS,
+    LLM_SCHED_MAX_RETRIES,
+)
+from src.engines.offline_backend import is_offline_backend, OfflineLLM, OfflineEmbedding
+from src.engines.llm_telemetry import LLMCallRecord, track_llm_call, tracked_stream
+from src.engines.deployment_pool import DeploymentPool, PooledLLM, PoolMember, key_fingerprint, member_name, pool_member_configs
+
+try:
+    from llama_index.embeddings.azure_openai import AzureOpenAIEmbedding
+except Exception:
+    AzureOpenAIEmbedding = None  # optional
+load_dotenv()
+
+# Connection pool shared by every client that talks to the same endpoint
+LLM_HTTP_MAX_CONNECTIONS = int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "64"))
+LLM_HTTP_MAX_KEEPALIVE = int(os.getenv("LLM_HTTP_MAX_KEEPALIVE", "32"))
+LLM_HTTP_KEEPALIVE_EXPIRY = float(os.getenv("LLM_HTTP_KEEPALIVE_EXPIRY", "120"))
+LLM_HTTP_TIMEOUT = float(os.getenv("LLM_HTTP_TIMEOUT", "60"))
+
+
+def _prompt_text(messages: Sequence[ChatMessage] = (), prompt: str = "") -> str:
+    return prompt + "".join(str(m.content or "") for m in messages)
+
+
+def _unretried(method):
+    """The undecorated OpenAI method, so llama-index's own retry loop does not hide 429s."""
+    return getattr(method, "__wrapped__", method)
+
+
+class ScheduledAzureOpenAI(AzureOpenAI):
+    """
+    AzureOpenAI whose async requests go through the deployment's LLMScheduler.
+
+    The scheduler owns admission, 429 backoff and retries for the async paths used by
+    call_llm and the FunctionAgent; sync calls keep llama-index's built-in retries.
+    Every request, sync or async, is recorded in LLMTelemetry.
+    """
+
+    # Set on deployment-pool members: a scheduler per (deployment, resource), and no
+    # in-place retries because the pool fails over to another member instead
+    _scheduler_name: Optional[str] = PrivateAttr(default=None)
+    _max_retries: int = PrivateAttr(default=LLM_SCHED_MAX_RETRIES)
+
+    @property
+    def scheduler_name(self) -> str:
+        return self._scheduler_name or self.engine
+
+    def _get_credential_kwargs(self, is_async: bool = False, **kwargs: Any) -> Dict[str, Any]:
+        credential_kwargs = super()._get_credential_kwargs(is_async=is_async, **kwargs)
+        if is_async:
+            # The openai SDK would otherwise retry 429s itself before the scheduler sees them
+            credential_kwargs["max_retries"] = 0
+        return credential_kwargs
+
+    def _estimate(self, messages: Sequence[ChatMessage] = (), prompt: str = "", **kwargs: Any) -> int:
+        return estimate_tokens(_prompt_text(messages, prompt)) + int(kwargs.get("max_tokens") or self.max_tokens or LLM_SCHED_COMPLETION_TOKENS)
+
+    def _chat(self, messages: Sequence[ChatMessage], **kwargs: Any):
+        with track_llm_call(self.model, self.scheduler_name, _prompt_text(messages)) as record:
+            response = super()._chat(messages, **kwargs)
+            record.set_response(response)
+        return response
+
+    def _complete(self, prompt: str, **kwargs: Any):
+        with track_llm_call(self.model, self.scheduler_name, prompt) as record:
+            response = super()._complete(prompt, **kwargs)
+            record.set_response(response)
+        return response
+
+    def _stream_chat(self, messages: Sequence[ChatMessage], **kwargs: Any):
+        record = LLMCallRecord(self.model, self.scheduler_name, _prompt_text(messages))
+        return tracked_stream(super()._stream_chat(messages, **kwargs), record)
+
+    def _stream_complete(self, prompt: str, **kwargs: Any):
+        record = LLMCallRecord(self.model, self.scheduler_name, prompt)
+        return tracked_stream(super()._stream_complete(prompt, **kwargs), record)
+
+    async def _achat(self, messages: Sequence[ChatMessage], **kwargs: Any):
+        scheduler = get_llm_scheduler().get(self.scheduler_name)
+        with track_llm_call(self.model, self.scheduler_name, _prompt_text(messages)) as record:
+            response = await scheduler.run(
+                lambda: _unretried(OpenAI._achat)(self, messages, **kwargs),
+                est_tokens=self._estimate(messages, **kwargs),
+                on_retry=record.note_retry,
+                max_retries=self._max_retries,
+            )
+            record.set_response(response)
+        return response
+
+    async def _acomplete(self, prompt: str, **kwargs: Any):
+        scheduler = get_llm_scheduler().get(self.scheduler_name)
+        with track_llm_call(self.model, self.scheduler_name, prompt) as record:
+            response = await scheduler.run(
+                lambda: _unretried(OpenAI._acomplete)(self, prompt, **kwargs),
+                est_tokens=self._estimate(prompt=prompt, **kwargs),
+                on_retry=record.note_retry,
+                max_retries=self._max_retries,
+            )
+            record.set_response(response)
+        return response
+
+    async def _scheduled_stream(self, open_stream, est_tokens: int, record: LLMCallRecord):
+        """Hold a slot for the whole stream; retry only if nothing was yielded yet."""
+        scheduler = get_llm_scheduler().get(self.scheduler_name)
+        record.streaming = True
+        attempt = 0
+        last = None
+        while True:
+            await scheduler.acquire(est_tokens)
+            yielded = False
+            try:
+                async for chunk in await open_stream():
+                    record.first_byte()
+                    yielded = True
+                    last = chunk
+                    yield chunk
+            except Exception as e:
+                limited = is_rate_limited(e)
+                retry_after = retry_after_seconds(e) if limited else None
+                await scheduler.release(success=False, rate_limited=limited, retry_after=retry_after)
+                if yielded or not is_retryable(e) or attempt >= self._max_retries:
+                    scheduler.failures += 1
+                    record.finish(error=e)
+                    raise
+                scheduler.retries += 1
+                record.note_retry()
+                await asyncio.sleep(scheduler.backoff_delay(attempt, retry_after))
+                attempt += 1
+                continue
+            except BaseException as e:
+                await scheduler.release(success=False)
+                record.finish(error=e)
+                raise
+            await scheduler.release(success=True)
+            record.set_response(last)
+            record.finish()
+            return
+
+    async def _astream_chat(self, messages: Sequence[ChatMessage], **kwargs: Any):
+        return self._scheduled_stream(
+            lambda: _unretried(OpenAI._astream_chat)(self, messages, **kwargs),
+            self._estimate(messages, **kwargs),
+            LLMCallRecord(self.model, self.scheduler_name, _prompt_text(messages)),
+        )
+
+    async def _astream_complete(self, prompt: str, **kwargs: Any):
+        return self._scheduled_stream(
+            lambda: _unretried(OpenAI._astream_complete)(self, prompt, **kwargs),
+            self._estimate(prompt=prompt, **kwargs),
+            LLMCallRecord(self.model, self.scheduler_name, prompt),
+        )
+
+
+class LLMClientRegistry:
+    """
+    Process-wide registry of Azure OpenAI clients.
+
+    Each (endpoint, deployment, ...) combination is built exactly once and then shared
+    by every engine. All clients for one endpoint share a keep-alive httpx pool, so
+    constructing LLMEngine() on the request path costs a dict lookup instead of a new
+    client and a new TLS handshake. With LLM_BACKEND=offline it hands out the
+    deterministic stand-ins from offline_backend instead.
+    """
+
+    def __init__(self):
+        # Construction never awaits, so a plain lock is safe across async tasks too
+        self._lock = threading.Lock()
+        self._llms: Dict[Tuple, ScheduledAzureOpenAI] = {}
+        self._embeddings: Dict[Tuple, Any] = {}
+        self._http_clients: Dict[str, httpx.Client] = {}
+        self._async_http_clients: Dict[str, httpx.AsyncClient] = {}
+        self._pools: Dict[str, DeploymentPool] = {}
+        self.created = 0
+        self.reused = 0
+
+    def _limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=LLM_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=LLM_HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=LLM_HTTP_KEEPALIVE_EXPIRY,
+        )
+
+    def _get_http_clients(self, endpoint: Optional[str]) -> Tuple[httpx.Client, httpx.AsyncClient]:
+        """Return the (sync, async) httpx pools for an endpoint; caller holds the lock."""
+        pool_key = (endpoint or "").rstrip("/")
+        if pool_key not in self._http_clients:
+            self._http_clients[pool_key] = httpx.Client(limits=self._limits(), timeout=LLM_HTTP_TIMEOUT)
+            self._async_http_clients[pool_key] = httpx.AsyncClient(limits=self._limits(), timeout=LLM_HTTP_TIMEOUT)
+        return self._http_clients[pool_key], self._async_http_clients[pool_key]
+
+    def get_llm(
+        self,
+        model: str,
+        deployment: str,
+        api_key: str,
+        azure_endpoint: str,
+        api_version: str,
+        temperature: Optional[float] = None,
+    ) -> ScheduledAzureOpenAI:
+        """Get (or build once) the shared LLM client for a deployment (a pool if LLM_POOLS lists it)."""
+        base = {
+            "model": model,
+            "deployment": deployment,
+            "api_key": api_key,
+            "azure_endpoint": azure_endpoint,
+            "api_version": api_version,
+        }
+        members = pool_member_configs(deployment, base)
+        if members:
+            return self._get_pool(deployment, members, temperature)
+        return self._get_single_llm(temperature=temperature, **base)
+
+    def _get_single_llm(
+        self,
+        model: str,
+        deployment: str,
+        api_key: str,
+        azure_endpoint: str,
+        api_version: str,
+        temperature: Optional[float] = None,
+    ) -> ScheduledAzureOpenAI:
+        if is_offline_backend():
+            return self._get_offline_llm(model, deployment, temperature)
+        key = (azure_endpoint, deployment, model, api_version, api_key, temperature)
+        llm = self._llms.get(key)
+        if llm is not None:
+            self.reused += 1
+            return llm
+        with self._lock:
+            llm = self._llms.get(key)
+            if llm is None:
+                http_client, async_http_client = self._get_http_clients(azure_endpoint)
+                kwargs = {"temperature": temperature} if temperature is not None else {}
+                llm = ScheduledAzureOpenAI(
+                    model=model,
+                    engine=deployment,
+                    api_key=api_key,
+                    azure_endpoint=azure_endpoint,
+                    api_version=api_version,
+                    http_client=http_client,
+                    async_http_client=async_http_client,
+                    **kwargs,
+                )
+                self._llms[key] = llm
+                self.created += 1
+            else:
+                self.reused += 1
+            return llm
+
+    def _get_pool(self, name: str, members: List[Dict[str, Any]], temperature: Optional[float]) -> PooledLLM:
+        key = ("pool", name, temperature, tuple(
+            (m.get("azure_endpoint") or "", m.get("deployment") or "", m.get("model") or "", m.get("api_version") or "", key_fingerprint(m.get("api_key")))
+            for m in members
+        ))
+        pooled = self._llms.get(key)
+        if pooled is not None:
+            self.reused += 1
+            return pooled
+        pool_members = []
+        for config in members:
+            # A dedicated copy (sharing the connection pool): the member's per-resource
+            # scheduler and no-retry setting must not leak into non-pooled engines
+            llm = self._get_single_llm(temperature=temperature, **config).model_copy()
+            scheduler_name = member_name(llm.engine, config.get("azure_endpoint"), config.get("api_key"))
+            # The same member listed twice still needs a distinct name for failover
+            taken = {m.name for m in pool_members}
+            if scheduler_name in taken:
+                scheduler_name = next(f"{scheduler_name}#{i}" for i in range(2, len(members) + 2) if f"{scheduler_name}#{i}" not in taken)
+            llm._scheduler_name = scheduler_name
+            llm._max_retries = 0
+            pool_members.append(PoolMember(llm.scheduler_name, llm))
+        with self._lock:
+            pooled = self._llms.get(key)
+            if pooled is None:
+                pooled = PooledLLM(pool=DeploymentPool(name, pool_members))
+                self._llms[key] = pooled
+                self._pools[name] = pooled.pool
+            return pooled
+
+    def pool(self, name: str) -> Optional[DeploymentPool]:
+        """The DeploymentPool serving logical deployment `name`, None when it is not pooled."""
+        return self._pools.get(name)
+
+    def get_embedding(
+        self,
+        model: str,
+        deployment: str,
+        api_key: str,
+        azure_endpoint: str,
+        api_version: str,
+    ):
+        """Get (or build once) the shared embedding client for a deployment."""
+        if is_offline_backend():
+            return self._get_offline_embedding(model, deployment)
+        if AzureOpenAIEmbedding is None:
+            raise ImportError("llama-index-embeddings-azure-openai is not installed")
+        key = (azure_endpoint, deployment, model, api_version, api_key)
+        embed_model = self._embeddings.get(key)
+        if embed_model is not None:
+            self.reused += 1
+            return embed_model
+        with self._lock:
+            embed_model = self._embeddings.get(key)
+            if embed_model is None:
+                http_client, async_http_client = self._get_http_clients(azure_endpoint)
+                embed_model = AzureOpenAIEmbedding(
+                    model=model,
+                    deployment_name=deployment,
+                    api_key=api_key,
+                    azure_endpoint=azure_endpoint,
+                    api_version=api_version,
+                    http_client=http_client,
+                    async_http_client=async_http_client,
+                )
+                self._embeddings[key] = embed_model
+                self.created += 1
+            else:
+                self.reused += 1
+            return embed_model
+
+    def _get_offline_llm(self, model: Optional[str], deployment: Optional[str], temperature: Optional[float]) -> OfflineLLM:
+        # Prefixed so offline answers never share cache entries or schedulers with the real deployment
+        label = f"offline:{deployment or model or 'default'}"
+        key = ("offline", label, model, temperature)
+        with self._lock:
+            llm = self._llms.get(key)
+            if llm is None:
+                llm = OfflineLLM(
+                    model=model or "offline",
+                    engine=label,
+                    temperature=temperature if temperature is not None else 0.1,
+                )
+                self._llms[key] = llm
+                self.created += 1
+            else:
+                self.reused += 1
+            return llm
+
+    def _get_offline_embedding(self, model: Optional[str], deployment: Optional[str]) -> OfflineEmbedding:
+        label = f"offline:{deployment or model or 'default'}"
+        key = ("offline", label, model)
+        with self._lock:
+            embed_model = self._embeddings.get(key)
+            if embed_model is None:
+                embed_model = OfflineEmbedding(
+                    model_name=model or "offline-embedding",
+                    azure_deployment=label,
+                )
+                self._embeddings[key] = embed_model
+                self.created += 1
+            else:
+                self.reused += 1
+            return embed_model
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "offline" if is_offline_backend() else "azure",
+            "llm_clients": sorted({str(key[1]) for key in self._llms}),
+            "embedding_clients": sorted({str(key[1]) for key in self._embeddings}),
+            "http_pools": len(self._http_clients),
+            "deployment_pools": sorted(self._pools),
+            "created": self.created,
+            "reused": self.reused,
+        }
+
+    def pool_stats(self) -> Dict[str, Any]:
+        return {name: pool.stats() for name, pool in self._pools.items()}
+
+    async def aclose(self):
+        """Close every pooled connection (called on app shutdown)."""
+        for client in self._async_http_clients.values():
+            await client.aclose()
+        for client in self._http_clients.values():
+            client.close()
+
+
+@lru_cache(maxsize=1)
+def get_client_registry() -> LLMClientRegistry:
+    return LLMClientRegistry()
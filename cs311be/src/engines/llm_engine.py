@@ -5,13 +5,14 @@ from fastapi import HTTPException
 from dotenv import load_dotenv
 load_dotenv()
 
-from llama_index.llms.azure_openai import AzureOpenAI
 from llama_index.core.llms import ChatMessage
-
-try:
-    from llama_index.embeddings.azure_openai import AzureOpenAIEmbedding
-except Exception:
-    AzureOpenAIEmbedding = None  # optional
+from src.engines.llm_clients import get_client_registry
+from src.engines.llm_scheduler import is_rate_limited, retry_after_seconds
+from src.engines.llm_cache import make_cache_key
+from src.engines.single_flight import llm_flight
+from src.engines.offline_backend import is_offline_backend
+from src.engines.llm_telemetry import llm_call_context
+from src.engines.hedging import LLM_HEDGING, HedgedLLM
 
 # Env (giữ nguyên theo dự án hiện tại)
 api_key = os.getenv('AZURE_OPENAI_API_KEY')
@@ -24,6 +25,15 @@ model_name = os.getenv("model_name_2")
 deployment_name_2 = os.getenv("AZURE_OPENAI_DEPLOYMENT")
 model_name_2 = os.getenv("AZURE_OPENAI_MODEL_NAME")
 
+# Secondary deployment for hedged interview turns. It must serve the same model as the
+# primary (a duplicate that wins is returned as is) on another deployment or resource
+# (a copy of the primary only adds load to the deployment that is already slow);
+# without one LLM_HEDGING stays off
+hedge_deployment_name = os.getenv("LLM_HEDGE_DEPLOYMENT")
+hedge_model_name = os.getenv("LLM_HEDGE_MODEL_NAME")
+hedge_endpoint = os.getenv("LLM_HEDGE_ENDPOINT") or azure_endpoint
+hedge_api_key = os.getenv("LLM_HEDGE_API_KEY") or api_key
+
 embeding_model_name = os.getenv("EMBEDDING_MODEL_NAME")
 embeding_model_deployment_name = os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT")
 embedding_api_key = os.getenv("AZURE_OPENAI_EMBEDDING_API_KEY") or api_key
@@ -32,29 +42,38 @@ embedding_api_version = os.getenv("AZURE_OPENAI_EMBEDDING_API_VERSION") or api_v
 
 class LLMEngine:
     def __init__(self):
+        # Clients come from the process-wide registry, so constructing LLMEngine is cheap
+        registry = get_client_registry()
         # Giữ tương thích với practice
-        self.openai_llm = AzureOpenAI(
+        self.openai_llm = registry.get_llm(
             model=model_name or model_name_2,
-            engine=deployment_name or deployment_name_2,
+            deployment=deployment_name or deployment_name_2,
             api_key=api_key,
             azure_endpoint=azure_endpoint,
             api_version=api_version
         )
         # llm2 cho practice (fallback nếu biến thiếu)
-        self.llm2 = AzureOpenAI(
-            model=model_name_2 or model_name or (model_name or model_name_2),
-            engine=deployment_name_2 or deployment_name or (deployment_name or deployment_name_2),
+        self.llm2 = registry.get_llm(
+            model=model_name_2 or model_name,
+            deployment=deployment_name_2 or deployment_name,
             api_key=api_key,
             azure_endpoint=azure_endpoint,
             api_version=api_version,
         )
+        # LLM for turns a candidate is waiting on (agent steps, answer evaluation);
+        # with LLM_HEDGING=1 slow calls are duplicated onto the secondary deployment
+        self.turn_llm = self.openai_llm
+        if LLM_HEDGING:
+            secondary = self._hedge_secondary(registry)
+            if secondary is not None:
+                self.turn_llm = HedgedLLM(primary=self.openai_llm, secondary=secondary)
         # Embedding optional
         self.embed_model = None
-        if AzureOpenAIEmbedding and embeding_model_name and embeding_model_deployment_name:
+        if (embeding_model_name and embeding_model_deployment_name) or is_offline_backend():
             try:
-                self.embed_model = AzureOpenAIEmbedding(
+                self.embed_model = registry.get_embedding(
                     model=embeding_model_name,
-                    deployment_name=embeding_model_deployment_name,
+                    deployment=embeding_model_deployment_name,
                     api_key=embedding_api_key,
                     azure_endpoint=embedding_endpoint,
                     api_version=embedding_api_version,
@@ -62,13 +81,45 @@ class LLMEngine:
             except Exception as e:
                 print(f"[LLMEngine] Embedding init skipped: {e}")
 
-    async def call_llm(self, prompt, response_format=None):
+    def _hedge_secondary(self, registry):
+        """Same-model secondary for HedgedLLM, None (hedging off) when there is no distinct one."""
+        primary_deployment = deployment_name or deployment_name_2
+        if not hedge_deployment_name or (
+            hedge_deployment_name == primary_deployment
+            and (hedge_endpoint or "").rstrip("/") == (azure_endpoint or "").rstrip("/")
+        ):
+            print(
+                "[LLMEngine] LLM_HEDGING is on but LLM_HEDGE_DEPLOYMENT/LLM_HEDGE_ENDPOINT do not name a "
+                "deployment other than the primary; hedging disabled"
+            )
+            return None
+        if hedge_model_name and hedge_model_name != self.openai_llm.model:
+            print(
+                f"[LLMEngine] Hedge model {hedge_model_name} differs from the primary model "
+                f"{self.openai_llm.model}; hedged turns may be answered by either"
+            )
+        return registry.get_llm(
+            model=hedge_model_name or self.openai_llm.model,
+            deployment=hedge_deployment_name,
+            api_key=hedge_api_key,
+            azure_endpoint=hedge_endpoint,
+            api_version=api_version,
+        )
+
+    async def call_llm(self, prompt, response_format=None, call_site=None):
         try:
-            response = await self.openai_llm.acomplete(prompt, response_format=response_format)
+            key = make_cache_key(deployment=self.openai_llm.engine, model=self.openai_llm.model, prompt=prompt, response_format=response_format)
+            # Pin the caller's label before the call moves into the single-flight task
+            with llm_call_context(call_site):
+                response = await llm_flight.do(key, lambda: self.openai_llm.acomplete(prompt, response_format=response_format))
             return response.text
         except Exception as e:
             message = f'Error in call_llm function. Detail: {e}'
             print(message)
+            if is_rate_limited(e):
+                # Quota exhausted even after the scheduler's retries: tell the client when to come back
+                retry_after = retry_after_seconds(e) or 1
+                raise HTTPException(status_code=429, detail=message, headers={"Retry-After": str(int(retry_after + 0.999))})
             raise HTTPException(status_code=500, detail=message)
 
     # Thêm chat cho mock
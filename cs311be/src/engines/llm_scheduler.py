@@ -0,0 +1,246 @@
+import os
+import time
+import random
+import asyncio
+from collections import deque
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Dict, Optional
+from dotenv import load_dotenv
+load_dotenv()
+
+# Per-deployment concurrency window (AIMD moves the limit between MIN and MAX)
+LLM_SCHED_INITIAL_CONCURRENCY = float(os.getenv("LLM_SCHED_INITIAL_CONCURRENCY", "8"))
+LLM_SCHED_MIN_CONCURRENCY = float(os.getenv("LLM_SCHED_MIN_CONCURRENCY", "1"))
+LLM_SCHED_MAX_CONCURRENCY = float(os.getenv("LLM_SCHED_MAX_CONCURRENCY", "32"))
+# Tokens-per-minute budget per deployment, 0 = only limited by Azure's 429s
+LLM_SCHED_TPM_LIMIT = int(os.getenv("LLM_SCHED_TPM_LIMIT", "0"))
+LLM_SCHED_MAX_RETRIES = int(os.getenv("LLM_SCHED_MAX_RETRIES", "4"))
+LLM_SCHED_BASE_BACKOFF = float(os.getenv("LLM_SCHED_BASE_BACKOFF", "1.0"))
+LLM_SCHED_MAX_BACKOFF = float(os.getenv("LLM_SCHED_MAX_BACKOFF", "30"))
+# Expected completion size used when estimating the tokens of a request
+LLM_SCHED_COMPLETION_TOKENS = int(os.getenv("LLM_SCHED_COMPLETION_TOKENS", "512"))
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token), good enough for TPM budgeting."""
+    return len(text or "") // 4 + 1
+
+
+def _status_code(e: Exception) -> Optional[int]:
+    status = getattr(e, "status_code", None)
+    if status is None and getattr(e, "response", None) is not None:
+        status = getattr(e.response, "status_code", None)
+    return status
+
+
+def is_rate_limited(e: Exception) -> bool:
+    return _status_code(e) == 429 or type(e).__name__ == "RateLimitError"
+
+
+def is_retryable(e: Exception) -> bool:
+    """429s, 5xx, timeouts and dropped connections are worth another attempt."""
+    if is_rate_limited(e):
+        return True
+    status = _status_code(e)
+    if status is not None:
+        return status >= 500
+    return type(e).__name__ in ("APIConnectionError", "APITimeoutError", "ConnectError", "ReadTimeout", "TimeoutException")
+
+
+def retry_after_seconds(e: Exception) -> Optional[float]:
+    """Read Retry-After (or Azure's retry-after-ms) from an API error, if present."""
+    response = getattr(e, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        pass
+    return None
+
+
+class DeploymentScheduler:
+    """
+    Admission control for one Azure deployment.
+
+    Caps in-flight requests with an AIMD window (additive increase on success,
+    halve on 429), keeps the estimated tokens of the last minute under the TPM
+    budget, and pauses every caller after a 429 until Retry-After has passed.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        initial_limit: float = LLM_SCHED_INITIAL_CONCURRENCY,
+        min_limit: float = LLM_SCHED_MIN_CONCURRENCY,
+        max_limit: float = LLM_SCHED_MAX_CONCURRENCY,
+        tpm_limit: int = LLM_SCHED_TPM_LIMIT,
+    ):
+        self.name = name
+        self.limit = initial_limit
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.tpm_limit = tpm_limit
+        self.in_flight = 0
+        self.waiting = 0
+        self.cooldown_until = 0.0
+        self._last_decrease = 0.0
+        self._cond: Optional[asyncio.Condition] = None
+        self._tokens: deque = deque()  # (timestamp, tokens) within the last 60 s
+        self._tokens_in_window = 0
+        self._wait_times: deque = deque(maxlen=1000)
+        self.requests = 0
+        self.rate_limited = 0
+        self.retries = 0
+        self.failures = 0
+
+    @property
+    def capacity(self) -> int:
+        return max(1, int(self.limit))
+
+    def _condition(self) -> asyncio.Condition:
+        # Created lazily so it binds to the serving event loop
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        return self._cond
+
+    def _trim_tokens(self, now: float):
+        while self._tokens and now - self._tokens[0][0] >= 60:
+            self._tokens_in_window -= self._tokens.popleft()[1]
+
+    def _wait_needed(self, now: float, est_tokens: int) -> Optional[float]:
+        """Seconds to wait before dispatching (None = wait for a release), or 0 to go."""
+        if now < self.cooldown_until:
+            return self.cooldown_until - now
+        if self.in_flight >= self.capacity:
+            return None
+        if self.tpm_limit > 0:
+            self._trim_tokens(now)
+            if self._tokens and self._tokens_in_window + est_tokens > self.tpm_limit:
+                return max(0.05, 60 - (now - self._tokens[0][0]))
+        return 0
+
+    async def acquire(self, est_tokens: int = 0):
+        started = time.monotonic()
+        cond = self._condition()
+        self.waiting += 1
+        try:
+            async with cond:
+                while True:
+                    now = time.monotonic()
+                    wait_for = self._wait_needed(now, est_tokens)
+                    if wait_for == 0:
+                        break
+                    try:
+                        # Waiting on a free slot still polls, in case a notify was missed
+                        await asyncio.wait_for(cond.wait(), timeout=wait_for if wait_for is not None else 0.5)
+                    except asyncio.TimeoutError:
+                        pass
+                self.in_flight += 1
+                self.requests += 1
+                if est_tokens:
+                    self._tokens.append((now, est_tokens))
+                    self._tokens_in_window += est_tokens
+        finally:
+            self.waiting -= 1
+        self._wait_times.append(time.monotonic() - started)
+
+    async def release(self, success: bool = True, rate_limited: bool = False, retry_after: Optional[float] = None):
+        # Bookkeeping happens before any await so a cancelled caller cannot leak a slot
+        self.in_flight -= 1
+        now = time.monotonic()
+        if rate_limited:
+            self.rate_limited += 1
+            # A burst of 429s for the same window only halves the limit once
+            if now - self._last_decrease > max(retry_after or 0, 1.0):
+                self.limit = max(self.min_limit, self.limit / 2)
+                self._last_decrease = now
+            pause = retry_after if retry_after is not None else LLM_SCHED_BASE_BACKOFF
+            self.cooldown_until = max(self.cooldown_until, now + pause)
+        elif success:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+        cond = self._condition()
+        async with cond:
+            cond.notify_all()
+
+    def backoff_delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Retry-After when the server gave one, else capped exponential; plus jitter."""
+        if retry_after is not None:
+            return retry_after + random.uniform(0, LLM_SCHED_BASE_BACKOFF)
+        delay = min(LLM_SCHED_MAX_BACKOFF, LLM_SCHED_BASE_BACKOFF * (2 ** attempt))
+        return random.uniform(delay / 2, delay)
+
+    async def run(
+        self,
+        call: Callable[[], Awaitable[Any]],
+        est_tokens: int = 0,
+        max_retries: int = LLM_SCHED_MAX_RETRIES,
+        on_retry: Optional[Callable[[], None]] = None,
+    ):
+        """Run `call` inside a slot, retrying 429/5xx with jittered backoff."""
+        attempt = 0
+        while True:
+            await self.acquire(est_tokens)
+            try:
+                result = await call()
+            except BaseException as e:
+                limited = isinstance(e, Exception) and is_rate_limited(e)
+                retry_after = retry_after_seconds(e) if limited else None
+                await self.release(success=False, rate_limited=limited, retry_after=retry_after)
+                if not isinstance(e, Exception) or not is_retryable(e) or attempt >= max_retries:
+                    self.failures += 1
+                    raise
+                self.retries += 1
+                if on_retry:
+                    on_retry()
+                await asyncio.sleep(self.backoff_delay(attempt, retry_after))
+                attempt += 1
+                continue
+            await self.release(success=True)
+            return result
+
+    def stats(self) -> Dict[str, Any]:
+        waits = sorted(self._wait_times)
+
+        def pct(p: float) -> float:
+            return round(waits[min(len(waits) - 1, int(p * len(waits)))] * 1000, 1) if waits else 0.0
+
+        self._trim_tokens(time.monotonic())
+        return {
+            "limit": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "queue_depth": self.waiting,
+            "wait_ms_p50": pct(0.5),
+            "wait_ms_p95": pct(0.95),
+            "wait_ms_max": round(waits[-1] * 1000, 1) if waits else 0.0,
+            "tokens_last_minute": self._tokens_in_window,
+            "tpm_limit": self.tpm_limit,
+            "requests": self.requests,
+            "rate_limited": self.rate_limited,
+            "retries": self.retries,
+            "failures": self.failures,
+            "cooling_down": time.monotonic() < self.cooldown_until,
+        }
+
+
+class LLMScheduler:
+    """Holds one DeploymentScheduler per deployment name."""
+
+    def __init__(self):
+        self._deployments: Dict[str, DeploymentScheduler] = {}
+
+    def get(self, deployment: str) -> DeploymentScheduler:
+        scheduler = self._deployments.get(deployment)
+        if scheduler is None:
+            scheduler = self._deployments.setdefault(deployment, DeploymentScheduler(deployment))
+        return scheduler
+
+    def stats(self) -> Dict[str, Any]:
+        return {name: s.stats() for name, s in self._deployments.items()}
+
+
+@lru_cache(maxsize=1)
+def get_llm_scheduler() -> LLMScheduler:
+    return LLMScheduler()
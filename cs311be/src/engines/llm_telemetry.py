@@ -0,0 +1,381 @@
+import os
+import sys
+import json
+import time
+import atexit
+import threading
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+from src.engines.llm_scheduler import estimate_tokens
+load_dotenv()
+
+# Append one JSON line per LLM call to this file (empty = no trace)
+LLM_TRACE_PATH = os.getenv("LLM_TRACE_PATH", "")
+# The trace is appended in batches by a background thread at most this often; records
+# beyond LLM_TRACE_BUFFER waiting for it are dropped rather than held in memory
+LLM_TRACE_FLUSH_MS = int(os.getenv("LLM_TRACE_FLUSH_MS", "1000"))
+LLM_TRACE_BUFFER = int(os.getenv("LLM_TRACE_BUFFER", "10000"))
+# USD per 1K tokens as {"model": [prompt, completion]}; longest model-name prefix wins
+LLM_PRICING = json.loads(os.getenv("LLM_PRICING", "") or json.dumps({
+    "gpt-4o-mini": [0.00015, 0.0006],
+    "gpt-4o": [0.0025, 0.01],
+    "gpt-4.1-mini": [0.0004, 0.0016],
+    "gpt-4.1": [0.002, 0.008],
+}))
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is open-ended
+LATENCY_BUCKETS_MS = (50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+
+_call_site: ContextVar[Optional[str]] = ContextVar("llm_call_site", default=None)
+_default_site: ContextVar[Optional[str]] = ContextVar("llm_default_call_site", default=None)
+_cache_status: ContextVar[str] = ContextVar("llm_cache_status", default="none")
+
+# Frames from these files are plumbing, never a call site
+_PLUMBING_FILES = {
+    os.path.join("engines", name)
+    for name in (
+        "llm_telemetry.py", "llm_clients.py", "llm_scheduler.py", "offline_backend.py",
+        "single_flight.py", "llm_engine.py", "resume_flow_llm_engine.py", "hedging.py",
+    )
+}
+_LIBRARY_MARKERS = (f"{os.sep}site-packages{os.sep}", f"{os.sep}lib{os.sep}python", "<frozen")
+# Reaching the event loop means the task has no application caller (only the entrypoint below it)
+_EVENT_LOOP_MARKER = f"{os.sep}asyncio{os.sep}"
+
+
+@contextmanager
+def call_site(label: str):
+    """Attribute every LLM call made inside the block to `label`."""
+    token = _call_site.set(label)
+    try:
+        yield
+    finally:
+        _call_site.reset(token)
+
+
+@contextmanager
+def default_call_site(label: str):
+    """Label for calls whose stack has no application frame, e.g. agent steps run by the workflow."""
+    token = _default_site.set(label)
+    try:
+        yield
+    finally:
+        _default_site.reset(token)
+
+
+@contextmanager
+def llm_call_context(label: Optional[str] = None, cache: str = "none"):
+    """Pin the call-site label and cache status before handing the call to another task."""
+    site_token = _call_site.set(label or current_call_site())
+    cache_token = _cache_status.set(cache)
+    try:
+        yield
+    finally:
+        _cache_status.reset(cache_token)
+        _call_site.reset(site_token)
+
+
+def _caller_label() -> Optional[str]:
+    """`module.function` of the nearest application frame outside the LLM plumbing."""
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if _EVENT_LOOP_MARKER in filename and "site-packages" not in filename:
+            return None
+        if not any(marker in filename for marker in _LIBRARY_MARKERS) and not any(filename.endswith(p) for p in _PLUMBING_FILES):
+            module = os.path.splitext(os.path.basename(filename))[0]
+            return f"{module}.{frame.f_code.co_name}"
+        frame = frame.f_back
+    return None
+
+
+def current_call_site() -> str:
+    return _call_site.get() or _caller_label() or _default_site.get() or "unknown"
+
+
+def price_per_1k(model: str) -> Tuple[float, float]:
+    matches = [name for name in LLM_PRICING if (model or "").startswith(name)]
+    if not matches:
+        return 0.0, 0.0
+    prompt_price, completion_price = LLM_PRICING[max(matches, key=len)]
+    return float(prompt_price), float(completion_price)
+
+
+class LLMCallRecord:
+    """Everything measured about one LLM request."""
+
+    def __init__(self, model: str, deployment: str, prompt_text: str = "", call_site: Optional[str] = None, cache: Optional[str] = None):
+        self.call_site = call_site or current_call_site()
+        self.model = model or ""
+        self.deployment = deployment or ""
+        self.cache = cache or _cache_status.get()
+        self.streaming = False
+        self.started = time.monotonic()
+        self.ttfb_ms: Optional[float] = None
+        self.latency_ms: Optional[float] = None
+        self.prompt_tokens = estimate_tokens(prompt_text) if prompt_text else 0
+        self.completion_tokens = 0
+        self.tokens_estimated = True
+        self.retries = 0
+        self.status = "ok"
+        self.error: Optional[str] = None
+
+    def note_retry(self):
+        self.retries += 1
+
+    def first_byte(self):
+        if self.ttfb_ms is None:
+            self.ttfb_ms = (time.monotonic() - self.started) * 1000
+
+    def set_response(self, response: Any):
+        """Read token usage from a ChatResponse/CompletionResponse, else estimate it."""
+        usage = getattr(response, "additional_kwargs", None) or {}
+        if usage.get("completion_tokens") is not None:
+            self.prompt_tokens = int(usage.get("prompt_tokens") or self.prompt_tokens)
+            self.completion_tokens = int(usage["completion_tokens"])
+            self.tokens_estimated = False
+            return
+        message = getattr(response, "message", None)
+        text = getattr(message, "content", None) if message is not None else getattr(response, "text", None)
+        self.completion_tokens = estimate_tokens(text or "")
+
+    @property
+    def cost_usd(self) -> float:
+        prompt_price, completion_price = price_per_1k(self.model)
+        return (self.prompt_tokens * prompt_price + self.completion_tokens * completion_price) / 1000
+
+    def finish(self, error: Optional[BaseException] = None):
+        self.latency_ms = (time.monotonic() - self.started) * 1000
+        if self.ttfb_ms is None:
+            self.ttfb_ms = self.latency_ms
+        if error is not None:
+            self.status = "error"
+            self.error = f"{type(error).__name__}: {error}"[:300]
+        get_llm_telemetry().observe(self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "ts": datetime.utcnow().isoformat(timespec="milliseconds") + "Z",
+            "call_site": self.call_site,
+            "model": self.model,
+            "deployment": self.deployment,
+            "cache": self.cache,
+            "streaming": self.streaming,
+            "status": self.status,
+            "ttfb_ms": round(self.ttfb_ms or 0.0, 1),
+            "latency_ms": round(self.latency_ms or 0.0, 1),
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "tokens_estimated": self.tokens_estimated,
+            "retries": self.retries,
+            "cost_usd": round(self.cost_usd, 6),
+            "error": self.error,
+        }
+
+
+@contextmanager
+def track_llm_call(model: str, deployment: str, prompt_text: str = ""):
+    """Measure the wrapped request; the caller passes the response to record.set_response."""
+    record = LLMCallRecord(model, deployment, prompt_text)
+    try:
+        yield record
+    except BaseException as e:
+        record.finish(error=e)
+        raise
+    record.finish()
+
+
+def tracked_stream(stream, record: LLMCallRecord):
+    """Pass a sync response stream through, recording TTFB and the final usage."""
+    record.streaming = True
+    last = None
+    try:
+        for chunk in stream:
+            record.first_byte()
+            last = chunk
+            yield chunk
+    except BaseException as e:
+        record.finish(error=e)
+        raise
+    record.set_response(last)
+    record.finish()
+
+
+class Histogram:
+    """Fixed-bucket histogram plus a bounded sample for percentiles."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS_MS, sample_size: int = 1000):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.n = 0
+        self._sample: deque = deque(maxlen=sample_size)
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.n += 1
+        self._sample.append(value)
+
+    def percentile(self, p: float) -> float:
+        values = sorted(self._sample)
+        return round(values[min(len(values) - 1, int(p * len(values)))], 1) if values else 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        labels = [f"le_{b}" for b in self.buckets] + ["le_inf"]
+        return {
+            "count": self.n,
+            "avg": round(self.total / self.n, 1) if self.n else 0.0,
+            "p50": self.percentile(0.5),
+            "p95": self.percentile(0.95),
+            "p99": self.percentile(0.99),
+            "buckets": dict(zip(labels, self.counts)),
+        }
+
+
+class CallSiteStats:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.cache = {}
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cost_usd = 0.0
+        self.latency = Histogram()
+        self.ttfb = Histogram()
+
+    def observe(self, record: LLMCallRecord):
+        self.calls += 1
+        self.errors += record.status == "error"
+        self.retries += record.retries
+        self.cache[record.cache] = self.cache.get(record.cache, 0) + 1
+        self.prompt_tokens += record.prompt_tokens
+        self.completion_tokens += record.completion_tokens
+        self.cost_usd += record.cost_usd
+        self.latency.observe(record.latency_ms or 0.0)
+        self.ttfb.observe(record.ttfb_ms or 0.0)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "retries": self.retries,
+            "cache": dict(self.cache),
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "tokens_per_call": round((self.prompt_tokens + self.completion_tokens) / self.calls, 1) if self.calls else 0.0,
+            "cost_usd": round(self.cost_usd, 4),
+            "latency_ms": self.latency.stats(),
+            "ttfb_ms": self.ttfb.stats(),
+        }
+
+
+class TraceWriter:
+    """Appends records to a JSONL file in batches from a daemon thread, off the callers' path."""
+
+    def __init__(self, path: str, flush_ms: int = LLM_TRACE_FLUSH_MS, max_buffered: int = LLM_TRACE_BUFFER):
+        self.path = path
+        self.interval = max(flush_ms, 1) / 1000
+        self.max_buffered = max_buffered
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        # Held across a whole flush so batches reach the file in order
+        self._write_lock = threading.Lock()
+        self._buffer: List[Dict[str, Any]] = []
+        self._thread: Optional[threading.Thread] = None
+        self.written = 0
+        self.dropped = 0
+        atexit.register(self.flush)
+
+    def write(self, record: Dict[str, Any]):
+        with self._lock:
+            if len(self._buffer) >= self.max_buffered:
+                self.dropped += 1
+                return
+            self._buffer.append(record)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="llm-trace-writer", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self.flush()
+
+    def flush(self):
+        with self._write_lock:
+            with self._lock:
+                batch, self._buffer = self._buffer, []
+            if not batch:
+                return
+            try:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write("".join(json.dumps(record, ensure_ascii=False) + "\n" for record in batch))
+                self.written += len(batch)
+            except OSError as e:
+                print(f"[LLMTelemetry] Trace write failed, {len(batch)} records lost: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            buffered = len(self._buffer)
+        return {"path": self.path, "written": self.written, "buffered": buffered, "dropped": self.dropped}
+
+
+class LLMTelemetry:
+    """
+    Aggregates LLMCallRecords per (call site, model) and optionally writes each one to
+    a JSONL trace, so hot paths can be ranked by p95 latency or tokens per call.
+    """
+
+    def __init__(self, trace_path: str = LLM_TRACE_PATH):
+        self._lock = threading.Lock()
+        self._sites: Dict[Tuple[str, str], CallSiteStats] = {}
+        self.trace_path = trace_path
+        self.trace = TraceWriter(trace_path) if trace_path else None
+
+    def observe(self, record: LLMCallRecord):
+        key = (record.call_site, record.model)
+        with self._lock:
+            site = self._sites.get(key)
+            if site is None:
+                site = self._sites[key] = CallSiteStats()
+            site.observe(record)
+        if self.trace is not None:
+            self.trace.write(record.to_dict())
+
+    def stats(self, sort_by: str = "p95") -> Dict[str, Any]:
+        with self._lock:
+            rows = [{"call_site": site, "model": model, **s.stats()} for (site, model), s in self._sites.items()]
+        sort_keys = {
+            "p95": lambda r: r["latency_ms"]["p95"],
+            "tokens": lambda r: r["tokens_per_call"],
+            "cost": lambda r: r["cost_usd"],
+            "calls": lambda r: r["calls"],
+        }
+        rows.sort(key=sort_keys.get(sort_by, sort_keys["p95"]), reverse=True)
+        return {
+            "totals": {
+                "calls": sum(r["calls"] for r in rows),
+                "errors": sum(r["errors"] for r in rows),
+                "prompt_tokens": sum(r["prompt_tokens"] for r in rows),
+                "completion_tokens": sum(r["completion_tokens"] for r in rows),
+                "cost_usd": round(sum(r["cost_usd"] for r in rows), 4),
+            },
+            "by_call_site": rows,
+            "trace": self.trace.stats() if self.trace is not None else None,
+        }
+
+    def reset(self):
+        with self._lock:
+            self._sites.clear()
+
+
+@lru_cache(maxsize=1)
+def get_llm_telemetry() -> LLMTelemetry:
+    return LLMTelemetry()
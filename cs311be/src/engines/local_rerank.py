@@ -0,0 +1,51 @@
+from typing import List, Optional, Sequence
+import numpy as np
+
+
+def normalize_rows(vectors: Sequence[Sequence[float]]) -> np.ndarray:
+    """float32 matrix with unit-length rows (zero rows stay zero)."""
+    matrix = np.asarray(vectors, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix[None, :]
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1.0, norms)
+
+
+def relevance_scores(
+    candidates: np.ndarray,
+    profile: Optional[np.ndarray],
+    keyword: Optional[np.ndarray],
+    keyword_weight: float = 0.5,
+) -> np.ndarray:
+    """
+    Cosine relevance of each (unit) candidate row: the mean similarity to the profile
+    rows (CV, JD), blended with the similarity to the keyword it was retrieved for.
+    """
+    parts, weights = [], []
+    if profile is not None and len(profile):
+        parts.append((candidates @ profile.T).mean(axis=1))
+        weights.append(1.0 - keyword_weight)
+    if keyword is not None:
+        parts.append(candidates @ keyword.reshape(-1))
+        weights.append(keyword_weight)
+    if not parts:
+        return np.zeros(len(candidates), dtype=np.float32)
+    total = sum(weights) or 1.0
+    return sum(w * p for w, p in zip(weights, parts)) / total
+
+
+def mmr_order(
+    candidates: np.ndarray,
+    relevance: np.ndarray,
+    selected: Optional[np.ndarray] = None,
+    lambda_: float = 0.7,
+) -> List[int]:
+    """
+    Candidate indices by Maximal Marginal Relevance against the already selected rows:
+    lambda * relevance - (1 - lambda) * max cosine to any selected question.
+    """
+    score = lambda_ * relevance
+    if selected is not None and len(selected):
+        score = score - (1.0 - lambda_) * (candidates @ selected.T).max(axis=1)
+    # Stable: ties keep retrieval order
+    return [int(i) for i in np.argsort(-score, kind="stable")]
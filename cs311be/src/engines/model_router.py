@@ -0,0 +1,268 @@
+import os
+import json
+import time
+import random
+import threading
+from functools import lru_cache
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+from dotenv import load_dotenv
+from src.engines.llm_clients import get_client_registry
+from src.engines.llm_scheduler import get_llm_scheduler
+load_dotenv()
+
+MAIN = "main"
+MINI = "mini"
+
+# Per-task routing policy. Keys are call-site labels; "create_resume" also covers
+# "create_resume.<section>". Fields:
+#   tier            - preferred tier, "main" or "mini"
+#   max_mini_tokens - prompts estimated above this go to main (0 = no limit)
+#   spill           - may move to the other tier when the preferred deployment is
+#                     cooling down after a 429 or slower than latency_slo_ms
+#   latency_slo_ms  - EWMA latency above which a spill-enabled task moves (0 = off)
+DEFAULT_ROUTING_TABLE = {
+    "extract_cv": {"tier": MINI, "max_mini_tokens": 12000, "spill": True},
+    "extract_job_details": {"tier": MINI, "max_mini_tokens": 12000, "spill": True},
+    "extract_job_details_v2": {"tier": MAIN},
+    "alignment_score": {"tier": MAIN},
+    "add_missing_information": {"tier": MAIN},
+    "create_resume": {"tier": MAIN},
+    "cv_comment": {"tier": MAIN},
+    "resume_improvement": {"tier": MAIN},
+}
+# JSON object merged over the defaults, e.g. {"cv_comment": {"tier": "mini"}}
+LLM_ROUTING = json.loads(os.getenv("LLM_ROUTING", "") or "{}")
+# Fraction of routed cache misses also sent to the other tier for comparison
+LLM_SHADOW_SAMPLE_RATE = float(os.getenv("LLM_SHADOW_SAMPLE_RATE", "0"))
+# Comma-separated tasks to shadow (empty = every task in the table)
+LLM_SHADOW_TASKS = [t.strip() for t in os.getenv("LLM_SHADOW_TASKS", "").split(",") if t.strip()]
+# Smoothing factor of the per-deployment latency average
+LLM_ROUTER_EWMA_ALPHA = float(os.getenv("LLM_ROUTER_EWMA_ALPHA", "0.2"))
+
+
+class RouteDecision(NamedTuple):
+    task: str
+    tier: str
+    reason: str
+
+
+def other_tier(tier: str) -> str:
+    return MINI if tier == MAIN else MAIN
+
+
+def _flatten(value: Any, path: str = "") -> List[Tuple[str, Any]]:
+    """Leaf (path, value) pairs; list indices are dropped so item order does not matter."""
+    if isinstance(value, dict):
+        leaves = []
+        for key, item in value.items():
+            leaves.extend(_flatten(item, f"{path}.{key}" if path else str(key)))
+        return leaves
+    if isinstance(value, list):
+        leaves = []
+        for item in value:
+            leaves.extend(_flatten(item, f"{path}[]"))
+        return leaves
+    if isinstance(value, str):
+        value = " ".join(value.lower().split())
+    return [(path, value)]
+
+
+def _scores(value: Any, path: str = "") -> Dict[str, float]:
+    """Numeric leaves whose key mentions a score, keyed by their full path (indices kept)."""
+    found = {}
+    if isinstance(value, dict):
+        for key, item in value.items():
+            child = f"{path}.{key}" if path else str(key)
+            if isinstance(item, (int, float)) and not isinstance(item, bool) and "score" in str(key).lower():
+                found[child] = float(item)
+            else:
+                found.update(_scores(item, child))
+    elif isinstance(value, list):
+        for i, item in enumerate(value):
+            found.update(_scores(item, f"{path}[{i}]"))
+    return found
+
+
+def _jaccard(a, b) -> float:
+    a, b = set(a), set(b)
+    return len(a & b) / len(a | b) if a | b else 1.0
+
+
+def compare_outputs(primary: str, shadow: str) -> Dict[str, Any]:
+    """Agreement between two responses to the same prompt."""
+    try:
+        primary_json, shadow_json = json.loads(primary), json.loads(shadow)
+    except (TypeError, ValueError):
+        primary_json = shadow_json = None
+    if not isinstance(primary_json, (dict, list)) or not isinstance(shadow_json, (dict, list)):
+        return {"json": False, "text_overlap": _jaccard(primary.lower().split(), shadow.lower().split())}
+
+    primary_leaves = [(p, json.dumps(v, ensure_ascii=False)) for p, v in _flatten(primary_json)]
+    shadow_leaves = [(p, json.dumps(v, ensure_ascii=False)) for p, v in _flatten(shadow_json)]
+    primary_scores, shadow_scores = _scores(primary_json), _scores(shadow_json)
+    deltas = [abs(primary_scores[p] - shadow_scores[p]) for p in primary_scores if p in shadow_scores]
+    return {
+        "json": True,
+        "key_overlap": _jaccard((p for p, _ in primary_leaves), (p for p, _ in shadow_leaves)),
+        "field_overlap": _jaccard(primary_leaves, shadow_leaves),
+        "score_deltas": deltas,
+    }
+
+
+class ShadowStats:
+    def __init__(self):
+        self.samples = 0
+        self.errors = 0
+        self.json_samples = 0
+        self.key_overlap = 0.0
+        self.field_overlap = 0.0
+        self.text_samples = 0
+        self.text_overlap = 0.0
+        self.score_deltas = 0
+        self.score_delta_sum = 0.0
+        self.score_delta_max = 0.0
+        self.primary_ms = 0.0
+        self.shadow_ms = 0.0
+        self.by_primary_tier: Dict[str, int] = {}
+
+    def observe(self, primary_tier: str, comparison: Dict[str, Any], primary_ms: float, shadow_ms: float):
+        self.samples += 1
+        self.by_primary_tier[primary_tier] = self.by_primary_tier.get(primary_tier, 0) + 1
+        self.primary_ms += primary_ms
+        self.shadow_ms += shadow_ms
+        if comparison["json"]:
+            self.json_samples += 1
+            self.key_overlap += comparison["key_overlap"]
+            self.field_overlap += comparison["field_overlap"]
+            for delta in comparison["score_deltas"]:
+                self.score_deltas += 1
+                self.score_delta_sum += delta
+                self.score_delta_max = max(self.score_delta_max, delta)
+        else:
+            self.text_samples += 1
+            self.text_overlap += comparison["text_overlap"]
+
+    def stats(self) -> Dict[str, Any]:
+        def avg(total: float, n: int) -> Optional[float]:
+            return round(total / n, 3) if n else None
+
+        return {
+            "samples": self.samples,
+            "errors": self.errors,
+            "primary_tier": dict(self.by_primary_tier),
+            "key_overlap": avg(self.key_overlap, self.json_samples),
+            "field_overlap": avg(self.field_overlap, self.json_samples),
+            "text_overlap": avg(self.text_overlap, self.text_samples),
+            "score_delta_avg": avg(self.score_delta_sum, self.score_deltas),
+            "score_delta_max": round(self.score_delta_max, 3),
+            "primary_ms_avg": avg(self.primary_ms, self.samples),
+            "shadow_ms_avg": avg(self.shadow_ms, self.samples),
+        }
+
+
+class ModelRouter:
+    """
+    Picks the mini or main tier per task from the routing table, prompt size and the
+    current state of each deployment, and samples shadow comparisons between tiers.
+    """
+
+    def __init__(
+        self,
+        table: Optional[Dict[str, Dict[str, Any]]] = None,
+        shadow_rate: float = LLM_SHADOW_SAMPLE_RATE,
+        shadow_tasks: Optional[List[str]] = None,
+    ):
+        self.table = {task: dict(policy) for task, policy in DEFAULT_ROUTING_TABLE.items()}
+        for task, policy in (LLM_ROUTING if table is None else table).items():
+            self.table.setdefault(task, {}).update(policy)
+        self.shadow_rate = shadow_rate
+        self.shadow_tasks = set(LLM_SHADOW_TASKS if shadow_tasks is None else shadow_tasks)
+        self._lock = threading.Lock()
+        self._latency_ms: Dict[str, float] = {}
+        self._routes: Dict[str, Dict[str, int]] = {}
+        self._shadow: Dict[str, ShadowStats] = {}
+
+    def policy(self, task: str) -> Tuple[Optional[str], Dict[str, Any]]:
+        """The table entry for `task`, falling back to its prefix before the first dot."""
+        for key in (task, task.split(".", 1)[0]):
+            if key in self.table:
+                return key, self.table[key]
+        return None, {}
+
+    def _pressured(self, deployment: str, slo_ms: float) -> Optional[str]:
+        # Pooled deployments are scheduled per member, so ask the pool as a whole
+        pool = get_client_registry().pool(deployment)
+        if pool is not None:
+            pressure = pool.pressure()
+            if pressure:
+                return pressure
+        else:
+            scheduler = get_llm_scheduler().get(deployment)
+            if time.monotonic() < scheduler.cooldown_until:
+                return "cooldown"
+            if scheduler.waiting >= scheduler.capacity:
+                return "queue"
+        if slo_ms and self._latency_ms.get(deployment, 0.0) > slo_ms:
+            return "latency"
+        return None
+
+    def decide(self, task: str, prompt_tokens: int, default_tier: str, deployments: Dict[str, str]) -> RouteDecision:
+        """Tier for one request; `deployments` maps each tier to its deployment name."""
+        _, policy = self.policy(task)
+        tier = policy.get("tier", default_tier)
+        reason = "table" if policy else "caller"
+        max_mini_tokens = int(policy.get("max_mini_tokens", 0))
+        if tier == MINI and max_mini_tokens and prompt_tokens > max_mini_tokens:
+            tier, reason = MAIN, "prompt_size"
+        elif policy.get("spill") and deployments.get(MAIN) != deployments.get(MINI):
+            pressure = self._pressured(deployments[tier], float(policy.get("latency_slo_ms", 0)))
+            alternative = other_tier(tier)
+            # Only spill to a deployment that is itself healthy and not slower
+            if pressure and not self._pressured(deployments[alternative], 0) and (
+                self._latency_ms.get(deployments[alternative], 0.0) <= self._latency_ms.get(deployments[tier], 0.0)
+                or pressure == "cooldown"
+            ):
+                tier, reason = alternative, f"spill_{pressure}"
+        with self._lock:
+            routes = self._routes.setdefault(task, {})
+            routes[f"{tier}:{reason}"] = routes.get(f"{tier}:{reason}", 0) + 1
+        return RouteDecision(task, tier, reason)
+
+    def observe_latency(self, deployment: str, latency_ms: float):
+        with self._lock:
+            previous = self._latency_ms.get(deployment)
+            self._latency_ms[deployment] = latency_ms if previous is None else (
+                previous + LLM_ROUTER_EWMA_ALPHA * (latency_ms - previous)
+            )
+
+    def should_shadow(self, task: str) -> bool:
+        if self.shadow_rate <= 0:
+            return False
+        key, _ = self.policy(task)
+        if self.shadow_tasks and task not in self.shadow_tasks and key not in self.shadow_tasks:
+            return False
+        return random.random() < self.shadow_rate
+
+    def record_shadow(self, task: str, primary_tier: str, primary: str, shadow: str, primary_ms: float, shadow_ms: float):
+        comparison = compare_outputs(primary, shadow)
+        with self._lock:
+            self._shadow.setdefault(task, ShadowStats()).observe(primary_tier, comparison, primary_ms, shadow_ms)
+
+    def record_shadow_error(self, task: str):
+        with self._lock:
+            self._shadow.setdefault(task, ShadowStats()).errors += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "table": self.table,
+                "shadow_sample_rate": self.shadow_rate,
+                "latency_ewma_ms": {name: round(ms, 1) for name, ms in self._latency_ms.items()},
+                "routes": {task: dict(counts) for task, counts in self._routes.items()},
+                "shadow": {task: s.stats() for task, s in self._shadow.items()},
+            }
+
+
+@lru_cache(maxsize=1)
+def get_model_router() -> ModelRouter:
+    return ModelRouter()
@@ -0,0 +1,483 @@
+import os
+import re
+import ast
+import json
+import time
+import random
+import asyncio
+import hashlib
+from typing import Any, Dict, List, Optional, Sequence
+import httpx
+import numpy as np
+import openai
+from dotenv import load_dotenv
+from llama_index.core.base.llms.types import (
+    ChatMessage,
+    ChatResponse,
+    ChatResponseAsyncGen,
+    ChatResponseGen,
+    CompletionResponse,
+    CompletionResponseAsyncGen,
+    CompletionResponseGen,
+    LLMMetadata,
+    MessageRole,
+)
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.bridge.pydantic import Field, PrivateAttr
+from llama_index.core.llms.function_calling import FunctionCallingLLM
+from llama_index.core.llms.llm import ToolSelection
+from src.engines.llm_scheduler import get_llm_scheduler, estimate_tokens, LLM_SCHED_MAX_RETRIES
+from src.engines.llm_telemetry import track_llm_call
+load_dotenv()
+
+# "azure" (default) talks to Azure OpenAI; "offline" swaps every client for the stand-ins below
+LLM_BACKEND = os.getenv("LLM_BACKEND", "azure").lower()
+# Artificial latency per request (mean +/- uniform jitter)
+OFFLINE_LLM_LATENCY_MS = float(os.getenv("OFFLINE_LLM_LATENCY_MS", "50"))
+OFFLINE_LLM_LATENCY_JITTER_MS = float(os.getenv("OFFLINE_LLM_LATENCY_JITTER_MS", "0"))
+OFFLINE_EMBED_LATENCY_MS = float(os.getenv("OFFLINE_EMBED_LATENCY_MS", "10"))
+# Fraction of requests that fail, and with which HTTP status (429 or 5xx)
+OFFLINE_LLM_ERROR_RATE = float(os.getenv("OFFLINE_LLM_ERROR_RATE", "0"))
+OFFLINE_LLM_ERROR_STATUS = int(os.getenv("OFFLINE_LLM_ERROR_STATUS", "429"))
+OFFLINE_LLM_RETRY_AFTER = float(os.getenv("OFFLINE_LLM_RETRY_AFTER", "1"))
+# Seeds the latency/error sequence so load-test runs are reproducible
+OFFLINE_SEED = int(os.getenv("OFFLINE_SEED", "0"))
+# Must match the dimension of the vectors stored in Chroma
+OFFLINE_EMBED_DIM = int(os.getenv("OFFLINE_EMBED_DIM", "1536"))
+OFFLINE_INTERVIEW_QUESTIONS = os.getenv("OFFLINE_INTERVIEW_QUESTIONS", "5")
+
+_rng = random.Random(OFFLINE_SEED)
+_SESSION_MARKER = "session_id:"
+_START_WORDS = ("bắt đầu", "start", "begin", "sẵn sàng", "ready", "đồng ý", "ok", "yes")
+
+
+def is_offline_backend() -> bool:
+    return LLM_BACKEND == "offline"
+
+
+def _digest(*parts: str) -> bytes:
+    return hashlib.blake2b("\x00".join(parts).encode("utf-8"), digest_size=16).digest()
+
+
+def _pick(seed: str, options: Sequence[Any]) -> Any:
+    return options[int.from_bytes(_digest(seed)[:4], "big") % len(options)]
+
+
+def _latency(mean_ms: float) -> float:
+    jitter = _rng.uniform(-OFFLINE_LLM_LATENCY_JITTER_MS, OFFLINE_LLM_LATENCY_JITTER_MS) if OFFLINE_LLM_LATENCY_JITTER_MS else 0.0
+    return max(0.0, mean_ms + jitter) / 1000
+
+
+def _injected_error() -> Optional[Exception]:
+    """An openai API error for this request, or None; same types Azure would raise."""
+    if OFFLINE_LLM_ERROR_RATE <= 0 or _rng.random() >= OFFLINE_LLM_ERROR_RATE:
+        return None
+    request = httpx.Request("POST", "https://offline.invalid/chat/completions")
+    if OFFLINE_LLM_ERROR_STATUS == 429:
+        response = httpx.Response(429, headers={"retry-after": str(OFFLINE_LLM_RETRY_AFTER)}, request=request)
+        return openai.RateLimitError("Offline backend: injected rate limit", response=response, body=None)
+    response = httpx.Response(OFFLINE_LLM_ERROR_STATUS, request=request)
+    return openai.InternalServerError("Offline backend: injected server error", response=response, body=None)
+
+
+# ---------------------------------------------------------------------------
+# Response generation
+# ---------------------------------------------------------------------------
+
+def extract_json_schema(prompt: str) -> Optional[Dict[str, Any]]:
+    """Find the pydantic JSON schema embedded in a prompt as format_instructions."""
+    decoder = json.JSONDecoder()
+    for match in re.finditer(r"^\{\s*$", prompt, re.MULTILINE):
+        try:
+            value, _ = decoder.raw_decode(prompt, match.start())
+        except ValueError:
+            continue
+        if isinstance(value, dict) and "properties" in value:
+            return value
+    return None
+
+
+def instance_from_schema(schema: Dict[str, Any], seed: str) -> Any:
+    """Build a schema-valid value whose strings are derived from `seed`."""
+    definitions = {**schema.get("definitions", {}), **schema.get("$defs", {})}
+
+    def build(node: Dict[str, Any], path: str) -> Any:
+        if "$ref" in node:
+            return build(definitions.get(node["$ref"].rsplit("/", 1)[-1], {}), path)
+        for key in ("anyOf", "oneOf", "allOf"):
+            if key in node:
+                options = [option for option in node[key] if option.get("type") != "null"]
+                return build(options[0], path) if options else None
+        node_type = node.get("type")
+        if node_type == "object" or "properties" in node:
+            return {name: build(prop, f"{path}.{name}") for name, prop in node.get("properties", {}).items()}
+        if node_type == "array":
+            return [build(node.get("items", {}), f"{path}[{i}]") for i in range(2)]
+        if node_type == "integer":
+            return int.from_bytes(_digest(seed, path)[:2], "big") % 10
+        if node_type == "number":
+            return round((int.from_bytes(_digest(seed, path)[:2], "big") % 1000) / 1000, 3)
+        if node_type == "boolean":
+            return bool(_digest(seed, path)[0] & 1)
+        name = path.rsplit(".", 1)[-1].split("[")[0]
+        token = _digest(seed, path).hex()[:8]
+        if "email" in name:
+            return f"candidate.{token}@example.com"
+        if name in ("link", "linkedin", "github", "medium", "devpost") or node.get("format") == "uri":
+            return f"https://example.com/{token}"
+        return f"{node.get('title') or name} {token}"
+
+    return build(schema, "$")
+
+
+def _evaluation(seed: str) -> str:
+    score = int.from_bytes(_digest(seed)[:2], "big") % 11
+    return (
+        f"Điểm: {score}\n"
+        "Nhận xét: Câu trả lời (offline) đúng hướng, cần thêm ví dụ thực tế.\n"
+        "Cải thiện:\n"
+        "- Bổ sung ví dụ từ dự án đã làm\n"
+        "- Giải thích rõ trade-off của giải pháp\n"
+        "- Trình bày theo cấu trúc vấn đề - giải pháp - kết quả"
+    )
+
+
+def _keywords(prompt: str, seed: str) -> str:
+    number = re.search(r"danh sách (\d+) từ khóa", prompt)
+    count = int(number.group(1)) if number else 5
+    words = [w for w in re.findall(r"\w{4,}", prompt.lower()) if not w.isdigit()]
+    vocabulary = list(dict.fromkeys(words)) or ["python"]
+    return ", ".join(f"{_pick(f'{seed}:{i}', vocabulary)} {i + 1}" for i in range(count))
+
+
+def generate_text(prompt: str, response_format: Optional[Dict[str, Any]] = None) -> str:
+    """Deterministic stand-in for a completion, shaped like what the caller parses."""
+    seed = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+    schema = extract_json_schema(prompt)
+    if schema is not None:
+        return json.dumps(instance_from_schema(schema, seed), ensure_ascii=False)
+    if "TỪ KHÓA VÀ CÁC CÂU HỎI ỨNG VIÊN" in prompt:
+        # Batched rerank: one distinct candidate id per keyword line
+        used, selections = set(), []
+        for i, line in enumerate(re.findall(r"^\s*K\d+ \(.*?\): (.*)$", prompt, re.MULTILINE)):
+            ids = [qid for qid in re.findall(r"Q\d+", line) if qid not in used] or re.findall(r"Q\d+", line)
+            choice = _pick(f"{seed}:{i}", ids)
+            used.add(choice)
+            selections.append(choice)
+        return json.dumps({"selections": selections})
+    batch = re.search(r"Danh sách câu hỏi gốc \(\d+ câu, JSON\):\n(\[.*?\n\])", prompt, re.DOTALL)
+    if batch:
+        # Batched question rewrite: hand the questions back, aligned by index
+        return json.dumps({"questions": json.loads(batch.group(1))}, ensure_ascii=False)
+    if (response_format or {}).get("type") == "json_object":
+        return json.dumps({"result": f"offline {seed[:8]}"}, ensure_ascii=False)
+    if "Điểm: <số từ 0 đến 10>" in prompt:
+        return _evaluation(seed)
+    if "Chỉ trả về số thứ tự" in prompt:
+        listed = re.findall(r"^\s*(\d+): ", prompt.split("DANH SÁCH CÂU HỎI", 1)[-1], re.MULTILINE)
+        return str(_pick(seed, listed) if listed else 0)
+    if "từ khóa" in prompt and "phân tách bằng dấu phẩy" in prompt:
+        return _keywords(prompt, seed)
+    # Rewrite / translate / fix-diacritics prompts: hand the input back
+    original = re.search(r"Câu hỏi gốc:\n(.*?)\nCâu hỏi đã cải thiện:", prompt, re.DOTALL)
+    if original:
+        return original.group(1).strip()
+    passthrough = re.search(r"(?:phỏng vấn IT(?: \(.*?\))?|\+ Answer): (.*?)(?:\. Chỉ trả về|\nTranslation:)", prompt, re.DOTALL)
+    if passthrough:
+        return passthrough.group(1).strip()
+    return f"Phản hồi offline {seed[:8]}."
+
+
+def _tool_output(content: str) -> Dict[str, Any]:
+    try:
+        value = ast.literal_eval(content)
+        return value if isinstance(value, dict) else {}
+    except (ValueError, SyntaxError):
+        return {}
+
+
+def _question_text(question: Any) -> str:
+    return question.get("text", "") if isinstance(question, dict) else str(question or "")
+
+
+def _after(marker: str, messages: Sequence[ChatMessage]) -> str:
+    for message in messages:
+        content = str(message.content or "")
+        if marker in content:
+            return content.split(marker, 1)[1].strip()
+    return ""
+
+
+def agent_reply(messages: Sequence[ChatMessage], tool_names: Sequence[str]) -> ChatMessage:
+    """
+    Scripted interviewer for the FunctionAgent.
+
+    Starts an interview when the user agrees, submits every later answer while the last
+    assistant turn still carries a session id, and turns tool results into a reply.
+    """
+    last = messages[-1] if messages else ChatMessage(role=MessageRole.USER, content="")
+    assistant_turns = [m for m in messages[:-1] if m.role == MessageRole.ASSISTANT and m.content]
+    active = re.search(rf"{_SESSION_MARKER} (\S+)", str(assistant_turns[-1].content)) if assistant_turns else None
+
+    if last.role == MessageRole.TOOL:
+        output = _tool_output(str(last.content or ""))
+        calls = [c for m in messages if m.role == MessageRole.ASSISTANT for c in m.additional_kwargs.get("tool_calls", [])]
+        session_id = calls[-1].tool_kwargs.get("session_id", "") if calls else ""
+        lines = []
+        if output.get("evaluation"):
+            lines.append(output["evaluation"])
+        if output.get("next_question"):
+            lines.append(f"Câu hỏi tiếp theo: {_question_text(output['next_question'])}")
+            lines.append(f"{_SESSION_MARKER} {session_id}")
+        elif output.get("done") or output.get("status") == "completed":
+            lines.append("Buổi phỏng vấn đã kết thúc. Cảm ơn bạn!")
+        else:
+            lines.append(output.get("message") or output.get("error") or str(last.content or "")[:500])
+        return ChatMessage(role=MessageRole.ASSISTANT, content="\n".join(lines))
+
+    text = str(last.content or "").strip()
+    if active and "submit_interview_answer" in tool_names:
+        return _tool_call("submit_interview_answer", {"session_id": active.group(1), "user_answer": text, "source": "Software_QA"})
+    if "start_interview" in tool_names and any(re.search(rf"\b{w}\b", text.lower()) for w in _START_WORDS):
+        user_project = _after("use the following user_project:", messages)
+        job_description = _after("use the following job_description:", messages)
+        session_id = f"interview_{int.from_bytes(_digest(user_project, job_description)[:4], 'big')}"
+        return _tool_call("start_interview", {
+            "plan": "Chủ đề 1: Kỹ thuật (3 câu hỏi), Chủ đề 2: Dự án (2 câu hỏi)",
+            "source": "Software_QA",
+            "session_id": session_id,
+            "user_project": user_project,
+            "job_description": job_description,
+            "number": OFFLINE_INTERVIEW_QUESTIONS,
+        })
+    return ChatMessage(role=MessageRole.ASSISTANT, content=generate_text(text))
+
+
+def _tool_call(name: str, kwargs: Dict[str, Any]) -> ChatMessage:
+    selection = ToolSelection(tool_id=f"call_{_digest(name, json.dumps(kwargs, sort_keys=True)).hex()[:12]}", tool_name=name, tool_kwargs=kwargs)
+    return ChatMessage(role=MessageRole.ASSISTANT, content="", additional_kwargs={"tool_calls": [selection]})
+
+
+# ---------------------------------------------------------------------------
+# LLM
+# ---------------------------------------------------------------------------
+
+class OfflineLLM(FunctionCallingLLM):
+    """
+    Deterministic stand-in for ScheduledAzureOpenAI.
+
+    Same answer for the same prompt, no network. Async calls still go through the
+    deployment's LLMScheduler so injected 429s exercise the real backoff path.
+    """
+
+    model: str = Field(default="offline", description="Model name reported in metadata.")
+    engine: str = Field(default="offline", description="Deployment name used for scheduling and cache keys.")
+    temperature: float = Field(default=0.0)
+    max_tokens: Optional[int] = Field(default=None)
+
+    # Same hooks as ScheduledAzureOpenAI, used when the LLM is a deployment-pool member
+    _scheduler_name: Optional[str] = PrivateAttr(default=None)
+    _max_retries: int = PrivateAttr(default=LLM_SCHED_MAX_RETRIES)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "offline_llm"
+
+    @property
+    def scheduler_name(self) -> str:
+        return self._scheduler_name or self.engine
+
+    @property
+    def metadata(self) -> LLMMetadata:
+        return LLMMetadata(
+            context_window=128000,
+            num_output=self.max_tokens or -1,
+            is_chat_model=True,
+            is_function_calling_model=True,
+            model_name=self.model,
+        )
+
+    def _respond(self, messages: Sequence[ChatMessage], tools: Optional[Sequence[Any]] = None) -> ChatMessage:
+        if tools:
+            return agent_reply(messages, [tool.metadata.name for tool in tools])
+        prompt = "\n\n".join(str(m.content or "") for m in messages)
+        return ChatMessage(role=MessageRole.ASSISTANT, content=generate_text(prompt))
+
+    def _pause(self):
+        time.sleep(_latency(OFFLINE_LLM_LATENCY_MS))
+        error = _injected_error()
+        if error:
+            raise error
+
+    async def _apause(self):
+        await asyncio.sleep(_latency(OFFLINE_LLM_LATENCY_MS))
+        error = _injected_error()
+        if error:
+            raise error
+
+    async def _scheduled(self, call, text: str):
+        scheduler = get_llm_scheduler().get(self.scheduler_name)
+        with track_llm_call(self.model, self.scheduler_name, text) as record:
+            response = await scheduler.run(
+                call, est_tokens=estimate_tokens(text), on_retry=record.note_retry, max_retries=self._max_retries
+            )
+            record.set_response(response)
+        return response
+
+    # -- tool calling ---------------------------------------------------------
+
+    def _prepare_chat_with_tools(
+        self,
+        tools: Sequence[Any],
+        user_msg: Optional[Any] = None,
+        chat_history: Optional[List[ChatMessage]] = None,
+        verbose: bool = False,
+        allow_parallel_tool_calls: bool = False,
+        **kwargs: Any,
+    ) -> Dict[str, Any]:
+        messages = list(chat_history or [])
+        if user_msg:
+            messages.append(ChatMessage(role=MessageRole.USER, content=user_msg) if isinstance(user_msg, str) else user_msg)
+        return {"messages": messages, "tools": tools, **kwargs}
+
+    def get_tool_calls_from_response(self, response: ChatResponse, error_on_no_tool_call: bool = True, **kwargs: Any) -> List[ToolSelection]:
+        tool_calls = response.message.additional_kwargs.get("tool_calls", [])
+        if not tool_calls and error_on_no_tool_call:
+            raise ValueError(f"Expected at least one tool call, but got {len(tool_calls)} tool calls.")
+        return list(tool_calls)
+
+    # -- sync -----------------------------------------------------------------
+
+    def chat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponse:
+        with track_llm_call(self.model, self.scheduler_name, "".join(str(m.content or "") for m in messages)) as record:
+            self._pause()
+            response = ChatResponse(message=self._respond(messages, kwargs.get("tools")))
+            record.set_response(response)
+        return response
+
+    def complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        with track_llm_call(self.model, self.scheduler_name, prompt) as record:
+            self._pause()
+            response = CompletionResponse(text=generate_text(prompt, kwargs.get("response_format")))
+            record.set_response(response)
+        return response
+
+    def stream_chat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponseGen:
+        response = self.chat(messages, **kwargs)
+        yield from _chat_chunks(response.message)
+
+    def stream_complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponseGen:
+        response = self.complete(prompt, formatted, **kwargs)
+        yield from _completion_chunks(response.text)
+
+    # -- async ----------------------------------------------------------------
+
+    async def achat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponse:
+        async def call():
+            await self._apause()
+            return ChatResponse(message=self._respond(messages, kwargs.get("tools")))
+
+        return await self._scheduled(call, "".join(str(m.content or "") for m in messages))
+
+    async def acomplete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        async def call():
+            await self._apause()
+            return CompletionResponse(text=generate_text(prompt, kwargs.get("response_format")))
+
+        return await self._scheduled(call, prompt)
+
+    async def astream_chat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponseAsyncGen:
+        response = await self.achat(messages, **kwargs)
+
+        async def gen() -> ChatResponseAsyncGen:
+            for chunk in _chat_chunks(response.message):
+                yield chunk
+
+        return gen()
+
+    async def astream_complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponseAsyncGen:
+        response = await self.acomplete(prompt, formatted, **kwargs)
+
+        async def gen() -> CompletionResponseAsyncGen:
+            for chunk in _completion_chunks(response.text):
+                yield chunk
+
+        return gen()
+
+
+def _pieces(text: str) -> List[str]:
+    return re.findall(r"\S+\s*|\s+", text) or [""]
+
+
+def _chat_chunks(message: ChatMessage):
+    content = ""
+    for piece in _pieces(str(message.content or "")):
+        content += piece
+        yield ChatResponse(
+            message=ChatMessage(role=message.role, content=content, additional_kwargs=message.additional_kwargs),
+            delta=piece,
+        )
+
+
+def _completion_chunks(text: str):
+    content = ""
+    for piece in _pieces(text):
+        content += piece
+        yield CompletionResponse(text=content, delta=piece)
+
+
+# ---------------------------------------------------------------------------
+# Embeddings
+# ---------------------------------------------------------------------------
+
+def hashed_embedding(text: str, dim: int = OFFLINE_EMBED_DIM) -> List[float]:
+    """
+    Signed feature hashing of word unigrams and bigrams, L2-normalised.
+
+    Deterministic across processes, and texts that share words get similar vectors,
+    so retrieval still behaves like retrieval.
+    """
+    words = re.findall(r"\w+", text.lower())
+    features = words + [f"{a} {b}" for a, b in zip(words, words[1:])] or [text]
+    vector = np.zeros(dim, dtype=np.float32)
+    for feature in features:
+        h = int.from_bytes(_digest(feature)[:8], "big")
+        vector[h % dim] += 1.0 if (h >> 63) & 1 else -1.0
+    norm = float(np.linalg.norm(vector))
+    if norm == 0:
+        vector[int.from_bytes(_digest(text)[:4], "big") % dim] = 1.0
+        norm = 1.0
+    return (vector / norm).tolist()
+
+
+class OfflineEmbedding(BaseEmbedding):
+    """Deterministic hashed-vector stand-in for AzureOpenAIEmbedding."""
+
+    azure_deployment: str = Field(default="offline", description="Deployment label, used to key the embedding cache.")
+    dimensions: int = Field(default=OFFLINE_EMBED_DIM)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "offline_embedding"
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return self._get_text_embedding(query)
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        time.sleep(OFFLINE_EMBED_LATENCY_MS / 1000)
+        return hashed_embedding(text, self.dimensions)
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        # One simulated round trip per batch, like the real multi-input call
+        time.sleep(OFFLINE_EMBED_LATENCY_MS / 1000)
+        return [hashed_embedding(text, self.dimensions) for text in texts]
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return (await self._aget_text_embeddings([query]))[0]
+
+    async def _aget_text_embedding(self, text: str) -> List[float]:
+        return (await self._aget_text_embeddings([text]))[0]
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        await asyncio.sleep(OFFLINE_EMBED_LATENCY_MS / 1000)
+        return [hashed_embedding(text, self.dimensions) for text in texts]
@@ -0,0 +1,283 @@
+import os
+import re
+import csv
+import glob
+import hashlib
+import json
+import unicodedata
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+from llama_index.core.schema import MetadataMode, TextNode
+
+DATA_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.dirname(__file__)), "data"))
+
+# Header variants used across the banks in src/data
+QUESTION_COLUMNS = ("Question", "Câu hỏi", "Câu Hỏi", "Câu hỏi (theo nguồn)", "Bảng Câu Hỏi và Trả Lời Machine Learning")
+ANSWER_COLUMNS = ("Answer", "Trả lời", "Câu trả lời", "Câu Trả Lời", "Trả lời (giữ nguyên)")
+# Rows searched for the header (some sheets start with a title row)
+_HEADER_ROWS = 5
+# Bookkeeping metadata kept out of the embedded text
+HASH_KEYS = ("content_hash", "embed_hash")
+_NOT_EMBEDDED = ("index",) + HASH_KEYS
+
+# Interview tracks: the position names a `source` argument may use, and the banks
+# (metadata["source"], i.e. file stems plus the names the notebook used) searched for them
+QUESTION_TRACKS: Dict[str, Dict[str, tuple]] = {
+    "software": {
+        "aliases": ("software", "software qa", "software engineer", "software engineering", "software developer", "software development", "swe"),
+        "sources": ("Software_QA", "Software (2)", "SoftwareEngineer", "softwaredev"),
+    },
+    "backend": {
+        "aliases": ("backend", "back end", "backend developer", "server side"),
+        "sources": ("Backend_QA", "backend", "java", "Spring", "python", "SQL", "DataBase"),
+    },
+    "frontend": {
+        "aliases": ("frontend", "fontend", "front end", "frontend developer", "web developer"),
+        "sources": ("Fontend_QA", "frontend", "react", "JavaSripts", "typescript"),
+    },
+    "fullstack": {
+        "aliases": ("fullstack", "full stack", "fullstack developer"),
+        "sources": ("FullStack_QA", "fullstack", "Backend_QA", "Fontend_QA", "react", "JavaSripts", "typescript"),
+    },
+    "mobile": {
+        "aliases": ("mobile", "mobile app", "mobile developer", "android", "ios", "flutter", "react native"),
+        "sources": ("MobileApp_QA", "MobileApp"),
+    },
+    "ai": {
+        "aliases": ("ai", "ai engineer", "artificial intelligence", "genai", "generative ai", "llm"),
+        "sources": ("AIEngineer", "AI_engineer", "genarativeAI", "NLP", "deep_learning", "ML", "MachineLearning", "machinglearning"),
+    },
+    "machine_learning": {
+        "aliases": ("ml", "machine learning", "ml engineer", "mlops", "deep learning"),
+        "sources": ("ML", "MachineLearning", "machinglearning", "deep_learning", "DataScience", "AIEngineer", "AI_engineer"),
+    },
+    "nlp": {
+        "aliases": ("nlp", "natural language processing"),
+        "sources": ("NLP", "genarativeAI", "deep_learning"),
+    },
+    "data_science": {
+        "aliases": ("data science", "data scientist"),
+        "sources": ("DataScience", "ML", "MachineLearning", "machinglearning", "DataAnalyst"),
+    },
+    "data_analyst": {
+        "aliases": ("data analyst", "data analysis", "data analytics", "bi analyst"),
+        "sources": ("DataAnalyst", "SQL"),
+    },
+    "data_engineer": {
+        "aliases": ("data engineer", "data engineering", "etl"),
+        "sources": ("DataEngineer", "SQL", "DataBase", "DB"),
+    },
+    "database": {
+        "aliases": ("database", "db", "dba", "database administrator", "sql"),
+        "sources": ("DB", "DBAdministrator", "DataBase", "SQL"),
+    },
+    "devops": {
+        "aliases": ("devops", "sre", "site reliability"),
+        "sources": ("DevOps_QA", "CloudEngineer", "Cloude_computing", "SystemAdministrator"),
+    },
+    "cloud": {
+        "aliases": ("cloud", "cloud engineer", "cloud computing", "aws", "azure", "gcp"),
+        "sources": ("CloudEngineer", "Cloude_computing", "DevOps_QA"),
+    },
+    "security": {
+        "aliases": ("security", "cybersecurity", "cyber security", "pentest", "pentester"),
+        "sources": ("Cybersecurity", "NetworkEngineer"),
+    },
+    "network": {
+        "aliases": ("network", "network engineer", "networking"),
+        "sources": ("NetworkEngineer",),
+    },
+    "system_admin": {
+        "aliases": ("system administrator", "sysadmin", "system admin", "operating system", "linux"),
+        "sources": ("SystemAdministrator", "operate", "operatingSystem"),
+    },
+    "testing": {
+        "aliases": ("tester", "qa tester", "qc", "quality assurance", "software testing", "testing", "automation", "automation engineer", "automation tester", "api testing"),
+        "sources": ("QA_Tester", "softwaretesting", "api_testing", "Automation", "automation_engineer"),
+    },
+    "game": {
+        "aliases": ("game", "game developer", "unity", "unreal"),
+        "sources": ("Game_QA",),
+    },
+    "iot": {
+        "aliases": ("iot", "internet of things", "embedded"),
+        "sources": ("IoT",),
+    },
+    "vr": {
+        "aliases": ("vr", "ar", "vr ar", "vrar", "xr", "virtual reality", "augmented reality"),
+        "sources": ("VR", "VRVA", "VRAREngineer"),
+    },
+    "blockchain": {
+        "aliases": ("blockchain", "web3", "smart contract"),
+        "sources": ("blockchain",),
+    },
+    "business_analyst": {
+        "aliases": ("business analyst", "ba"),
+        "sources": ("BusinessAnalyst",),
+    },
+    "project_manager": {
+        "aliases": ("project manager", "it project manager", "pm", "scrum master"),
+        "sources": ("ITProjectManager",),
+    },
+    "design": {
+        "aliases": ("ui", "ux", "ui ux", "uiux", "ui ux designer", "product designer"),
+        "sources": ("UIUXDesigner", "UserResearcher"),
+    },
+    "user_research": {
+        "aliases": ("user researcher", "user research", "ux researcher", "ux research"),
+        "sources": ("UserResearcher", "UIUXDesigner"),
+    },
+    "soft_skills": {
+        "aliases": ("soft skill", "soft skills", "softskill", "behavioral", "hr"),
+        "sources": ("SoftSkill",),
+    },
+    "java": {"aliases": ("java", "java developer"), "sources": ("java", "Spring")},
+    "spring": {"aliases": ("spring", "spring boot"), "sources": ("Spring", "java")},
+    "python": {"aliases": ("python", "python developer", "django", "flask", "fastapi"), "sources": ("python",)},
+    "javascript": {"aliases": ("javascript", "js", "nodejs", "node js"), "sources": ("JavaSripts", "typescript")},
+    "typescript": {"aliases": ("typescript", "ts"), "sources": ("typescript", "JavaSripts")},
+    "react": {"aliases": ("react", "reactjs", "react js", "nextjs"), "sources": ("react", "JavaSripts", "typescript")},
+}
+
+
+def _column(header: List[str], names) -> Optional[int]:
+    stripped = [str(h).strip() if h is not None else "" for h in header]
+    for name in names:
+        if name in stripped:
+            return stripped.index(name)
+    return None
+
+
+def _cell(row, col: int) -> str:
+    value = row[col] if len(row) > col else None
+    return str(value).strip() if value is not None else ""
+
+
+def _records(rows: Iterator[List[Any]], source: str, path: str) -> Iterator[Dict[str, Any]]:
+    question_col = answer_col = None
+    for _, row in zip(range(_HEADER_ROWS), rows):
+        question_col, answer_col = _column(row, QUESTION_COLUMNS), _column(row, ANSWER_COLUMNS)
+        if question_col is not None and answer_col is not None:
+            break
+    if question_col is None or answer_col is None:
+        print(f"[QuestionBank] Skipping {path}: no question/answer columns")
+        return
+    index = 0
+    for row in rows:
+        question, answer = _cell(row, question_col), _cell(row, answer_col)
+        if question and answer:
+            yield {"question": question, "answer": answer, "source": source, "index": index}
+            index += 1
+
+
+def iter_questions(path: str, source: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Stream the question/answer records of one CSV or XLSX bank, rows without both skipped.
+    `index` counts the kept rows, as the notebook that built question_collection numbered them.
+    """
+    source = source or os.path.splitext(os.path.basename(path))[0]
+    if path.lower().endswith(".xlsx"):
+        # openpyxl is only needed for banks that have no CSV export
+        from openpyxl import load_workbook
+        workbook = load_workbook(path, read_only=True, data_only=True)
+        try:
+            yield from _records(workbook.active.iter_rows(values_only=True), source, path)
+        finally:
+            workbook.close()
+    else:
+        with open(path, encoding="utf-8-sig", newline="") as f:
+            yield from _records(csv.reader(f), source, path)
+
+
+def bank_files(data_dir: str = DATA_DIR) -> List[str]:
+    """CSV and XLSX banks of `data_dir`; an XLSX with a CSV export of the same name is skipped."""
+    csv_files = sorted(glob.glob(os.path.join(data_dir, "*.csv")))
+    stems = {os.path.splitext(path)[0] for path in csv_files}
+    xlsx_files = [path for path in sorted(glob.glob(os.path.join(data_dir, "*.xlsx"))) if os.path.splitext(path)[0] not in stems]
+    return csv_files + xlsx_files
+
+
+def _digest(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def record_node(record: Dict[str, Any], node_id: Optional[str] = None) -> TextNode:
+    """
+    TextNode laid out like the ones in question_collection: the question as text and
+    source/question/answer/index as metadata. The id defaults to "<source>-<hash of the
+    question>", so it survives rows being inserted or reordered.
+    """
+    node = TextNode(
+        id_=node_id or f"{record['source']}-{_digest(record['question'])[:12]}",
+        text=record["question"],
+        metadata={key: record[key] for key in ("source", "question", "answer", "index")},
+        excluded_embed_metadata_keys=list(_NOT_EMBEDDED),
+        excluded_llm_metadata_keys=list(HASH_KEYS),
+    )
+    # embed_hash changes only when the embedded text does; content_hash on any change
+    node.metadata["embed_hash"] = _digest(node.get_content(metadata_mode=MetadataMode.EMBED))[:16]
+    node.metadata["content_hash"] = _digest(json.dumps([record[k] for k in ("source", "question", "answer", "index")], ensure_ascii=False))[:16]
+    return node
+
+
+def question_nodes(records: Iterable[Dict[str, Any]]) -> List[TextNode]:
+    """Nodes for a stream of records; a question repeated within one source gets a numbered id."""
+    nodes, seen = [], {}
+    for record in records:
+        node = record_node(record)
+        count = seen.get(node.node_id, 0)
+        seen[node.node_id] = count + 1
+        nodes.append(node if not count else record_node(record, f"{node.node_id}-{count}"))
+    return nodes
+
+
+def load_question_nodes(data_dir: str = DATA_DIR) -> List[TextNode]:
+    """Every question of the banks in `data_dir`."""
+    return question_nodes(record for path in bank_files(data_dir) for record in iter_questions(path))
+
+
+def _words(text: str, split_case: bool = True) -> str:
+    """"Backend_QA" / "AIEngineer" / "Kỹ sư AI" -> "backend qa" / "ai engineer" / "ky su ai"."""
+    text = unicodedata.normalize("NFKD", str(text).replace("đ", "d").replace("Đ", "D"))
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    if split_case:
+        text = re.sub(r"([a-z0-9])([A-Z])|([A-Z])([A-Z][a-z])", r"\1\3 \2\4", text)
+    return " ".join(re.findall(r"[a-z0-9]+", text.lower()))
+
+
+def resolve_sources(source: Optional[str], available: Iterable[str]) -> Optional[List[str]]:
+    """
+    Bank sources an interview `source` (a bank name or a free-form position) should search,
+    restricted to `available`; None when nothing matches, meaning the whole collection.
+
+    The bank the source names exactly, if any, plus the banks of every track with an alias
+    in it as a whole phrase (longest aliases first, so "software qa" does not also count
+    as "qa"); failing both, the banks whose name contains the source or the other way round.
+    """
+    available = sorted({s for s in available if s})
+    if not source or not available:
+        return None
+    squashed = {name: _words(name).replace(" ", "") for name in available}
+    compact = _words(source).replace(" ", "")
+    if not compact:
+        return None
+    aliases = sorted(
+        ((_words(alias), track) for track, spec in QUESTION_TRACKS.items() for alias in spec["aliases"]),
+        key=lambda item: -len(item[0]),
+    )
+    tracks = set()
+    # "JavaScript" / "DevOps" as written; "AIEngineer" only once split into "ai engineer"
+    for variant in (_words(source, split_case=False), _words(source)):
+        remaining = f" {variant} "
+        for alias, track in aliases:
+            if f" {alias} " in remaining:
+                remaining = remaining.replace(f" {alias} ", " | ")
+                tracks.add(track)
+        if tracks:
+            break
+    selected = {compact}.union(*(
+        {_words(s).replace(" ", "") for s in QUESTION_TRACKS[track]["sources"]} for track in tracks
+    ))
+    matched = [name for name in available if squashed[name] in selected]
+    if not matched and len(compact) >= 3:
+        matched = [name for name in available if compact in squashed[name] or (len(squashed[name]) >= 3 and squashed[name] in compact)]
+    return matched or None
@@ -0,0 +1,190 @@
+"""
+Sync a Chroma collection with the question banks in src/data.
+
+Every CSV/XLSX row becomes a node with a stable id and content hashes. Only nodes whose
+embedded text changed are embedded, in parallel batches; metadata-only edits are
+updated in place, and ids no longer present in the banks are deleted.
+
+    cd cs311be
+    python -m src.engines.question_ingest                    # all banks
+    python -m src.engines.question_ingest --files Backend_QA.csv --dry-run
+"""
+import os
+import time
+import asyncio
+import argparse
+from typing import Any, Dict, List, Optional
+from dotenv import load_dotenv
+from llama_index.core.schema import MetadataMode, TextNode
+from llama_index.core.vector_stores.utils import node_to_metadata_dict
+from src.engines.question_bank import DATA_DIR, bank_files, iter_questions, question_nodes
+from src.engines.vector_store import QA_COLLECTION, VectorStoreManager, get_vector_store_manager
+load_dotenv()
+
+# Texts per embedding request and requests in flight
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "64"))
+INGEST_CONCURRENCY = int(os.getenv("INGEST_CONCURRENCY", "4"))
+# Rows per Chroma write
+_WRITE_BATCH = 1000
+
+
+def _chroma_record(node: TextNode) -> Dict[str, Any]:
+    """Document and metadata exactly as ChromaVectorStore.add would write them."""
+    metadata = node_to_metadata_dict(node, remove_text=True, flat_metadata=True)
+    return {
+        "id": node.node_id,
+        "document": node.get_content(metadata_mode=MetadataMode.NONE),
+        "metadata": {key: "" if value is None else value for key, value in metadata.items()},
+    }
+
+
+def _batches(items: List[Any], size: int):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class QuestionIngestor:
+    """Diffs the banks against a collection and applies only the difference."""
+
+    def __init__(
+        self,
+        collection_name: str = QA_COLLECTION,
+        manager: Optional[VectorStoreManager] = None,
+        embedding_service: Any = None,
+        batch_size: int = INGEST_BATCH_SIZE,
+        concurrency: int = INGEST_CONCURRENCY,
+    ):
+        self.collection_name = collection_name
+        self.manager = manager or get_vector_store_manager()
+        self.collection = self.manager.collection(collection_name)
+        if embedding_service is None:
+            from src.engines.embedding_service import get_embedding_service
+            from src.engines.llm_engine import get_llm_engine
+            embedding_service = get_embedding_service(get_llm_engine().embed_model)
+        self.embedding_service = embedding_service
+        self.batch_size = max(1, batch_size)
+        self.concurrency = max(1, concurrency)
+
+    def plan(self, nodes: List[TextNode], sources: Optional[set] = None) -> Dict[str, Any]:
+        """
+        Compare `nodes` with the stored hashes. Stored ids of `sources` (every source when
+        None) that no node carries any more are deleted.
+        """
+        stored = self.collection.get(include=["metadatas"])
+        existing = {node_id: metadata or {} for node_id, metadata in zip(stored["ids"], stored["metadatas"] or [])}
+        embed, update, unchanged = [], [], 0
+        for node in nodes:
+            current = existing.get(node.node_id)
+            if current is None or current.get("embed_hash") != node.metadata["embed_hash"]:
+                embed.append(node)
+            elif current.get("content_hash") != node.metadata["content_hash"]:
+                update.append(node)
+            else:
+                unchanged += 1
+        keep = {node.node_id for node in nodes}
+        delete = [
+            node_id for node_id, metadata in existing.items()
+            if node_id not in keep and (sources is None or metadata.get("source") in sources)
+        ]
+        return {"embed": embed, "update": update, "delete": delete, "unchanged": unchanged}
+
+    async def _embed(self, nodes: List[TextNode]) -> List[List[float]]:
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def one(batch: List[TextNode]):
+            async with semaphore:
+                return await self.embedding_service.embed_many([n.get_content(metadata_mode=MetadataMode.EMBED) for n in batch])
+
+        results = await asyncio.gather(*(one(batch) for batch in _batches(nodes, self.batch_size)))
+        return [vector for batch in results for vector in batch]
+
+    async def apply(self, plan: Dict[str, Any]) -> Dict[str, float]:
+        timings = {}
+        started = time.monotonic()
+        vectors = await self._embed(plan["embed"]) if plan["embed"] else []
+        timings["embed_s"] = round(time.monotonic() - started, 2)
+
+        started = time.monotonic()
+        pending = list(zip(plan["embed"], vectors))
+        for batch in _batches(pending, _WRITE_BATCH):
+            records = [_chroma_record(node) for node, _ in batch]
+            await asyncio.to_thread(
+                self.collection.upsert,
+                ids=[r["id"] for r in records],
+                documents=[r["document"] for r in records],
+                metadatas=[r["metadata"] for r in records],
+                embeddings=[vector for _, vector in batch],
+            )
+        for batch in _batches(plan["update"], _WRITE_BATCH):
+            records = [_chroma_record(node) for node in batch]
+            # The document is the question, which is part of the embedded text, so it is
+            # unchanged here; passing it would make Chroma embed it with its own model
+            await asyncio.to_thread(
+                self.collection.update,
+                ids=[r["id"] for r in records],
+                metadatas=[r["metadata"] for r in records],
+            )
+        for batch in _batches(plan["delete"], _WRITE_BATCH):
+            await asyncio.to_thread(self.collection.delete, ids=batch)
+        timings["write_s"] = round(time.monotonic() - started, 2)
+        if plan["embed"] or plan["update"] or plan["delete"]:
+            self.manager.reload(self.collection_name)
+        return timings
+
+    async def run(self, files: List[str], dry_run: bool = False, prune: bool = True, partial: bool = False) -> Dict[str, Any]:
+        """Sync `files`; with `partial` only the sources of these files are pruned, otherwise every stale id is."""
+        started = time.monotonic()
+        sources = {os.path.splitext(os.path.basename(path))[0] for path in files} if partial else None
+        nodes = question_nodes(record for path in files for record in iter_questions(path))
+        read_s = time.monotonic() - started
+        plan = self.plan(nodes, sources)
+        if not prune:
+            plan["delete"] = []
+        report = {
+            "files": len(files),
+            "records": len(nodes),
+            "embedded": len(plan["embed"]),
+            "updated": len(plan["update"]),
+            "deleted": len(plan["delete"]),
+            "skipped": plan["unchanged"],
+            "read_s": round(read_s, 2),
+            "dry_run": dry_run,
+        }
+        if not dry_run:
+            report.update(await self.apply(plan))
+        total_s = time.monotonic() - started
+        report["total_s"] = round(total_s, 2)
+        report["records_per_s"] = round(len(nodes) / total_s, 1) if total_s else None
+        report["embedded_per_s"] = round(len(plan["embed"]) / report["embed_s"], 1) if report.get("embed_s") else None
+        return report
+
+
+def _resolve(files: Optional[List[str]], data_dir: str) -> List[str]:
+    if not files:
+        return bank_files(data_dir)
+    return [path if os.path.exists(path) else os.path.join(data_dir, path) for path in files]
+
+
+async def main(args):
+    ingestor = QuestionIngestor(args.collection, batch_size=args.batch_size, concurrency=args.concurrency)
+    report = await ingestor.run(
+        _resolve(args.files, args.data_dir), dry_run=args.dry_run, prune=not args.no_prune, partial=bool(args.files)
+    )
+    print(f"[QuestionIngestor] {args.collection}: {report}")
+    if args.flat and not args.dry_run:
+        ingestor.manager.export_flat(args.collection)
+    if not args.dry_run and (report["embedded"] or report["updated"] or report["deleted"]):
+        print("[QuestionIngestor] Running servers pick the changes up after POST /metrics/vectorstore/reload")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--collection", default=QA_COLLECTION)
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--files", nargs="*", help="Banks to sync (default: every CSV/XLSX in --data-dir); only their sources are pruned")
+    parser.add_argument("--batch-size", type=int, default=INGEST_BATCH_SIZE)
+    parser.add_argument("--concurrency", type=int, default=INGEST_CONCURRENCY)
+    parser.add_argument("--dry-run", action="store_true", help="Report what would change without embedding or writing")
+    parser.add_argument("--no-prune", action="store_true", help="Keep stored ids that are no longer in the banks")
+    parser.add_argument("--flat", action="store_true", help="Re-export the flat index afterwards")
+    asyncio.run(main(parser.parse_args()))
@@ -1,9 +1,17 @@
 import os
+import time
+import asyncio
 from fastapi import status, HTTPException
 from dotenv import load_dotenv
-from llama_index.llms.azure_openai import AzureOpenAI
-from llama_index.embeddings.azure_openai import AzureOpenAIEmbedding
 from llama_index.core.llms import ChatMessage, MessageRole
+from src.engines.llm_cache import get_response_cache, make_cache_key
+from src.engines.llm_clients import get_client_registry
+from src.engines.llm_scheduler import estimate_tokens, is_rate_limited, retry_after_seconds
+from src.engines.single_flight import llm_flight
+from src.engines.embedding_service import get_embedding_service
+from src.engines.offline_backend import is_offline_backend
+from src.engines.llm_telemetry import LLMCallRecord, current_call_site, llm_call_context
+from src.engines.model_router import MAIN, MINI, get_model_router, other_tier
 load_dotenv()
 
 # Accessing variables for main LLM
@@ -29,24 +37,32 @@ embedding_deployment_name = os.getenv("RESUME_FLOW_AZURE_OPENAI_EMBEDDING_DEPLOY
 
 class LLMEngineResumeFlow:
     def __init__(self, system_prompt: str = None):
-        # Validate main LLM variables
-        if not all([api_key, azure_endpoint, api_version, deployment_name, model_name]):
-            raise ValueError("Missing required environment variables for Azure OpenAI LLM (api_key, azure_endpoint, api_version, deployment_name, model_name)")
+        # The offline backend needs no credentials
+        if not is_offline_backend():
+            # Validate main LLM variables
+            if not all([api_key, azure_endpoint, api_version, deployment_name, model_name]):
+                raise ValueError("Missing required environment variables for Azure OpenAI LLM (api_key, azure_endpoint, api_version, deployment_name, model_name)")
 
-        # Validate mini LLM variables
-        if not all([mini_api_key, mini_azure_endpoint, mini_api_version, mini_deployment_name, mini_model_name]):
-            raise ValueError("Missing required environment variables for Azure OpenAI Mini LLM (MINI_API_KEY, MINI_AZURE_ENDPOINT, MINI_API_VERSION, MINI_DEPLOYMENT_NAME, MINI_MODEL_NAME)")
+            # Validate mini LLM variables
+            if not all([mini_api_key, mini_azure_endpoint, mini_api_version, mini_deployment_name, mini_model_name]):
+                raise ValueError("Missing required environment variables for Azure OpenAI Mini LLM (MINI_API_KEY, MINI_AZURE_ENDPOINT, MINI_API_VERSION, MINI_DEPLOYMENT_NAME, MINI_MODEL_NAME)")
 
-        # Validate embedding variables
-        if not all([embedding_model_name, embedding_deployment_name, embedding_api_key, embedding_endpoint, embedding_api_version]):
-            raise ValueError("Missing required environment variables for Azure OpenAI Embedding (EMBEDDING_MODEL_NAME, AZURE_OPENAI_EMBEDDING_DEPLOYMENT, AZURE_OPENAI_EMBEDDING_API_KEY, AZURE_OPENAI_EMBEDDING_ENDPOINT, AZURE_OPENAI_EMBEDDING_API_VERSION)")
+            # Validate embedding variables
+            if not all([embedding_model_name, embedding_deployment_name, embedding_api_key, embedding_endpoint, embedding_api_version]):
+                raise ValueError("Missing required environment variables for Azure OpenAI Embedding (EMBEDDING_MODEL_NAME, AZURE_OPENAI_EMBEDDING_DEPLOYMENT, AZURE_OPENAI_EMBEDDING_API_KEY, AZURE_OPENAI_EMBEDDING_ENDPOINT, AZURE_OPENAI_EMBEDDING_API_VERSION)")
 
         self.system_prompt = system_prompt
+        self.cache = get_response_cache()
+        self.router = get_model_router()
+        # Keeps fire-and-forget shadow calls referenced until they finish
+        self._shadow_tasks = set()
         
+        registry = get_client_registry()
+
         # Main LLM (GPT-4o)
-        self.llm = AzureOpenAI(
+        self.llm = registry.get_llm(
             model=model_name,
-            engine=deployment_name,
+            deployment=deployment_name,
             api_key=api_key,
             azure_endpoint=azure_endpoint,
             api_version=api_version,
@@ -54,9 +70,9 @@ class LLMEngineResumeFlow:
         )
         
         # Mini LLM (GPT-4o-mini)
-        self.mini_llm = AzureOpenAI(
+        self.mini_llm = registry.get_llm(
             model=mini_model_name,
-            engine=mini_deployment_name,
+            deployment=mini_deployment_name,
             api_key=mini_api_key,
             azure_endpoint=mini_azure_endpoint,
             api_version=mini_api_version,
@@ -64,13 +80,14 @@ class LLMEngineResumeFlow:
         )
         
         # Embedding model
-        self.embed_model = AzureOpenAIEmbedding(
+        self.embed_model = registry.get_embedding(
             model=embedding_model_name,
-            deployment_name=embedding_deployment_name,
+            deployment=embedding_deployment_name,
             api_key=embedding_api_key,
             azure_endpoint=embedding_endpoint,
             api_version=embedding_api_version
         )
+        self.embedding_service = get_embedding_service(self.embed_model)
     
     def _create_chat_messages(self, prompt: str):
         """Create proper ChatMessage objects for LlamaIndex"""
@@ -89,21 +106,82 @@ class LLMEngineResumeFlow:
         
         return messages
         
-    async def call_llm(self, prompt, response_format=None, use_mini=False):
+    def _request_key(self, prompt, response_format, selected_llm) -> str:
+        return make_cache_key(
+            deployment=selected_llm.engine,
+            model=selected_llm.model,
+            system_prompt=self.system_prompt,
+            prompt=prompt,
+            # Registry-rendered prompts carry their template version; a template edit
+            # then never serves answers cached for the old wording
+            prompt_version=getattr(prompt, "version", None),
+            response_format=response_format,
+            temperature=selected_llm.temperature,
+        )
+
+    async def call_llm(self, prompt, response_format=None, use_mini=False, use_cache=True, call_site=None):
         """
-        Call LLM with option to use mini model
+        Call LLM on the tier chosen by the model router
         Args:
             prompt: Input prompt
             response_format: Optional response format for structured output
-            use_mini: If True, use GPT-4o-mini instead of GPT-4o
+            use_mini: Tier for tasks missing from the routing table (True = GPT-4o-mini)
+            use_cache: If True, serve byte-identical requests from the response cache
+            call_site: Telemetry label and routing task; defaults to the calling function
         """
+        label = call_site or current_call_site()
+        tiers = {MAIN: self.llm, MINI: self.mini_llm}
+        route = self.router.decide(
+            label,
+            estimate_tokens(prompt) + estimate_tokens(self.system_prompt or ""),
+            MINI if use_mini else MAIN,
+            {tier: llm.engine for tier, llm in tiers.items()},
+        )
+        selected_llm = tiers[route.tier]
+        cache = self.cache if use_cache else None
+        key = self._request_key(prompt, response_format, selected_llm)
+        if cache:
+            hit = LLMCallRecord(selected_llm.model, selected_llm.engine, call_site=label, cache="hit")
+            cached = await cache.aget(key)
+            if cached is not None:
+                hit.finish()
+                return cached
+
+        async def fetch():
+            started = time.monotonic()
+            content = await self._call_llm(selected_llm, prompt, response_format)
+            elapsed_ms = (time.monotonic() - started) * 1000
+            self.router.observe_latency(selected_llm.engine, elapsed_ms)
+            if cache:
+                await cache.aset(key, content)
+            shadow_llm = tiers[other_tier(route.tier)]
+            if shadow_llm is not selected_llm and self.router.should_shadow(label):
+                task = asyncio.create_task(self._shadow(route, shadow_llm, prompt, response_format, content, elapsed_ms))
+                self._shadow_tasks.add(task)
+                task.add_done_callback(self._shadow_tasks.discard)
+            return content
+
+        # Identical requests already in flight share one upstream call
+        with llm_call_context(label, cache="miss" if cache else "bypass"):
+            return await llm_flight.do(key, fetch)
+
+    async def _shadow(self, route, shadow_llm, prompt, response_format, primary, primary_ms):
+        """Replay a request on the other tier and record how far the answers agree."""
+        try:
+            started = time.monotonic()
+            with llm_call_context(f"shadow.{route.task}", cache="bypass"):
+                content = await self._call_llm(shadow_llm, prompt, response_format)
+            self.router.record_shadow(route.task, route.tier, primary, content, primary_ms, (time.monotonic() - started) * 1000)
+        except Exception as e:
+            print(f"[ModelRouter] Shadow call for {route.task} failed: {e}")
+            self.router.record_shadow_error(route.task)
+
+    async def _call_llm(self, selected_llm, prompt, response_format=None):
+        """Send one request to the selected LLM and return the stripped text content."""
         try:
-            # Choose which LLM to use
-            selected_llm = self.mini_llm if use_mini else self.llm
-            
             # DEBUG: Check if system prompt exists
             # print(f"DEBUG - System prompt exists: {self.system_prompt is not None}")
-            # print(f"DEBUG - Using mini model: {use_mini}")
+            # print(f"DEBUG - Using model: {selected_llm.model}")
             
             # Method 1: Use ChatMessage objects (Recommended)
             if response_format is None:
@@ -154,8 +232,15 @@ class LLMEngineResumeFlow:
             
         except Exception as e:
             error_message = f'Error in call_llm function. Detail: {str(e)}'
+            if is_rate_limited(e):
+                retry_after = retry_after_seconds(e) or 1
+                raise HTTPException(status_code=429, detail=error_message, headers={"Retry-After": str(int(retry_after + 0.999))})
             raise HTTPException(status_code=500, detail=error_message)
     
+    def cache_stats(self) -> dict:
+        """Hit/miss/eviction counters of the shared response cache"""
+        return self.cache.stats() if self.cache else {"backend": "none"}
+
     async def call_mini_llm(self, prompt, response_format=None):
         """
         Convenience method to call GPT-4o-mini directly
@@ -175,7 +260,8 @@ class LLMEngineResumeFlow:
             if not text or text.strip() == "":
                 raise ValueError("Text cannot be empty")
             
-            embedding = await self.embed_model.aget_text_embedding(text.strip())
+            # Batched, cached and coalesced with concurrent requests for the same text
+            embedding = await self.embedding_service.embed(text.strip())
             
             if not embedding:
                 raise ValueError("Empty embedding returned")
@@ -184,4 +270,21 @@ class LLMEngineResumeFlow:
             
         except Exception as e:
             error_message = f'Error in get_embedding function. Detail: {str(e)}'
-            raise HTTPException(status_code=500, detail=error_message)
\ No newline at end of file
+            raise HTTPException(status_code=500, detail=error_message)
+
+    async def embed_many(self, texts: list) -> list:
+        """Embed several texts with a single upstream call for all cache misses.
+
+        Args:
+            texts (list): Input texts to embed.
+
+        Returns:
+            list: One embedding vector per input text, in order.
+        """
+        try:
+            if not texts or any(not text or text.strip() == "" for text in texts):
+                raise ValueError("Text cannot be empty")
+            return await self.embedding_service.embed_many([text.strip() for text in texts])
+        except Exception as e:
+            error_message = f'Error in embed_many function. Detail: {str(e)}'
+            raise HTTPException(status_code=500, detail=error_message)
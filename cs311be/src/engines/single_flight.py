@@ -0,0 +1,67 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict
+
+
+class _Flight:
+    """One shared call and the number of callers currently awaiting it."""
+
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent identical requests into one upstream call.
+
+    The first caller for a key starts the call as its own task; callers that arrive
+    while it is running await the same task. A cancelled caller only stops waiting:
+    the shared call keeps going for the others, and is cancelled only once nobody
+    is waiting for it any more. Waiters are counted per flight, so callers of a
+    finished flight never touch the count of the next one for the same key.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[str, _Flight] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, call: Callable[[], Awaitable[Any]]) -> Any:
+        flight = self._calls.get(key)
+        if flight is None:
+            self.leaders += 1
+            flight = self._calls[key] = _Flight(asyncio.ensure_future(call()))
+            flight.task.add_done_callback(lambda done, key=key, flight=flight: self._forget(key, flight))
+        else:
+            self.coalesced += 1
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            if not flight.task.done() and flight.waiters <= 1:
+                flight.task.cancel()
+            raise
+        finally:
+            flight.waiters -= 1
+
+    def _forget(self, key: str, flight: _Flight):
+        if self._calls.get(key) is flight:
+            del self._calls[key]
+        # Mark the exception as retrieved when every waiter was cancelled
+        if not flight.task.cancelled():
+            flight.task.exception()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._calls),
+        }
+
+
+# Shared by both engines so identical requests from either one are coalesced
+llm_flight = SingleFlight("llm")
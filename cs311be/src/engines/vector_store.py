@@ -0,0 +1,341 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Dict, FrozenSet, Optional, Tuple, Union
+import chromadb
+from chromadb.api.client import SharedSystemClient
+from dotenv import load_dotenv
+from llama_index.core import VectorStoreIndex
+from llama_index.core.retrievers import BaseRetriever, VectorIndexRetriever
+from llama_index.core.schema import TextNode
+from llama_index.core.vector_stores.types import FilterOperator, MetadataFilter, MetadataFilters
+from llama_index.vector_stores.chroma import ChromaVectorStore
+from src.engines.flat_index import FlatIndex, FlatIndexRetriever, filter_key, has_flat_index, write_flat_index
+from src.engines.lexical_index import HybridRetriever, LexicalIndex
+from src.engines.question_bank import load_question_nodes
+load_dotenv()
+
+# Get vectorstore path from environment or use default
+vectorstore_path = os.getenv("VECTORSTORE_PATH")
+
+# Check if the environment path exists, if not use local path
+if vectorstore_path and os.path.exists(vectorstore_path):
+    pass  # Use environment path
+else:
+    # Force use local chroma_db_master_program directory
+    vectorstore_path = "./src/chroma_db_master_program"
+
+vectorstore_path = os.path.abspath(vectorstore_path)
+
+QA_COLLECTION = "question_collection"
+
+# Fuse BM25 over the question texts with the dense results
+HYBRID_RETRIEVAL = os.getenv("HYBRID_RETRIEVAL", "1").lower() in ("1", "true", "yes")
+# Reciprocal-rank fusion constant; larger values flatten the rank differences
+HYBRID_RRF_K = int(os.getenv("HYBRID_RRF_K", "60"))
+# BM25 hits fused per query (0: the retriever's top_k)
+HYBRID_LEXICAL_TOP_K = int(os.getenv("HYBRID_LEXICAL_TOP_K", "0"))
+
+# Dense search backend: "chroma", or "flat" for the memory-mapped export of a collection
+# (python -m src.engines.flat_index); collections without an export stay on Chroma
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma").lower()
+# Flat exports live in <FLAT_INDEX_DIR>/<collection>/
+FLAT_INDEX_DIR = os.path.abspath(os.getenv("FLAT_INDEX_DIR", "./src/flat_index"))
+
+# Filtered Chroma searches run on an in-memory exact index of the matching rows, built on
+# first use; at most this many are kept per process (0: let Chroma filter every query)
+FILTER_PARTITIONS = int(os.getenv("FILTER_PARTITIONS", "32"))
+
+# Metadata llama-index writes next to each Chroma document
+_INTERNAL_METADATA = ("_node_content", "_node_type", "document_id", "doc_id", "ref_doc_id")
+
+
+def metadata_filters(filters: Union[None, Dict[str, Any], MetadataFilters]) -> Optional[MetadataFilters]:
+    """{"source": "AI", "track": ["backend", "data"]} -> exact match / IN filters, ANDed."""
+    if filters is None or isinstance(filters, MetadataFilters):
+        return filters
+    return MetadataFilters(filters=[
+        MetadataFilter(key=key, value=list(value), operator=FilterOperator.IN)
+        if isinstance(value, (list, tuple, set))
+        else MetadataFilter(key=key, value=value)
+        for key, value in filters.items()
+    ])
+
+
+def filter_dict(filters: Union[None, Dict[str, Any], MetadataFilters]) -> Optional[Dict[str, Any]]:
+    """metadata_filters() in reverse, for backends that take plain exact-match / IN dicts."""
+    if filters is None or isinstance(filters, dict):
+        return filters
+    result = {}
+    for f in filters.filters:
+        if not isinstance(f, MetadataFilter) or f.operator not in (FilterOperator.EQ, FilterOperator.IN):
+            raise ValueError(f"unsupported metadata filter {f!r}")
+        result[f.key] = f.value
+    return result
+
+
+def chroma_where(filters: Dict[str, Any]) -> Dict[str, Any]:
+    """filter_dict() form -> Chroma where clause."""
+    clauses = [
+        {key: {"$in": list(value)}} if isinstance(value, (list, tuple, set)) else {key: value}
+        for key, value in filters.items()
+    ]
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+class VectorStoreManager:
+    """
+    Process-wide Chroma handles. Each (path, collection) is opened once and its
+    VectorStoreIndex shared by every ChatbotTools; retriever() only wraps that index,
+    so it is cheap enough to call per request with its own top_k and filters.
+    With VECTOR_BACKEND=flat, exported collections are searched through their
+    memory-mapped FlatIndex instead and Chroma is not opened for them. Filtered
+    searches on Chroma go to a cached in-memory FlatIndex of the matching rows.
+    reload() drops the handles so the next call reopens the persisted store.
+    """
+
+    def __init__(self, path: str = vectorstore_path):
+        self.path = path
+        self._lock = threading.Lock()
+        # Serializes lexical index builds, which run outside _lock
+        self._build_lock = threading.Lock()
+        self._clients: Dict[str, Any] = {}
+        self._indexes: Dict[Tuple[str, str], VectorStoreIndex] = {}
+        self._lexical: Dict[Tuple[str, str], LexicalIndex] = {}
+        self._flat: Dict[str, FlatIndex] = {}
+        self._sources: Dict[Tuple[str, str], FrozenSet[str]] = {}
+        self._partitions: "OrderedDict[Tuple, FlatIndex]" = OrderedDict()
+        self.opens = 0
+        self.reloads = 0
+        self.retrievers = 0
+        self.loaded_at: Dict[str, float] = {}
+
+    def _client(self, path: str):
+        client = self._clients.get(path)
+        if client is None:
+            client = self._clients[path] = chromadb.PersistentClient(path=path)
+        return client
+
+    def collection(self, name: str = QA_COLLECTION, path: Optional[str] = None):
+        with self._lock:
+            return self._client(path or self.path).get_or_create_collection(name)
+
+    def index(self, name: str = QA_COLLECTION, path: Optional[str] = None, embed_model: Any = None) -> VectorStoreIndex:
+        key = (path or self.path, name)
+        index = self._indexes.get(key)
+        if index is not None:
+            return index
+        with self._lock:
+            index = self._indexes.get(key)
+            if index is None:
+                chroma_collection = self._client(key[0]).get_or_create_collection(name)
+                vector_store = ChromaVectorStore(chroma_collection=chroma_collection)
+                index = VectorStoreIndex.from_vector_store(vector_store, embed_model=embed_model)
+                self._indexes[key] = index
+                self.opens += 1
+                self.loaded_at[f"{key[0]}:{name}"] = time.time()
+                print(f"[VectorStoreManager] Opened collection {name} at {key[0]} ({chroma_collection.count()} vectors)")
+            return index
+
+    def flat_index(self, name: str = QA_COLLECTION) -> Optional[FlatIndex]:
+        """The memory-mapped export of a collection, None when it has not been exported."""
+        flat = self._flat.get(name)
+        if flat is not None:
+            return flat
+        directory = os.path.join(FLAT_INDEX_DIR, name)
+        with self._lock:
+            flat = self._flat.get(name)
+            if flat is None and has_flat_index(directory):
+                flat = self._flat[name] = FlatIndex(directory)
+                self.opens += 1
+                self.loaded_at[f"{directory}:{name}"] = time.time()
+                print(f"[VectorStoreManager] Mapped flat index {name}: {flat.stats()}")
+            return flat
+
+    def export_flat(self, name: str = QA_COLLECTION, directory: Optional[str] = None, path: Optional[str] = None) -> Dict[str, Any]:
+        """Write a collection's vectors and metadata as a flat index; this process remaps it on next use."""
+        stored = self.collection(name, path).get(include=["embeddings", "documents", "metadatas"])
+        result = write_flat_index(
+            directory or os.path.join(FLAT_INDEX_DIR, name),
+            stored["ids"],
+            stored["documents"] or [],
+            [{k: v for k, v in (m or {}).items() if k not in _INTERNAL_METADATA} for m in stored["metadatas"] or []],
+            stored["embeddings"] if stored["embeddings"] is not None else [],
+        )
+        with self._lock:
+            self._flat.pop(name, None)
+        print(f"[VectorStoreManager] Exported {name} as a flat index: {result}")
+        return result
+
+    def lexical_index(self, name: str = QA_COLLECTION, path: Optional[str] = None) -> LexicalIndex:
+        """
+        BM25 index over the documents of a collection, built on first use. An empty
+        question_collection falls back to the CSV banks in src/data. The build runs
+        outside the manager lock, so callers of collection()/index() are not held up
+        by it; only one build per process runs at a time.
+        """
+        key = (path or self.path, name)
+        lexical = self._lexical.get(key)
+        if lexical is not None:
+            return lexical
+        flat = self.flat_index(name) if VECTOR_BACKEND == "flat" and path is None else None
+        with self._build_lock:
+            lexical = self._lexical.get(key)
+            if lexical is not None:
+                return lexical
+            generation = self.reloads
+            if flat is not None:
+                nodes, origin = flat.nodes(), "flat index"
+            else:
+                nodes, origin = self._collection_nodes(key[0], name), "collection"
+            if not nodes and name == QA_COLLECTION:
+                nodes, origin = load_question_nodes(), "src/data"
+            lexical = LexicalIndex(nodes)
+            with self._lock:
+                # A reload during the build means these nodes may be stale: use, don't keep
+                if self.reloads == generation:
+                    self._lexical[key] = lexical
+            print(f"[VectorStoreManager] Built lexical index of {name} from {origin}: {lexical.stats()}")
+            return lexical
+
+    def sources(self, name: str = QA_COLLECTION, path: Optional[str] = None) -> FrozenSet[str]:
+        """Distinct metadata["source"] values of a collection (or of its flat export), read once."""
+        key = (path or self.path, name)
+        sources = self._sources.get(key)
+        if sources is not None:
+            return sources
+        flat = self.flat_index(name) if VECTOR_BACKEND == "flat" and path is None else None
+        if flat is not None:
+            metadatas = flat.metadatas
+        else:
+            metadatas = self.collection(name, path).get(include=["metadatas"])["metadatas"] or []
+        sources = frozenset((m or {}).get("source") for m in metadatas) - {None, ""}
+        with self._lock:
+            self._sources[key] = sources
+        return sources
+
+    def partition(self, name: str, filters: Dict[str, Any], path: Optional[str] = None) -> FlatIndex:
+        """Exact in-memory index of the rows of a collection matching `filters` (dict form)."""
+        key = (path or self.path, name, filter_key(filters))
+        with self._lock:
+            partition = self._partitions.get(key)
+            if partition is not None:
+                self._partitions.move_to_end(key)
+                return partition
+        # Read outside the lock; two callers racing on a new filter just build it twice
+        stored = self.collection(name, path).get(where=chroma_where(filters), include=["embeddings", "documents", "metadatas"])
+        partition = FlatIndex.from_rows(
+            stored["ids"],
+            stored["documents"] or [],
+            [{k: v for k, v in (m or {}).items() if k not in _INTERNAL_METADATA} for m in stored["metadatas"] or []],
+            stored["embeddings"] if stored["embeddings"] is not None else [],
+            label=f"{name}{filters}",
+        )
+        with self._lock:
+            self._partitions[key] = partition
+            while len(self._partitions) > FILTER_PARTITIONS:
+                self._partitions.popitem(last=False)
+        return partition
+
+    def _collection_nodes(self, path: str, name: str):
+        stored = self.collection(name, path).get(include=["documents", "metadatas"])
+        return [
+            TextNode(
+                id_=node_id,
+                text=document or "",
+                metadata={k: v for k, v in (metadata or {}).items() if k not in _INTERNAL_METADATA},
+            )
+            for node_id, document, metadata in zip(stored["ids"], stored["documents"] or [], stored["metadatas"] or [])
+        ]
+
+    def retriever(
+        self,
+        name: str = QA_COLLECTION,
+        top_k: int = 10,
+        filters: Union[None, Dict[str, Any], MetadataFilters] = None,
+        embed_model: Any = None,
+        path: Optional[str] = None,
+        hybrid: bool = False,
+    ) -> BaseRetriever:
+        flat = self.flat_index(name) if VECTOR_BACKEND == "flat" and path is None else None
+        self.retrievers += 1
+        try:
+            plain = filter_dict(filters)
+        except ValueError:
+            # Range and other operators: only Chroma evaluates them
+            flat, plain, hybrid = None, None, False
+        if flat is not None:
+            retriever = FlatIndexRetriever(flat, embed_model, similarity_top_k=top_k, filters=plain)
+        elif plain is not None and FILTER_PARTITIONS > 0:
+            retriever = FlatIndexRetriever(self.partition(name, plain, path), embed_model, similarity_top_k=top_k)
+        else:
+            retriever = VectorIndexRetriever(
+                index=self.index(name, path, embed_model),
+                similarity_top_k=top_k,
+                filters=metadata_filters(filters),
+                embed_model=embed_model,
+            )
+        if not hybrid:
+            return retriever
+        return HybridRetriever(
+            retriever,
+            self.lexical_index(name, path),
+            top_k=top_k,
+            lexical_top_k=HYBRID_LEXICAL_TOP_K or top_k,
+            rrf_k=HYBRID_RRF_K,
+            filters=plain,
+        )
+
+    def reload(self, name: Optional[str] = None, path: Optional[str] = None):
+        """
+        Forget open handles so the next use reopens them. With a collection name only that
+        index is rebuilt on the same client (enough for writes made in this process); without
+        one every client is closed, which is what picks up files rewritten by another process.
+        """
+        with self._lock:
+            if name is None:
+                self._indexes.clear()
+                self._lexical.clear()
+                self._flat.clear()
+                self._sources.clear()
+                self._partitions.clear()
+                self._clients.clear()
+                # Chroma caches one system per path and keeps its HNSW segments in memory
+                SharedSystemClient.clear_system_cache()
+            else:
+                self._indexes.pop((path or self.path, name), None)
+                self._lexical.pop((path or self.path, name), None)
+                self._flat.pop(name, None)
+                self._sources.pop((path or self.path, name), None)
+                for key in [k for k in self._partitions if k[:2] == (path or self.path, name)]:
+                    del self._partitions[key]
+            self.reloads += 1
+        print(f"[VectorStoreManager] Reloaded {name or 'all collections'}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            collections = {}
+            for (path, name), index in self._indexes.items():
+                try:
+                    count = index.vector_store._collection.count()
+                except Exception:
+                    count = None
+                collections[f"{path}:{name}"] = {"vectors": count, "loaded_at": self.loaded_at.get(f"{path}:{name}")}
+            return {
+                "path": self.path,
+                "backend": VECTOR_BACKEND,
+                "opens": self.opens,
+                "reloads": self.reloads,
+                "retrievers": self.retrievers,
+                "collections": collections,
+                "lexical": {f"{path}:{name}": lexical.stats() for (path, name), lexical in self._lexical.items()},
+                "flat": {name: flat.stats() for name, flat in self._flat.items()},
+                "partitions": {flat.directory: flat.stats() for flat in self._partitions.values()},
+            }
+
+
+@lru_cache(maxsize=1)
+def get_vector_store_manager() -> VectorStoreManager:
+    return VectorStoreManager()
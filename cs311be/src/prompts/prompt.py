@@ -27,6 +27,25 @@ Input:
 - session_id: session code
 """
 
+conversation_summary_prompt = """
+You maintain the running summary of a mock job interview between an AI interviewer and a candidate.
+Update the previous summary with the new turns below. Keep:
+- the interview plan, position and question source, and the session_id if one was mentioned
+- every question asked, the gist of the candidate's answer and its evaluation or score
+- facts the candidate stated about themselves that are not in their CV
+- the current state: which question is pending and what the candidate asked for last
+Drop greetings and small talk. Write in the language of the conversation, as concise bullet points, at most {max_words} words.
+Return only the updated summary.
+
+## Previous summary:
+{previous_summary}
+
+## New turns:
+{turns}
+
+## Updated summary:
+"""
+
 system_prompt = """
 ## ⚠️ IMPORTANT RULES:
 - After each user answer: MUST call tool `submit_interview_answer`
@@ -0,0 +1,179 @@
+import json
+import hashlib
+import threading
+from string import Formatter
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple, Type
+from pydantic import BaseModel
+from src.engines.llm_scheduler import estimate_tokens
+from src.prompts.resume_flow_prompt import (
+    RESUME_DETAILS_EXTRACTOR,
+    JOB_DETAILS_EXTRACTOR,
+    JOB_DETAILS_EXTRACTOR_V2,
+    ADD_MISSING_INFORMATION_PROMPT,
+    CALCULATE_MULTIPLE_ALIGNMENT_SCORE_PROMPT,
+    RESUME_IMPROVEMENT_ANALYSIS_PROMPT,
+    GIVE_CV_COMMENT_PROMPT,
+    EXPERIENCE,
+    SKILLS,
+    PROJECTS,
+    EDUCATIONS,
+    CERTIFICATIONS,
+    ACHIEVEMENTS,
+)
+from src.schemas.resume_flow_schemas import (
+    ResumeSchema,
+    JobDetails,
+    JobDetailsV2,
+    MultipleAlignmentScoreSchema,
+    CVCommentSchema,
+    Experiences,
+    SkillSections,
+    Projects,
+    Educations,
+    Certifications,
+    Achievements,
+)
+
+
+def schema_instructions(schema: Type[BaseModel]) -> str:
+    """The JSON schema text the prompts embed as format instructions."""
+    return json.dumps(schema.schema(), indent=2, ensure_ascii=False)
+
+
+class RenderedPrompt(str):
+    """A rendered prompt that remembers which template (and version) produced it."""
+
+    template_name: str = ""
+    version: str = ""
+
+    def __new__(cls, text: str, template_name: str, version: str):
+        rendered = super().__new__(cls, text)
+        rendered.template_name = template_name
+        rendered.version = version
+        return rendered
+
+
+class CompiledPrompt:
+    """
+    A template parsed once, with its schema placeholders already filled in.
+
+    render() only concatenates the precomputed literal pieces with the request's
+    values, instead of serializing the schema and re-parsing the template each call.
+    """
+
+    def __init__(self, name: str, template: str, schemas: Optional[Dict[str, Type[BaseModel]]] = None):
+        self.name = name
+        static = {field: schema_instructions(schema) for field, schema in (schemas or {}).items()}
+        self.schemas = {field: schema.__name__ for field, schema in (schemas or {}).items()}
+
+        # Merge literals and static values into (literal, dynamic field) pairs
+        self._parts: List[Tuple[str, Optional[str]]] = []
+        literal = ""
+        for text, field, format_spec, conversion in Formatter().parse(template):
+            literal += text
+            if field is None:
+                continue
+            if format_spec or conversion:
+                raise ValueError(f"Template {name}: format specs are not supported ({field})")
+            if field in static:
+                literal += static[field]
+            else:
+                self._parts.append((literal, field))
+                literal = ""
+        self._tail = literal
+        self.fields = list(dict.fromkeys(field for _, field in self._parts))
+
+        static_text = "".join(part for part, _ in self._parts) + self._tail
+        source = template + "".join(static[field] for field in sorted(static))
+        self.version = hashlib.sha256(source.encode("utf-8")).hexdigest()[:12]
+        self.static_chars = len(static_text)
+        self.static_tokens = estimate_tokens(static_text)
+
+        self._lock = threading.Lock()
+        self.renders = 0
+        self.rendered_chars = 0
+        self.rendered_tokens = 0
+        self.max_rendered_chars = 0
+
+    def render(self, **values: Any) -> RenderedPrompt:
+        missing = [field for field in self.fields if field not in values]
+        if missing:
+            raise KeyError(f"Template {self.name} is missing values for: {', '.join(missing)}")
+        pieces = []
+        for literal, field in self._parts:
+            pieces.append(literal)
+            pieces.append(str(values[field]))
+        pieces.append(self._tail)
+        text = "".join(pieces)
+        with self._lock:
+            self.renders += 1
+            self.rendered_chars += len(text)
+            self.rendered_tokens += estimate_tokens(text)
+            self.max_rendered_chars = max(self.max_rendered_chars, len(text))
+        return RenderedPrompt(text, self.name, self.version)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "fields": self.fields,
+            "schemas": self.schemas,
+            "static_chars": self.static_chars,
+            "static_tokens_est": self.static_tokens,
+            "renders": self.renders,
+            "avg_rendered_chars": round(self.rendered_chars / self.renders) if self.renders else 0,
+            "avg_rendered_tokens_est": round(self.rendered_tokens / self.renders) if self.renders else 0,
+            "max_rendered_chars": self.max_rendered_chars,
+        }
+
+
+class PromptRegistry:
+    """Compiled templates by name."""
+
+    def __init__(self):
+        self._prompts: Dict[str, CompiledPrompt] = {}
+
+    def register(self, name: str, template: str, schemas: Optional[Dict[str, Type[BaseModel]]] = None) -> CompiledPrompt:
+        compiled = CompiledPrompt(name, template, schemas)
+        self._prompts[name] = compiled
+        return compiled
+
+    def get(self, name: str) -> CompiledPrompt:
+        try:
+            return self._prompts[name]
+        except KeyError:
+            raise KeyError(f"Unknown prompt template: {name}") from None
+
+    def render(self, name: str, **values: Any) -> RenderedPrompt:
+        return self.get(name).render(**values)
+
+    def stats(self) -> Dict[str, Any]:
+        return {name: prompt.stats() for name, prompt in self._prompts.items()}
+
+
+def _build_registry() -> PromptRegistry:
+    registry = PromptRegistry()
+    registry.register("RESUME_DETAILS_EXTRACTOR", RESUME_DETAILS_EXTRACTOR, {"format_instructions": ResumeSchema})
+    registry.register("JOB_DETAILS_EXTRACTOR", JOB_DETAILS_EXTRACTOR, {"format_instructions": JobDetails})
+    registry.register("JOB_DETAILS_EXTRACTOR_V2", JOB_DETAILS_EXTRACTOR_V2, {"format_instructions": JobDetailsV2})
+    registry.register("ADD_MISSING_INFORMATION_PROMPT", ADD_MISSING_INFORMATION_PROMPT, {"resume_schema": ResumeSchema})
+    registry.register(
+        "CALCULATE_MULTIPLE_ALIGNMENT_SCORE_PROMPT",
+        CALCULATE_MULTIPLE_ALIGNMENT_SCORE_PROMPT,
+        {"format_instructions": MultipleAlignmentScoreSchema},
+    )
+    registry.register("GIVE_CV_COMMENT_PROMPT", GIVE_CV_COMMENT_PROMPT, {"format_instructions": CVCommentSchema})
+    registry.register("RESUME_IMPROVEMENT_ANALYSIS_PROMPT", RESUME_IMPROVEMENT_ANALYSIS_PROMPT)
+    # create_resume sections, keyed by the resume field they produce
+    registry.register("work_experience", EXPERIENCE, {"format_instructions": Experiences})
+    registry.register("skill_section", SKILLS, {"format_instructions": SkillSections})
+    registry.register("projects", PROJECTS, {"format_instructions": Projects})
+    registry.register("education", EDUCATIONS, {"format_instructions": Educations})
+    registry.register("certifications", CERTIFICATIONS, {"format_instructions": Certifications})
+    registry.register("achievements", ACHIEVEMENTS, {"format_instructions": Achievements})
+    return registry
+
+
+@lru_cache(maxsize=1)
+def get_prompt_registry() -> PromptRegistry:
+    return _build_registry()
@@ -1,3 +1,4 @@
 from .chatbot import chatbot_router
 from .resume_router import resume_router
 from .database_router import db_router
+from .metrics_router import metrics_router
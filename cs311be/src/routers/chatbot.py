@@ -12,8 +12,17 @@ from src.prompts.default_answer import not_supported_language
 from src.services.report_service import generate_interview_report_pdf
 from src.storage.interview_storage import InterviewStorage
 from src.engines.llm_engine import LLMEngine
+from src.engines.llm_telemetry import call_site
+from src.engines.agent_events import AgentTurn
+from src.storage.session_memory_cache import SessionMemory, get_session_memory_cache, SESSION_MEMORY_SYNC
+from src.services.conversation_summary import get_conversation_summarizer
+from llama_index.core.agent.workflow.workflow_events import AgentStream, ToolCall, ToolCallResult
 from fastapi import UploadFile, File, Form, HTTPException
 import os
+import json
+import time
+import asyncio
+from typing import Set
 from openai import AzureOpenAI
 from fastapi import (
     APIRouter, 
@@ -33,6 +42,11 @@ from dotenv import load_dotenv
 load_dotenv()
 
 TOKEN_LIMIT = int(os.getenv("TOKEN_LIMIT", 10000))
+# Estimated tokens of cached session memory handed to the buffer, as a multiple of TOKEN_LIMIT
+SESSION_MEMORY_WINDOW_FACTOR = float(os.getenv("SESSION_MEMORY_WINDOW_FACTOR", "2"))
+# Tokens left free for the current turn (query, tool calls and results) once history is
+# summarized, so the buffer never has to drop the pinned CV/JD context and summary
+CHAT_TURN_RESERVE_TOKENS = int(os.getenv("CHAT_TURN_RESERVE_TOKENS", "2500"))
 
 def format_resume_data_for_agent(resume_data: dict) -> str:
     """Format resume data into readable text for agent to understand candidate background"""
@@ -520,23 +534,8 @@ async def get_extraction_status(session_id: str, current_user: dict = Depends(ge
         print(f"Error checking extraction status: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@chatbot_router.post("/chatDomain")
-async def chat_with_agent(
-    request: InputChatbotMessage, 
-    service: Service = Depends(get_service),
-    # current_user: dict = Depends(get_current_user)
-):
-    """Chat with agent using stored CV/JD context from resume_storage"""
-    memory = ChatMemoryBuffer(token_limit=TOKEN_LIMIT)
-    user_message = request.query
-    session_id = request.room_id
-    
-    # Detect short chat early to allow chatting without CV/JD
-    text_preprocessor = TextPreprocessor()
-    # determine if message is short chat (greeting/brief) so we can bypass CV/JD requirement
-    is_short_chat = bool(text_preprocessor.detect_short_chat(text_preprocessor.replace_abbreviations(user_message)))
-    preprocessed_message, lang = text_preprocessor.preprocess_text(user_message)
-    
+def load_session_context_messages(session_id: str):
+    """Formatted CV/JD messages that open the agent memory of a session."""
     # Get stored CV and JD data from resume_storage
     from src.storage.resume_storage import ResumeJobStorage
     resume_job_storage = ResumeJobStorage()
@@ -609,18 +608,62 @@ async def chat_with_agent(
             )
         )
     
-    # Load CV/JD context FIRST, before conversation history
-    # This ensures CV/JD context is always available to the agent
     if context_messages:
-        memory.put_messages(context_messages)
-        print(f"[DEBUG] Loaded {len(context_messages)} context messages into memory for session: {session_id}")
+        print(f"[DEBUG] Loaded {len(context_messages)} context messages for session: {session_id}")
     else:
         print(f"[DEBUG] WARNING: No CV/JD data found for session: {session_id}")
+    return context_messages
+
+
+def build_chat_memory(session_id: str, user_message: str, service: Service):
+    """
+    Memory for one agent turn: CV/JD context first, then the stored conversation.
+    Returns (memory, preprocessed_message, lang).
+    """
+    memory = ChatMemoryBuffer(token_limit=TOKEN_LIMIT)
     
-    # Load conversation history AFTER CV/JD context
+    # Detect short chat early to allow chatting without CV/JD
+    text_preprocessor = TextPreprocessor()
+    # determine if message is short chat (greeting/brief) so we can bypass CV/JD requirement
+    is_short_chat = bool(text_preprocessor.detect_short_chat(text_preprocessor.replace_abbreviations(user_message)))
+    preprocessed_message, lang = text_preprocessor.preprocess_text(user_message)
+    
+    # CV/JD context and history stay cached per session; Mongo is only read in full on a miss
+    cache = get_session_memory_cache()
+    session_memory = cache.get(session_id)
+    if session_memory is None:
+        session_memory = SessionMemory(session_id, load_session_context_messages(session_id))
+        # Turns already folded into the rolling summary are not read again
+        summary = get_conversation_summarizer().load(session_id)
+        if summary:
+            session_memory.set_summary(summary["summary"], summary["summarized_until"], summary.get("summarized_turns", 0))
+            session_memory.add_records(service.chatbot_mess_mgmt.find_chat_records_since(session_id, since=summary["summarized_until"]))
+        else:
+            session_memory.add_records(service.chatbot_mess_mgmt.aggregate_conversation_by_session_id(session_id))
+        cache.put(session_memory)
+    elif SESSION_MEMORY_SYNC:
+        # Usually empty; catches turns persisted by another worker
+        cache.extend(session_id, service.chatbot_mess_mgmt.find_chat_records_since(session_id, session_memory.last_message_at))
+    
+    # Context first, then the summary of compacted turns, then recent history; only the
+    # tail that can survive the buffer's token limit is handed over
+    memory.put_messages(session_memory.window(
+        TOKEN_LIMIT * SESSION_MEMORY_WINDOW_FACTOR,
+        pinned_budget=TOKEN_LIMIT - CHAT_TURN_RESERVE_TOKENS,
+    ))
+    return memory, preprocessed_message, lang
+
 
-    conversation_histories = service.chatbot_mess_mgmt.get_conversation_history(session_id)
-    memory.put_messages(conversation_histories)
+@chatbot_router.post("/chatDomain")
+async def chat_with_agent(
+    request: InputChatbotMessage, 
+    service: Service = Depends(get_service),
+    # current_user: dict = Depends(get_current_user)
+):
+    """Chat with agent using stored CV/JD context from resume_storage"""
+    user_message = request.query
+    session_id = request.room_id
+    memory, preprocessed_message, lang = await asyncio.to_thread(build_chat_memory, session_id, user_message, service)
     if lang == "Others":
         return ResponseChat(
             response=not_supported_language,
@@ -639,12 +682,111 @@ async def chat_with_agent(
         answer=reply,
         datetime=datetime.now(),
     )
-    service.chatbot_mess_mgmt.insert_chat_record(chat_message)
+    await asyncio.to_thread(service.chatbot_mess_mgmt.insert_chat_record, chat_message)
+    # Fold older turns into the rolling summary once the history grows past the threshold
+    get_conversation_summarizer().schedule(session_id)
     return ResponseChat(
         response=reply
     )
 
 
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+
+# Streamed turns run as tasks of their own so a client disconnect does not cancel them
+_stream_turns: Set[asyncio.Task] = set()
+
+
+async def _stream_turn(session_id: str, user_message: str, service: Service, queue: asyncio.Queue):
+    """
+    Run one streamed agent turn and persist it, putting its SSE events on `queue` and
+    None once finished. Nothing here depends on the client still reading the queue.
+    """
+    try:
+        memory, preprocessed_message, lang = await asyncio.to_thread(build_chat_memory, session_id, user_message, service)
+        if lang == "Others":
+            queue.put_nowait(_sse("done", {"response": not_supported_language}))
+            return
+        turn = AgentTurn(preprocessed_message)
+        tool_started = {}
+        async for event in service.chatbot.run_turn(preprocessed_message, memory, turn=turn):
+            if isinstance(event, AgentStream):
+                if event.delta:
+                    queue.put_nowait(_sse("token", {"delta": event.delta}))
+            elif isinstance(event, ToolCallResult):
+                started = tool_started.pop(event.tool_id, None)
+                queue.put_nowait(_sse("tool_end", {
+                    "tool": event.tool_name,
+                    "tool_id": event.tool_id,
+                    "ms": round((time.monotonic() - started) * 1000) if started else None,
+                    "is_error": bool(event.tool_output.is_error),
+                }))
+                output = event.tool_output.raw_output
+                if isinstance(output, dict) and ("next_question" in output or "question" in output):
+                    queue.put_nowait(_sse("question", {
+                        "tool": event.tool_name,
+                        "session_id": output.get("session_id"),
+                        "question": output.get("question"),
+                        "next_question": output.get("next_question"),
+                    }))
+            elif isinstance(event, ToolCall):
+                tool_started[event.tool_id] = time.monotonic()
+                queue.put_nowait(_sse("tool_start", {"tool": event.tool_name, "tool_id": event.tool_id}))
+        reply = str(turn.response)
+        chat_message = ChatbotMessage(
+            session_id=session_id,
+            chat_message=user_message,
+            answer=reply,
+            datetime=datetime.now(),
+        )
+        await asyncio.to_thread(service.chatbot_mess_mgmt.insert_chat_record, chat_message)
+        get_conversation_summarizer().schedule(session_id)
+        queue.put_nowait(_sse("done", {"response": reply}))
+    except Exception as e:
+        print(f"[chatDomain/stream] Turn failed for session {session_id}: {e}")
+        queue.put_nowait(_sse("error", {"detail": str(e)}))
+    finally:
+        queue.put_nowait(None)
+
+
+@chatbot_router.post("/chatDomain/stream")
+async def chat_with_agent_stream(
+    request: InputChatbotMessage,
+    service: Service = Depends(get_service),
+):
+    """
+    Same turn as /chatDomain, streamed as server-sent events:
+    start, token {delta}, tool_start {tool}, tool_end {tool, ms, is_error},
+    question {question, next_question} when an interview question is ready,
+    done {response} and error {detail}. The turn is persisted before `done` is sent.
+    It runs in its own task, so a client that disconnects mid-turn only stops reading:
+    the turn still finishes and is stored along with whatever its tools changed.
+    """
+    user_message = request.query
+    session_id = request.room_id
+
+    async def events():
+        # Something visible before any CV/JD loading or LLM work
+        yield _sse("start", {"session_id": session_id})
+        queue: asyncio.Queue = asyncio.Queue()
+        task = asyncio.create_task(_stream_turn(session_id, user_message, service, queue))
+        _stream_turns.add(task)
+        task.add_done_callback(_stream_turns.discard)
+        while True:
+            event = await queue.get()
+            if event is None:
+                return
+            yield event
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # Disable proxy buffering so each event reaches the browser as it is produced
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @chatbot_router.get("/final-report/{session_id}")
 async def get_final_report(session_id: str, service: Service = Depends(get_service)):
     """Generate a final interview PDF report with 2 sections:
@@ -701,18 +843,19 @@ async def get_final_report(session_id: str, service: Service = Depends(get_servi
             "\n\n".join(f"- {i.get('evaluation','')}" for i in interactions if i.get('evaluation'))
         )
 
-        def _llm_text(prompt: str) -> str:
+        def _llm_text(prompt: str, label: str) -> str:
             try:
-                r = llm.complete(prompt=prompt)
+                with call_site(f"final_report.{label}"):
+                    r = llm.complete(prompt=prompt)
                 return getattr(r, "text", str(r))
             except Exception:
                 return ""
 
         overall = {
-            "summary": _llm_text(summary_prompt).strip(),
-            "strengths": [s.strip("- ") for s in _llm_text(strengths_prompt).splitlines() if s.strip()],
-            "improvements": [s.strip("- ") for s in _llm_text(improvements_prompt).splitlines() if s.strip()],
-            "fitness": _llm_text(fitness_prompt).strip(),
+            "summary": _llm_text(summary_prompt, "summary").strip(),
+            "strengths": [s.strip("- ") for s in _llm_text(strengths_prompt, "strengths").splitlines() if s.strip()],
+            "improvements": [s.strip("- ") for s in _llm_text(improvements_prompt, "improvements").splitlines() if s.strip()],
+            "fitness": _llm_text(fitness_prompt, "fitness").strip(),
         }
 
         results = {"overall": overall, "interactions": interactions}
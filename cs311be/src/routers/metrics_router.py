@@ -0,0 +1,98 @@
+from fastapi import APIRouter
+from src.engines.llm_cache import get_response_cache
+from src.engines.llm_clients import get_client_registry
+from src.engines.llm_scheduler import get_llm_scheduler
+from src.engines.single_flight import llm_flight
+from src.engines.embedding_service import embedding_stats
+from src.engines.llm_telemetry import get_llm_telemetry
+from src.engines.model_router import get_model_router
+from src.engines.hedging import get_hedger
+from src.engines.agent_events import get_agent_metrics
+from src.prompts.prompt_registry import get_prompt_registry
+from src.storage.session_memory_cache import get_session_memory_cache
+from src.services.conversation_summary import get_conversation_summarizer
+from src.engines.vector_store import get_vector_store_manager
+
+metrics_router = APIRouter(
+    prefix="/metrics",
+    tags=["Metrics"]
+)
+
+@metrics_router.get("/llm")
+async def get_llm_metrics():
+    """Scheduler queue depth/wait times, cache and single-flight counters, client registry stats."""
+    cache = get_response_cache()
+    return {
+        "scheduler": get_llm_scheduler().stats(),
+        "response_cache": cache.stats() if cache else {"backend": "none"},
+        "single_flight": {"llm": llm_flight.stats()},
+        "embeddings": embedding_stats(),
+        "clients": get_client_registry().stats(),
+        "calls": get_llm_telemetry().stats()["totals"],
+        "hedging": get_hedger().stats(),
+    }
+
+
+@metrics_router.get("/llm/calls")
+async def get_llm_call_metrics(sort_by: str = "p95"):
+    """Per call-site latency/TTFB histograms, token, cost, retry and cache counters.
+
+    sort_by: p95 | tokens | cost | calls
+    """
+    return get_llm_telemetry().stats(sort_by=sort_by)
+
+
+@metrics_router.post("/llm/calls/reset")
+async def reset_llm_call_metrics():
+    """Clear the per call-site counters, e.g. between load-test runs."""
+    get_llm_telemetry().reset()
+    return {"status": "ok"}
+
+
+@metrics_router.get("/llm/pools")
+async def get_llm_pool_metrics():
+    """Per-member outstanding requests, latency, failures and ejection state of each deployment pool."""
+    return get_client_registry().pool_stats()
+
+
+@metrics_router.get("/llm/routing")
+async def get_llm_routing_metrics():
+    """Routing table, per-task tier decisions, deployment latency and shadow agreement."""
+    return get_model_router().stats()
+
+
+@metrics_router.get("/agent")
+async def get_agent_turn_metrics():
+    """Interview agent turns: latency, time to first streamed token, LLM steps and per-tool timings."""
+    return get_agent_metrics().stats()
+
+
+@metrics_router.get("/prompts")
+async def get_prompt_metrics():
+    """Compiled prompt templates: version, static size and rendered prompt sizes."""
+    return get_prompt_registry().stats()
+
+
+@metrics_router.get("/sessions")
+async def get_session_memory_metrics():
+    """Per-process session memory cache: sessions, bytes, hit rate, evictions and appended turns."""
+    return get_session_memory_cache().stats()
+
+
+@metrics_router.get("/sessions/summaries")
+async def get_conversation_summary_metrics():
+    """Rolling conversation summaries: compactions, turns folded, failures and latency."""
+    return get_conversation_summarizer().stats()
+
+
+@metrics_router.get("/vectorstore")
+async def get_vector_store_metrics():
+    """Open Chroma collections, their sizes, and how often they were opened or reloaded."""
+    return get_vector_store_manager().stats()
+
+
+@metrics_router.post("/vectorstore/reload")
+async def reload_vector_store(collection: str = None):
+    """Reopen the persisted vector store, e.g. after re-ingesting questions (all collections by default)."""
+    get_vector_store_manager().reload(collection)
+    return {"status": "ok"}
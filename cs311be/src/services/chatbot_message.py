@@ -3,6 +3,7 @@ from datetime import datetime
 
 from llama_index.core.llms import ChatMessage
 from src.storage.chatbot_message import CRUDChatMessage
+from src.storage.session_memory_cache import get_session_memory_cache
 from src.schemas.chatbot import ChatbotMessage
 
 class ChatbotMessageManagement():
@@ -16,6 +17,10 @@ class ChatbotMessageManagement():
     def insert_chat_record(self, message: ChatbotMessage):
         item = message.model_dump()
         self.collection.insert_one_doc(item)
+        # Keep this session's cached agent memory current without re-reading the history
+        get_session_memory_cache().append_turn(
+            message.session_id, message.chat_message, message.answer, message.datetime
+        )
 
     def find_chat_record_by_session_id(self, session_id: str):
         query = {"session_id": session_id}
@@ -54,6 +59,18 @@ class ChatbotMessageManagement():
         results = list(self.collection.collection.aggregate(pipeline))
         return [ChatbotMessage(**record) for record in results]
     
+    def find_chat_records_since(self, session_id: str, since: Optional[datetime] = None, until: Optional[datetime] = None):
+        """Records of a session newer than `since` and up to `until` (unbounded when None), oldest first."""
+        query = {"session_id": session_id}
+        if since is not None or until is not None:
+            query["datetime"] = {}
+            if since is not None:
+                query["datetime"]["$gt"] = since
+            if until is not None:
+                query["datetime"]["$lte"] = until
+        results = self.collection.collection.find(query).sort("datetime", 1)
+        return [ChatbotMessage(**record) for record in results]
+
     def get_all_sessions(self):
         """Get all unique session IDs from chat messages"""
         pipeline = [
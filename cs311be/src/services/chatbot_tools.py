@@ -1,15 +1,18 @@
 import os
-from typing import List, Tuple, Dict, Any
+import time
+import asyncio
+from typing import List, Tuple, Dict, Any, Optional
 from llama_index.core.agent.workflow import FunctionAgent
 from llama_index.core import Settings
-from llama_index.vector_stores.chroma import ChromaVectorStore
-from llama_index.core import VectorStoreIndex
 from llama_index.core.retrievers import VectorIndexAutoRetriever, VectorIndexRetriever
 from llama_index.core.query_engine import RetrieverQueryEngine
 from llama_index.core.tools import FunctionTool
-from llama_index.core.schema import NodeWithScore, TextNode
-import chromadb
+from llama_index.core.schema import NodeWithScore, TextNode, QueryBundle
 from src.engines.llm_engine import LLMEngine
+from src.engines.embedding_service import get_embedding_service
+from src.engines.local_rerank import mmr_order, normalize_rows, relevance_scores
+from src.engines.question_bank import resolve_sources
+from src.engines.vector_store import HYBRID_RETRIEVAL, QA_COLLECTION, VECTOR_BACKEND, get_vector_store_manager
 from src.prompts.prompt import *
 from llama_index.core.memory.chat_memory_buffer import ChatMemoryBuffer
 import re
@@ -20,18 +23,25 @@ from dotenv import load_dotenv
 load_dotenv()
 
 TOP_K = int(os.getenv("TOP_K", "5"))  # Default to 5 if not set
+# Keywords retrieved / reranked / rewritten at the same time when an interview starts
+START_INTERVIEW_CONCURRENCY = int(os.getenv("START_INTERVIEW_CONCURRENCY", "4"))
+# Rerank all keywords' candidates in one LLM call instead of one call per keyword
+START_INTERVIEW_BATCH_RERANK = os.getenv("START_INTERVIEW_BATCH_RERANK", "1").lower() in ("1", "true", "yes")
+# How the question of each keyword is picked: "llm" (LLM rerank), "local" (embedding
+# similarity to CV/JD with MMR diversity, no LLM call) or "local+llm" (one batched LLM
+# rerank over the MMR shortlist, local picks as the fallback)
+START_INTERVIEW_RERANK = os.getenv("START_INTERVIEW_RERANK", "llm").lower()
+# MMR trade-off between relevance (1.0) and distance to the questions already picked (0.0)
+START_INTERVIEW_MMR_LAMBDA = float(os.getenv("START_INTERVIEW_MMR_LAMBDA", "0.7"))
+# Weight of the keyword itself in the relevance, the rest goes to the CV/JD
+START_INTERVIEW_KEYWORD_WEIGHT = float(os.getenv("START_INTERVIEW_KEYWORD_WEIGHT", "0.5"))
+# Candidates per keyword the LLM sees in "local+llm" mode
+START_INTERVIEW_SHORTLIST = int(os.getenv("START_INTERVIEW_SHORTLIST", "3"))
+# Characters of CV/JD embedded for the local rerank
+_PROFILE_EMBED_CHARS = 6000
+# Search only the banks of the interview's source/track (see question_bank.QUESTION_TRACKS)
+RETRIEVAL_SOURCE_FILTER = os.getenv("RETRIEVAL_SOURCE_FILTER", "1").lower() in ("1", "true", "yes")
 
-# Get vectorstore path from environment or use default
-vectorstore_path = os.getenv("VECTORSTORE_PATH")
-
-# Check if the environment path exists, if not use local path
-if vectorstore_path and os.path.exists(vectorstore_path):
-    pass  # Use environment path
-else:
-    # Force use local chroma_db_master_program directory
-    vectorstore_path = "./src/chroma_db_master_program"
-
-vectorstore_path = os.path.abspath(vectorstore_path)
 # vectorstore_path = "../../chroma_db_eachfileisanode"
 
 
@@ -46,6 +56,7 @@ class ChatbotTools:
         self.engine = LLMEngine()
         self.llm = self.engine.openai_llm
         self.embed_model = self.engine.embed_model
+        self.embedding_service = get_embedding_service(self.embed_model) if self.embed_model else None
         Settings.embed_model = self.embed_model
         Settings.llm = self.llm
 
@@ -53,15 +64,51 @@ class ChatbotTools:
         self.qa_retriever = self._initialize_qa_retriever()
         # self.evaluation = self._evaluation_question()
         self.interview_storage = InterviewStorage()
-    def _initialize_qa_retriever(self):
-        db = chromadb.PersistentClient(path=vectorstore_path)
-        chroma_collection = db.get_or_create_collection("question_collection")
-        vector_store = ChromaVectorStore(chroma_collection=chroma_collection)
-        index = VectorStoreIndex.from_vector_store(vector_store)
-        return VectorIndexRetriever(index=index, similarity_top_k=10)
+    def _initialize_qa_retriever(self, top_k: int = 10, filters=None):
+        # The collection is opened once per process; this only wraps the shared index
+        return get_vector_store_manager().retriever(
+            QA_COLLECTION, top_k=top_k, filters=filters, embed_model=self.embed_model, hybrid=HYBRID_RETRIEVAL
+        )
     
 
-    def re_write_question(self, node, user_project: str):
+    @staticmethod
+    def _node_text(node):
+        """Question text of a NodeWithScore or node-like object, None when it has none."""
+        text = getattr(node, "text", None)
+        if not text and hasattr(node, "node"):
+            # LlamaIndex NodeWithScore case
+            inner = getattr(node, "node", None)
+            text = getattr(inner, "text", None) if inner is not None else None
+        return text
+
+    @classmethod
+    def _refined_node(cls, node, improved: str):
+        """A copy of `node` carrying the improved question text."""
+        # Build a new node instead of mutating (NodeWithScore.text is read-only)
+        try:
+            base = getattr(node, "node", None)
+            score = getattr(node, "score", None)
+            metadata = {}
+            if base is not None and hasattr(base, "metadata"):
+                metadata = dict(getattr(base, "metadata", {}) or {})
+            else:
+                metadata = dict(getattr(node, "metadata", {}) or {})
+            metadata["refined"] = True
+            # Where the question came from, so grading can find its reference answer
+            # without searching with the rewritten text
+            metadata.setdefault("original_text", cls._node_text(node))
+            node_id = getattr(base, "node_id", None) or getattr(node, "node_id", None)
+            if node_id:
+                metadata.setdefault("node_id", node_id)
+            new_text_node = TextNode(text=improved, metadata=metadata)
+            new_node = NodeWithScore(node=new_text_node, score=score)
+        except Exception as inner_e:
+            from types import SimpleNamespace
+            new_node = SimpleNamespace(text=improved, metadata=dict(getattr(node, "metadata", {}) or {}))
+        print(f"Câu hỏi đã cải thiện: {getattr(new_node, 'text', '')}")
+        return new_node
+
+    async def re_write_question(self, node, user_project: str):
         """Refine/clarify a question to better match user's background and ensure actionable, scenario-based phrasing.
 
         Args:
@@ -72,12 +119,7 @@ class ChatbotTools:
             The same node object with an improved .text field when possible; otherwise returns node unchanged.
         """
         try:
-            # Extract original text from node in a defensive way
-            original_text = getattr(node, "text", None)
-            if not original_text and hasattr(node, "node"):
-                # LlamaIndex NodeWithScore case
-                inner = getattr(node, "node", None)
-                original_text = getattr(inner, "text", None) if inner is not None else None
+            original_text = self._node_text(node)
 
             # Fallbacks
             if not original_text:
@@ -96,82 +138,139 @@ Câu hỏi gốc:
 Câu hỏi đã cải thiện:
 """.strip()
 
-            result = self.llm.complete(prompt=prompt)
+            result = await self.llm.acomplete(prompt=prompt)
             improved = result.text.strip() if getattr(result, "text", None) else str(result).strip()
             print(improved)
             if not improved:
                 return node
-
-            # Build a new node instead of mutating (NodeWithScore.text is read-only)
-            try:
-                base = getattr(node, "node", None)
-                score = getattr(node, "score", None)
-                metadata = {}
-                if base is not None and hasattr(base, "metadata"):
-                    metadata = dict(getattr(base, "metadata", {}) or {})
-                else:
-                    metadata = dict(getattr(node, "metadata", {}) or {})
-                metadata["refined"] = True
-                new_text_node = TextNode(text=improved, metadata=metadata)
-                new_node = NodeWithScore(node=new_text_node, score=score)
-            except Exception as inner_e:
-                from types import SimpleNamespace
-                new_node = SimpleNamespace(text=improved, metadata=dict(getattr(node, "metadata", {}) or {}))
-            print(f"Câu hỏi đã cải thiện: {getattr(new_node, 'text', '')}")
-            return new_node
+            return self._refined_node(node, improved)
         except Exception as e:
             # In case of any failure, return original node
             print(f"Lỗi khi cải thiện câu hỏi: {e}")
             return node
 
+    async def re_write_questions(self, nodes: List[Any], user_project: str) -> List[Any]:
+        """Rewrite several questions with a single LLM call.
+
+        The model returns a JSON list aligned with the input by index. A node whose entry
+        is empty, or that has no text, is returned unchanged; if the batch call fails or
+        its answer cannot be aligned, each node goes through re_write_question instead.
+        """
+        texts = [self._node_text(node) for node in nodes]
+        pending = [i for i, text in enumerate(texts) if text]
+        if not pending:
+            return list(nodes)
+        if len(pending) == 1:
+            refined = list(nodes)
+            refined[pending[0]] = await self.re_write_question(nodes[pending[0]], user_project)
+            return refined
+
+        originals = json.dumps([texts[i] for i in pending], ensure_ascii=False, indent=1)
+        prompt = f"""
+Bạn là chuyên gia phỏng vấn kỹ thuật. Hãy chỉnh sửa từng câu hỏi trong danh sách sau cho:
+- Rõ ràng, đi vào tình huống/thực hành thay vì hỏi định nghĩa
+- Phù hợp với kinh nghiệm ứng viên
+- Giữ đúng chủ đề gốc của từng câu, không mở rộng quá mức
+- Ngắn gọn 1 câu, tiếng Việt
+- Các câu hỏi sau khi chỉnh sửa không được trùng nhau
+Kinh nghiệm ứng viên:
+{user_project}
+Danh sách câu hỏi gốc ({len(pending)} câu, JSON):
+{originals}
+Trả về JSON object dạng {{"questions": [...]}} gồm đúng {len(pending)} câu hỏi đã cải thiện, câu thứ i tương ứng với câu hỏi gốc thứ i.
+""".strip()
+
+        try:
+            result = await self.llm.acomplete(prompt=prompt, response_format={"type": "json_object"})
+            text = result.text if getattr(result, "text", None) else str(result)
+            parsed = json.loads(text)
+            improved = parsed.get("questions") if isinstance(parsed, dict) else parsed
+            if not isinstance(improved, list) or len(improved) != len(pending):
+                raise ValueError(f"expected {len(pending)} questions, got {improved!r:.200}")
+        except Exception as e:
+            print(f"Batch rewrite failed, rewriting questions one by one: {e}")
+            return list(await asyncio.gather(*(self.re_write_question(node, user_project) for node in nodes)))
+
+        refined = list(nodes)
+        for i, question in zip(pending, improved):
+            question = question.strip() if isinstance(question, str) else ""
+            if question:
+                refined[i] = self._refined_node(nodes[i], question)
+        return refined
+
 
     async def qa_information(self, query: str) -> str:
-        nodes = await self.qa_retriever.aretrieve(query)
+        retriever = await asyncio.to_thread(self._get_retriever_by_source)
+        nodes = await retriever.aretrieve(query)
         if not nodes:
             return "No relevant information found in the QA."
         return "\n\n---\n\n".join(
             f"Lĩnh vực: {node.metadata['source']} ID câu hỏi: {node.metadata['index']} Nội dung câu hỏi: {node.text}" for node in nodes
         )
-    async def evaluate_user_answer(self, question: str, user_answer: str, source: str) -> str:
+    @staticmethod
+    def _answer_from(metadata: Dict[str, Any], text: str = None):
+        """Reference answer from a question's metadata, else from an "Answer:" part of its text."""
+        reference_answer = (metadata or {}).get("answer")
+        if not reference_answer and text:
+            match = re.search(r"Answer\s*:\s*(.*)", text, re.IGNORECASE | re.DOTALL)
+            if match:
+                reference_answer = match.group(1).strip()
+        return reference_answer or None
+
+    async def _stored_reference_answer(self, question_entry: Dict[str, Any]):
+        """
+        Reference answer of a question stored in the interview session: its own metadata
+        first, then its record fetched by id (no embedding, no similarity search).
+        """
+        metadata = question_entry.get("metadata") or {}
+        reference_answer = self._answer_from(metadata, metadata.get("original_text"))
+        if reference_answer or not metadata.get("node_id"):
+            return reference_answer
+        try:
+            # Chroma and the flat index are read synchronously: keep them off the event loop
+            return await asyncio.to_thread(self._reference_answer_by_id, metadata["node_id"])
+        except Exception as e:
+            print(f"[ChatbotTools] Reference answer lookup by id failed: {e}")
+        return None
+
+    def _reference_answer_by_id(self, node_id: str):
+        manager = get_vector_store_manager()
+        flat = manager.flat_index(QA_COLLECTION) if VECTOR_BACKEND == "flat" else None
+        if flat is not None:
+            node = flat.node_by_id(node_id)
+            return self._answer_from(node.metadata, node.text) if node is not None else None
+        record = manager.collection(QA_COLLECTION).get(ids=[node_id], include=["metadatas", "documents"])
+        if record.get("ids"):
+            return self._answer_from(record["metadatas"][0], record["documents"][0])
+        return None
+
+    async def evaluate_user_answer(self, question: str, user_answer: str, source: str, reference_answer: str = None) -> str:
         """
         Đánh giá câu trả lời của người dùng dựa trên đáp án mẫu trong metadata của câu hỏi.
 
         Args:
             question: Câu hỏi phỏng vấn cần đánh giá.
             user_answer: Câu trả lời của ứng viên.
+            reference_answer: Đáp án mẫu đã lưu trong phiên; chỉ tìm kiếm vector khi không có.
 
         Returns:
             Văn bản phản hồi có cấu trúc gồm: điểm (0-10), nhận xét ngắn, và 3 gợi ý cải thiện.
         """
-        # Lấy các node liên quan nhất từ cả hai bộ sưu tập
-        # db = chromadb.PersistentClient(path=vectorstore_path)
-        # chroma_collection = db.get_or_create_collection("software")
-        # reference_answer = chroma_collection.get(ids=[f"Software_QA-{index}"]).get("metadatas")
-        # reference_answer = reference_answer[0].get("answer")
-        # for i in range(len(reference_answer)):
-        #     print(i, reference_answer[i])
-        # print(reference_answer)
-        all_nodes: List[NodeWithScore] = []
-        qa_nodes = await self.qa_retriever.aretrieve(question)
-        all_nodes.extend(qa_nodes)
-    
-        if not all_nodes:
-            return "Không tìm thấy câu hỏi phù hợp để đối chiếu đáp án. Vui lòng cung cấp rõ câu hỏi."
+        if not reference_answer:
+            # Fallback: nearest question in the vector store
+            all_nodes: List[NodeWithScore] = []
+            retriever = await asyncio.to_thread(self._get_retriever_by_source, source)
+            qa_nodes = await retriever.aretrieve(question)
+            all_nodes.extend(qa_nodes)
+        
+            if not all_nodes:
+                return "Không tìm thấy câu hỏi phù hợp để đối chiếu đáp án. Vui lòng cung cấp rõ câu hỏi."
 
-        # Chọn node có điểm tương đồng cao nhất
-        best_node = max(all_nodes, key=lambda n: (n.score or 0))
+            # Chọn node có điểm tương đồng cao nhất
+            best_node = max(all_nodes, key=lambda n: (n.score or 0))
 
-        # Lấy đáp án mẫu từ metadata, nếu không có thì thử tách từ text theo mẫu "Answer:"
-        reference_answer = None
-        try:
-            reference_answer = best_node.metadata.get("answer")
-        except Exception:
-            reference_answer = None
-
-        if not reference_answer and best_node.text:
-            match = re.search(r"Answer\s*:\s*(.*)", best_node.text, re.IGNORECASE | re.DOTALL)
-            if match:
-                reference_answer = match.group(1).strip()
+            # Lấy đáp án mẫu từ metadata, nếu không có thì thử tách từ text theo mẫu "Answer:"
+            reference_answer = self._answer_from(getattr(best_node, "metadata", None), best_node.text)
 
         if not reference_answer:
             return "Không có đáp án mẫu trong dữ liệu cho câu hỏi này để đánh giá."
@@ -200,7 +299,8 @@ Cải thiện:
 - Làm thêm các bài tập về các khái niệm và thuật toán liên quan
 - Tìm hiểu thêm về các ứng dụng thực tế của các khái niệm và thuật toán liên quan
 """
-        result = self.llm.complete(prompt=eval_prompt)
+        # The candidate is waiting on this call: async, and hedged when LLM_HEDGING is on
+        result = await self.engine.turn_llm.acomplete(prompt=eval_prompt)
         return result.text.strip() if getattr(result, "text", None) else str(result) 
 
 
@@ -243,7 +343,7 @@ Cải thiện:
                 Kết quả: giao tiếp nhóm, giải quyết xung đột, tinh thần đồng đội, quản lý dự án, phối hợp DevOps
             """
 
-        result = self.llm.complete(prompt=prompt)
+        result = await self.llm.acomplete(prompt=prompt)
         text = result.text if getattr(result, "text", None) else str(result)
         keywords = [kw.strip() for kw in text.replace("\n", ",").split(",") if kw.strip()]
         # Deduplicate while preserving order
@@ -256,9 +356,36 @@ Cải thiện:
                 deduped.append(kw)
         return deduped
 
-    def _get_retriever_by_source(self) -> VectorIndexRetriever:
-        self.qa_retriever = self._initialize_qa_retriever()
-        return self.qa_retriever
+    async def _embed_queries(self, keywords: List[str]) -> List[Any]:
+        """Embed all keywords in one batched call so each retrieval skips its own embedding request."""
+        if not self.embedding_service or not keywords:
+            return list(keywords)
+        try:
+            vectors = await self.embedding_service.embed_many(keywords)
+            return [QueryBundle(query_str=kw, embedding=vec) for kw, vec in zip(keywords, vectors)]
+        except Exception as e:
+            print(f"Batch embedding failed, retrieving keywords one by one: {e}")
+            return list(keywords)
+
+    @staticmethod
+    def _source_filters(source: Optional[str]) -> Optional[Dict[str, Any]]:
+        """{"source": [banks]} for an interview source, None to search every bank."""
+        if not RETRIEVAL_SOURCE_FILTER or not source:
+            return None
+        try:
+            sources = resolve_sources(source, get_vector_store_manager().sources(QA_COLLECTION))
+        except Exception as e:
+            print(f"[ChatbotTools] Could not resolve the banks of source '{source}': {e}")
+            return None
+        return {"source": sources} if sources else None
+
+    def _get_retriever_by_source(self, source: Optional[str] = None) -> VectorIndexRetriever:
+        """Retriever over the banks of `source`; the whole collection when it matches none."""
+        filters = self._source_filters(source)
+        if filters is None:
+            self.qa_retriever = self._initialize_qa_retriever()
+            return self.qa_retriever
+        return self._initialize_qa_retriever(filters=filters)
     async def re_rank_nodes(self, nodes: List[NodeWithScore], user_project: str, job_description: str, collected: Dict[str, Dict[str, Any]]) -> NodeWithScore:
         """
         Chọn câu hỏi phù hợp nhất với CV của ứng viên và yêu cầu công việc từ danh sách các nodes.
@@ -277,6 +404,13 @@ Cải thiện:
         if len(nodes) == 1:
             return nodes[0]
         
+        return await self.re_write_question(nodes[await self._select_node_index(nodes, user_project, job_description, collected)], user_project)
+
+    async def _select_node_index(self, nodes: List[NodeWithScore], user_project: str, job_description: str, collected: Dict[str, Dict[str, Any]]) -> int:
+        """Index of the node the LLM ranks best for the CV and JD; 0 when the answer is unusable."""
+        if len(nodes) <= 1:
+            return 0
+
         # Tạo danh sách câu hỏi để LLM dễ đọc
         questions_list = []
         for i, node in enumerate(nodes):
@@ -319,59 +453,301 @@ Cải thiện:
             
             # Kiểm tra index hợp lệ
             if 0 <= selected_index < len(nodes):
-                # Refine the selected question before returning
                 print(f"Selected node: {nodes[selected_index].text}")
-                return self.re_write_question(nodes[selected_index], user_project)
+                return selected_index
                 
             else:
-                # Nếu index không hợp lệ, trả về node đầu tiên (sau khi refine)
+                # Nếu index không hợp lệ, trả về node đầu tiên
                 print(f"Warning: Invalid index {selected_index}, returning first node")
-                return self.re_write_question(nodes[0], user_project)
+                return 0
                 
         except (ValueError, IndexError) as e:
             print(f"Error parsing LLM response: {e}, returning first node")
-            return self.re_write_question(nodes[0], user_project)
+            return 0
         except Exception as e:
             print(f"Error in re_rank_nodes: {e}, returning first node")
-            return self.re_write_question(nodes[0], user_project)
+            return 0
+
+    async def _retrieve_candidates(self, query: Any, keyword: str, retriever: VectorIndexRetriever) -> List[NodeWithScore]:
+        """Retrieved nodes for one keyword, best retrieval score first."""
+        try:
+            result = await retriever.aretrieve(query)
+            return result if isinstance(result, list) else [result] if result else []
+        except Exception as e:
+            print(f"Error retrieving for keyword '{keyword}': {e}")
+            return []
+
+    async def _select_nodes_batch(self, keywords: List[str], candidate_sets: List[List[NodeWithScore]], user_project: str, job_description: str):
+        """
+        Pick one question per keyword with a single LLM call.
+
+        Every distinct candidate question is listed once with an id, each keyword lists the
+        ids of its candidates, and CV/JD are sent once. The answer must give, for every
+        keyword with candidates, one of its own ids with no id used twice. Returns the
+        per-keyword index into its candidate list (None for keywords without candidates),
+        or None when the answer fails validation.
+        """
+        question_ids: Dict[str, int] = {}
+        questions_list = []
+        keyword_lines = []
+        options: List[Dict[int, int]] = []
+        for kw, nodes in zip(keywords, candidate_sets):
+            choice: Dict[int, int] = {}
+            for i, node in enumerate(nodes):
+                text_key = (getattr(node, "text", None) or "").strip()
+                if not text_key:
+                    continue
+                if text_key not in question_ids:
+                    question_ids[text_key] = len(question_ids)
+                    questions_list.append(f"Q{question_ids[text_key]}: {text_key}")
+                choice.setdefault(question_ids[text_key], i)
+            options.append(choice)
+            if choice:
+                keyword_lines.append(f"K{len(keyword_lines)} ({kw}): " + ", ".join(f"Q{qid}" for qid in choice))
+        active = [i for i, choice in enumerate(options) if choice]
+        if not active:
+            return [None] * len(keywords)
+
+        questions_text = "\n".join(questions_list)
+        keywords_text = "\n".join(keyword_lines)
+        prompt = f"""
+        Bạn là chuyên gia tuyển dụng có kinh nghiệm. Nhiệm vụ của bạn là chọn cho MỖI từ khóa một câu hỏi phỏng vấn phù hợp nhất với kinh nghiệm của ứng viên và yêu cầu của vị trí công việc.
+
+        THÔNG TIN ỨNG VIÊN:
+        {user_project}
+
+        MÔ TẢ CÔNG VIỆC:
+        {job_description}
+
+        DANH SÁCH CÂU HỎI:
+        {questions_text}
+
+        TỪ KHÓA VÀ CÁC CÂU HỎI ỨNG VIÊN CỦA TỪNG TỪ KHÓA:
+        {keywords_text}
+
+        YÊU CẦU:
+        - Với mỗi từ khóa K0..K{len(active) - 1}, chọn đúng một câu hỏi trong danh sách của chính từ khóa đó
+        - Không chọn cùng một câu hỏi cho hai từ khóa, tránh các câu hỏi có nội dung tương tự nhau
+        - Hạn chế các câu hỏi về định nghĩa và khái niệm cơ bản như "OOP là gì?"
+        - Ưu tiên câu hỏi liên quan trực tiếp đến kỹ năng mà ứng viên có VÀ yêu cầu của công việc
+        - Ưu tiên câu hỏi về implementation, best practices, và problem-solving
+        ĐỊNH DẠNG TRẢ VỀ:
+        JSON object dạng {{"selections": ["Q..", ...]}} gồm đúng {len(active)} phần tử, phần tử thứ i là câu hỏi chọn cho từ khóa Ki.
+        """
+
+        try:
+            response = await self.llm.acomplete(prompt=prompt, response_format={"type": "json_object"})
+            parsed = json.loads(response.text)
+            selections = parsed.get("selections") if isinstance(parsed, dict) else parsed
+            if not isinstance(selections, list) or len(selections) != len(active):
+                raise ValueError(f"expected {len(active)} selections, got {selections!r:.200}")
+            picked = [int(str(qid).strip().lstrip("Qq")) for qid in selections]
+            if len(set(picked)) != len(picked):
+                raise ValueError(f"duplicate selections {picked}")
+            result: List[Any] = [None] * len(keywords)
+            for keyword_index, qid in zip(active, picked):
+                if qid not in options[keyword_index]:
+                    raise ValueError(f"Q{qid} is not a candidate of keyword '{keywords[keyword_index]}'")
+                result[keyword_index] = options[keyword_index][qid]
+            return result
+        except Exception as e:
+            print(f"[ChatbotTools] Batch rerank rejected, reranking keywords one by one: {e}")
+            return None
+
+
+    async def _candidate_vectors(self, nodes: List[NodeWithScore], retriever: Any) -> Dict[str, Any]:
+        """
+        Embedding of each candidate keyed by its text: from the node itself, else from the
+        store behind the retriever (flat index or Chroma collection), else embedded (and
+        cached) by the embedding service.
+        """
+        vectors: Dict[str, Any] = {}
+        by_id: Dict[str, str] = {}
+        for node in nodes:
+            text_key = (self._node_text(node) or "").strip()
+            if not text_key or text_key in vectors:
+                continue
+            inner = getattr(node, "node", node)
+            embedding = getattr(inner, "embedding", None)
+            if embedding is not None:
+                vectors[text_key] = embedding
+            elif getattr(inner, "node_id", None):
+                by_id[inner.node_id] = text_key
+        stored_embeddings = getattr(retriever, "embeddings", None)
+        stored = stored_embeddings(list(by_id)) if by_id and callable(stored_embeddings) else None
+        for node_id, embedding in (stored or {}).items():
+            vectors.setdefault(by_id[node_id], embedding)
+        collection = getattr(getattr(retriever, "_vector_store", None), "_collection", None)
+        if by_id and stored is None and collection is not None:
+            try:
+                stored = await asyncio.to_thread(collection.get, ids=list(by_id), include=["embeddings"])
+                for node_id, embedding in zip(stored.get("ids") or [], stored.get("embeddings") or []):
+                    if embedding is not None:
+                        vectors.setdefault(by_id[node_id], embedding)
+            except Exception as e:
+                print(f"[ChatbotTools] Reading candidate embeddings from Chroma failed: {e}")
+        missing = [text_key for text_key in dict.fromkeys(by_id.values()) if text_key not in vectors]
+        if missing and self.embedding_service:
+            vectors.update(zip(missing, await self.embedding_service.embed_many(missing)))
+        return vectors
+
+    async def _select_nodes_local(self, keywords: List[str], queries: List[Any], candidate_sets: List[List[NodeWithScore]], user_project: str, job_description: str, retriever: Any = None):
+        """
+        Rank every keyword's candidates without an LLM call: cosine similarity to the CV/JD
+        (embedded once) and to the keyword, penalised by Maximal Marginal Relevance against
+        the questions picked for earlier keywords. Returns, per keyword, its candidate
+        indices best first (the first one is the pick), or None when embeddings are unavailable.
+        """
+        if not self.embedding_service:
+            return None
+        try:
+            profile_texts = [text[:_PROFILE_EMBED_CHARS] for text in (user_project, job_description) if text and text.strip()]
+            flat = [node for nodes in candidate_sets for node in nodes]
+            vectors, profile_vectors = await asyncio.gather(
+                self._candidate_vectors(flat, retriever),
+                self.embedding_service.embed_many(profile_texts) if profile_texts else asyncio.sleep(0, []),
+            )
+            keyword_vectors = [getattr(query, "embedding", None) for query in queries]
+            if any(vector is None for vector in keyword_vectors):
+                keyword_vectors = await self.embedding_service.embed_many(keywords)
+        except Exception as e:
+            print(f"[ChatbotTools] Local rerank unavailable, falling back to the LLM: {e}")
+            return None
+
+        profile = normalize_rows(profile_vectors) if profile_vectors else None
+        picked = []
+        taken = set()
+        orders: List[List[int]] = []
+        for kw_vector, nodes in zip(keyword_vectors, candidate_sets):
+            usable = [i for i, node in enumerate(nodes) if (self._node_text(node) or "").strip() in vectors]
+            if not usable:
+                orders.append(list(range(len(nodes))))
+                continue
+            matrix = normalize_rows([vectors[self._node_text(nodes[i]).strip()] for i in usable])
+            relevance = relevance_scores(matrix, profile, normalize_rows(kw_vector), START_INTERVIEW_KEYWORD_WEIGHT)
+            order = mmr_order(matrix, relevance, normalize_rows(picked) if picked else None, START_INTERVIEW_MMR_LAMBDA)
+            # An exact repeat of an earlier pick loses the merge anyway; pick past it
+            first = next((i for i in order if self._node_text(nodes[usable[i]]).strip() not in taken), order[0])
+            order = [first] + [i for i in order if i != first]
+            taken.add(self._node_text(nodes[usable[first]]).strip())
+            picked.append(matrix[first])
+            ranked = [usable[i] for i in order]
+            orders.append(ranked + [i for i in range(len(nodes)) if i not in ranked])
+        return orders
+
+    async def _select_orders(self, keywords: List[str], queries: List[Any], candidate_sets: List[List[NodeWithScore]], user_project: str, job_description: str, retriever: Any, bounded) -> List[List[int]]:
+        """Per-keyword candidate indices, best first, as START_INTERVIEW_RERANK configures."""
+        if START_INTERVIEW_RERANK.startswith("local"):
+            orders = await self._select_nodes_local(keywords, queries, candidate_sets, user_project, job_description, retriever)
+            if orders is not None:
+                if START_INTERVIEW_RERANK != "local+llm":
+                    return orders
+                # The LLM only chooses within each keyword's MMR shortlist
+                shortlists = [order[:max(1, START_INTERVIEW_SHORTLIST)] for order in orders]
+                selections = await self._select_nodes_batch(
+                    keywords, [[nodes[i] for i in shortlist] for nodes, shortlist in zip(candidate_sets, shortlists)],
+                    user_project, job_description,
+                )
+                if selections is None:
+                    return orders
+                return [
+                    [shortlist[selected]] + [i for i in order if i != shortlist[selected]] if selected is not None else order
+                    for order, shortlist, selected in zip(orders, shortlists, selections)
+                ]
+
+        # One rerank call for all keywords; the per-keyword reranks are the fallback
+        selections = None
+        if START_INTERVIEW_BATCH_RERANK:
+            selections = await self._select_nodes_batch(keywords, candidate_sets, user_project, job_description)
+        if selections is None:
+            selections = await asyncio.gather(*(
+                bounded(self._select_node_index(nodes, user_project, job_description, {})) for nodes in candidate_sets
+            ))
+        # Each keyword's pick first, then the rest by retrieval score
+        return [
+            [selected] + [i for i in range(len(nodes)) if i != selected] if nodes and selected is not None else list(range(len(nodes)))
+            for nodes, selected in zip(candidate_sets, selections)
+        ]
 
 
     async def start_interview(self, plan: str, source: str, session_id: str, user_project: str, job_description: str, number: str, user_id: str = "") -> Dict[str, Any]:
+        started = time.monotonic()
+        timings: Dict[str, float] = {}
+
+        def lap(stage: str, since: float) -> float:
+            now = time.monotonic()
+            timings[stage] = round((now - since) * 1000, 1)
+            return now
+
         keywords = await self._generate_keywords(plan, user_project, job_description, number)
-        retriever = self._get_retriever_by_source()
+        mark = lap("keywords", started)
+        # The first lookup of a source reads the collection's metadata and rows from Chroma
+        retriever = await asyncio.to_thread(self._get_retriever_by_source, source)
         collected: Dict[str, Dict[str, Any]] = {}
         print(f"Generated {len(keywords)} keywords: {keywords}")
-        for i, kw in enumerate(keywords):
-            try:
-                result = await retriever.aretrieve(kw)
-                #xử lí list câu hỏi để chọn câu phù hợp với CV và JD nhất
-                nodes = result if isinstance(result, list) else [result] if result else []
-                if nodes:
-                    #chọn câu hỏi phù hợp với CV và JD nhất
-                    selected_node = await self.re_rank_nodes(nodes, user_project, job_description, collected)
-                    print(f"Selected node: {selected_node.text}.")
-                    if selected_node:
-                        nodes = [selected_node]  # Convert single node back to list for processing
-                    else:
-                        nodes = []
-            except Exception as e:
-                print(f"Error retrieving for keyword '{kw}': {e}")
-                nodes = []
-                
-            for node in nodes:
-                if not node:
-                    continue
-                # Defensive checks in case of unexpected shapes
-                node_text = getattr(node, "text", None)
-                if not node_text:
-                    continue
-                text_key = node_text.strip()
-                if not text_key or text_key in collected:
-                    continue
-                collected[text_key] = {
-                    "text": node_text,
-                    "metadata": dict(getattr(node, "metadata", {}) or {}),
-                }
+        queries = await self._embed_queries(keywords)
+        mark = lap("embed", mark)
+
+        # Retrieve every keyword concurrently, at most START_INTERVIEW_CONCURRENCY at a time
+        semaphore = asyncio.Semaphore(max(1, START_INTERVIEW_CONCURRENCY))
+
+        async def bounded(coro):
+            async with semaphore:
+                return await coro
+
+        candidate_sets = await asyncio.gather(*(
+            bounded(self._retrieve_candidates(queries[i], kw, retriever)) for i, kw in enumerate(keywords)
+        ))
+        # Keywords the source's banks have nothing for are searched across every bank
+        empty = [i for i, nodes in enumerate(candidate_sets) if not nodes]
+        if empty and retriever is not self.qa_retriever:
+            unfiltered = await asyncio.to_thread(self._get_retriever_by_source)
+            retried = await asyncio.gather(*(
+                bounded(self._retrieve_candidates(queries[i], keywords[i], unfiltered)) for i in empty
+            ))
+            for i, nodes in zip(empty, retried):
+                candidate_sets[i] = nodes
+        mark = lap("retrieve", mark)
+
+        orders = await self._select_orders(keywords, queries, candidate_sets, user_project, job_description, retriever, bounded)
+        mark = lap("rerank", mark)
+        ranked = [[nodes[i] for i in order] for nodes, order in zip(candidate_sets, orders)]
+
+        # Deterministic merge in keyword order: a keyword whose pick was already taken by an
+        # earlier keyword falls back to its next best candidate, so questions never repeat
+        taken = set()
+        selected_nodes = []
+        for candidates in ranked:
+            for node in candidates:
+                text_key = (getattr(node, "text", None) or "").strip()
+                if text_key and text_key not in taken:
+                    taken.add(text_key)
+                    selected_nodes.append(node)
+                    break
+
+        # One LLM call rewrites every selected question
+        refined = await self.re_write_questions(selected_nodes, user_project)
+        lap("rewrite", mark)
+
+        for node in refined:
+            if not node:
+                continue
+            # Defensive checks in case of unexpected shapes
+            node_text = getattr(node, "text", None)
+            if not node_text:
+                continue
+            text_key = node_text.strip()
+            if not text_key or text_key in collected:
+                continue
+            metadata = dict(getattr(node, "metadata", {}) or {})
+            if getattr(node, "node_id", None):
+                metadata.setdefault("node_id", node.node_id)
+            collected[text_key] = {
+                "text": node_text,
+                "metadata": metadata,
+            }
+        timings["total"] = round((time.monotonic() - started) * 1000, 1)
+        print(f"[ChatbotTools] start_interview {len(keywords)} keywords, {len(collected)} questions, timings ms: {timings}")
 
         questions = list(collected.values())
         if not questions:
@@ -411,7 +787,9 @@ Cải thiện:
         session_source = session.get("source", "Software_QA")
         source_to_use = source if source else session_source
 
-        evaluation = await self.evaluate_user_answer(question_text, user_answer, source_to_use)
+        # The stored question carries its reference answer; vector search is only the fallback
+        reference_answer = await self._stored_reference_answer(qobj)
+        evaluation = await self.evaluate_user_answer(question_text, user_answer, source_to_use, reference_answer=reference_answer)
 
         self.interview_storage.append_interaction(
             session_id=session_id,
@@ -456,6 +834,12 @@ Cải thiện:
         }
 
     def get_tools(self):
+        """The agent's tools, wrapped once per ChatbotTools and then reused."""
+        if getattr(self, "_tools", None) is None:
+            self._tools = self._build_tools()
+        return self._tools
+
+    def _build_tools(self):
         start_interview_tool = FunctionTool.from_defaults(
             async_fn = self.start_interview,
             name = "start_interview",
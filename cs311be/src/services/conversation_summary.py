@@ -0,0 +1,129 @@
+import os
+import time
+import asyncio
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Dict, Optional
+from dotenv import load_dotenv
+from src.engines.llm_engine import get_llm_engine
+from src.engines.llm_telemetry import Histogram, llm_call_context
+from src.prompts.prompt import conversation_summary_prompt
+from src.services.chatbot_message import ChatbotMessageManagement
+from src.storage.chatbot_message import CRUDChatSummary
+from src.storage.session_memory_cache import SessionMemory, get_session_memory_cache
+load_dotenv()
+
+CHAT_SUMMARY_ENABLED = os.getenv("CHAT_SUMMARY_ENABLED", "1").lower() in ("1", "true", "yes")
+# Compact once the turns after the summary exceed this many tokens...
+CHAT_SUMMARY_TRIGGER_TOKENS = int(os.getenv("CHAT_SUMMARY_TRIGGER_TOKENS", "3000"))
+# ...always keeping this many of the newest turns verbatim
+CHAT_SUMMARY_KEEP_TURNS = int(os.getenv("CHAT_SUMMARY_KEEP_TURNS", "4"))
+# Length the summary is asked to stay under
+CHAT_SUMMARY_MAX_WORDS = int(os.getenv("CHAT_SUMMARY_MAX_WORDS", "350"))
+
+
+class ConversationSummarizer:
+    """
+    Folds the older turns of a chat session into a rolling summary stored next to the
+    session (chatbot_summary collection). Each run only summarizes the turns added since
+    the previous summary, and runs in the background after a turn has been answered.
+    """
+
+    def __init__(self, message_mgmt: Optional[ChatbotMessageManagement] = None):
+        self.storage = CRUDChatSummary()
+        self.message_mgmt = message_mgmt or ChatbotMessageManagement()
+        self.cache = get_session_memory_cache()
+        # One compaction per session at a time; also keeps the tasks referenced
+        self._running: Dict[str, asyncio.Task] = {}
+        self.runs = 0
+        self.failures = 0
+        self.turns_folded = 0
+        self.latency_ms = Histogram()
+
+    def load(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """The stored summary document of a session, if any."""
+        if not CHAT_SUMMARY_ENABLED:
+            return None
+        return self.storage.find_one_doc({"session_id": session_id})
+
+    def needs_compaction(self, session_memory: SessionMemory) -> bool:
+        return (
+            CHAT_SUMMARY_ENABLED
+            and session_memory.turns > CHAT_SUMMARY_KEEP_TURNS
+            and session_memory.history_tokens > CHAT_SUMMARY_TRIGGER_TOKENS
+        )
+
+    def schedule(self, session_id: str):
+        """Start a background compaction if the cached session has grown past the threshold."""
+        session_memory = self.cache.peek(session_id)
+        if session_memory is None or session_id in self._running or not self.needs_compaction(session_memory):
+            return
+        task = asyncio.create_task(self.compact(session_id, session_memory))
+        self._running[session_id] = task
+        task.add_done_callback(lambda _: self._running.pop(session_id, None))
+
+    async def compact(self, session_id: str, session_memory: SessionMemory):
+        started = time.monotonic()
+        # Everything except the newest KEEP_TURNS turns
+        until = session_memory.turn_at[-(CHAT_SUMMARY_KEEP_TURNS + 1)]
+        since = session_memory.summary_until
+        try:
+            if until is None:
+                return
+            # pymongo is synchronous: keep its round trips off the event loop
+            records = await asyncio.to_thread(self.message_mgmt.find_chat_records_since, session_id, since=since, until=until)
+            if not records:
+                return
+            previous = await asyncio.to_thread(self.storage.find_one_doc, {"session_id": session_id}) or {}
+            turns = "\n\n".join(
+                f"Candidate: {record.chat_message}\nInterviewer: {record.answer}" for record in records
+            )
+            prompt = conversation_summary_prompt.format(
+                max_words=CHAT_SUMMARY_MAX_WORDS,
+                previous_summary=previous.get("summary") or "(none)",
+                turns=turns,
+            )
+            with llm_call_context("summarize_conversation"):
+                response = await get_llm_engine().llm2.acomplete(prompt)
+            summary = (response.text or "").strip()
+            if not summary:
+                raise ValueError("empty summary")
+            summarized_turns = previous.get("summarized_turns", 0) + len(records)
+            await asyncio.to_thread(
+                self.storage.replace_one_doc,
+                {"session_id": session_id},
+                {
+                    "session_id": session_id,
+                    "summary": summary,
+                    "summarized_until": until,
+                    "summarized_turns": summarized_turns,
+                    "datetime": datetime.now(),
+                },
+                upsert=True,
+            )
+            self.cache.set_summary(session_id, summary, until, summarized_turns)
+            self.runs += 1
+            self.turns_folded += len(records)
+            self.latency_ms.observe((time.monotonic() - started) * 1000)
+            print(f"[ConversationSummarizer] Folded {len(records)} turns of session {session_id} ({summarized_turns} in total)")
+        except Exception as e:
+            # The verbatim history stays in place; the next turn retries
+            self.failures += 1
+            print(f"[ConversationSummarizer] Compaction of session {session_id} failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": CHAT_SUMMARY_ENABLED,
+            "trigger_tokens": CHAT_SUMMARY_TRIGGER_TOKENS,
+            "keep_turns": CHAT_SUMMARY_KEEP_TURNS,
+            "running": len(self._running),
+            "runs": self.runs,
+            "failures": self.failures,
+            "turns_folded": self.turns_folded,
+            "latency_ms": self.latency_ms.stats(),
+        }
+
+
+@lru_cache(maxsize=1)
+def get_conversation_summarizer() -> ConversationSummarizer:
+    return ConversationSummarizer()
@@ -4,9 +4,10 @@ import re
 from fastapi import UploadFile, HTTPException
 from llama_parse import LlamaParse
 from llama_index.core import SimpleDirectoryReader
-from src.prompts.resume_flow_prompt import RESUME_DETAILS_EXTRACTOR, JOB_DETAILS_EXTRACTOR, JOB_DETAILS_EXTRACTOR_V2,ADD_MISSING_INFORMATION_PROMPT,RESUME_GENERATOR, CALCULATE_MULTIPLE_ALIGNMENT_SCORE_PROMPT, RESUME_IMPROVEMENT_ANALYSIS_PROMPT,GIVE_CV_COMMENT_PROMPT,RESUME_WRITER_PERSONA, EXPERIENCE, SKILLS, PROJECTS, EDUCATIONS, CERTIFICATIONS, ACHIEVEMENTS
+from src.prompts.resume_flow_prompt import RESUME_WRITER_PERSONA
 from src.schemas.resume_flow_schemas import ResumeSchema, JobDetails, JobDetailsV2, CVCommentSchema, AlignmentScoreSchema, MultipleAlignmentScoreSchema
 from src.engines.resume_flow_llm_engine import LLMEngineResumeFlow
+from src.prompts.prompt_registry import get_prompt_registry
 from typing import List, Dict, Optional
 from src.schemas.resume_flow_schemas import Experiences, SkillSections, Projects, Educations, Certifications, Achievements
 from src.utils.text_utils import clean_string, extract_resume_text, calculate_cosine_similarity
@@ -24,6 +25,7 @@ class ResumeFlowService:
             continuous_mode=False,
         )
         self.llm_engine = LLMEngineResumeFlow(system_prompt=RESUME_WRITER_PERSONA)
+        self.prompts = get_prompt_registry()
 
     async def extract_cv(self, file: UploadFile) -> dict:
         """Extract content from CV file (PDF or DOCX) using ResumeFlow schema."""
@@ -43,15 +45,11 @@ class ResumeFlowService:
             )
             documents = await reader.aload_data()
             resume_text = "\n".join(doc.text for doc in documents)
-            resume_schema = ResumeSchema.schema()
-            prompt = RESUME_DETAILS_EXTRACTOR.format(
-                resume_text=resume_text,
-                format_instructions=json.dumps(resume_schema, indent=2, ensure_ascii=False)
-            )
+            prompt = self.prompts.render("RESUME_DETAILS_EXTRACTOR", resume_text=resume_text)
             response = await self.llm_engine.call_llm(
                 prompt=prompt,
                 response_format={"type": "json_object"},
-                use_mini=True
+                call_site="extract_cv"
             )
             try:
                 resume_json = json.loads(response)
@@ -107,15 +105,11 @@ class ResumeFlowService:
             if not job_description:
                 raise ValueError("Job description is empty after processing")
 
-            job_schema = JobDetails.schema()
-            prompt = JOB_DETAILS_EXTRACTOR.format(
-                job_description=job_description,
-                format_instructions=json.dumps(job_schema, indent=2, ensure_ascii=False),
-            )
+            prompt = self.prompts.render("JOB_DETAILS_EXTRACTOR", job_description=job_description)
             response = await self.llm_engine.call_llm(
                 prompt=prompt,
                 response_format={"type": "json_object"},
-                use_mini=True
+                call_site="extract_job_details"
             )
             try:
                 job_json = json.loads(response)
@@ -171,14 +165,11 @@ class ResumeFlowService:
             if not job_description:
                 raise ValueError("Job description is empty after processing")
 
-            job_schema = JobDetailsV2.schema()
-            prompt = JOB_DETAILS_EXTRACTOR_V2.format(
-                job_description=job_description,
-                format_instructions=json.dumps(job_schema, indent=2, ensure_ascii=False)
-            )
+            prompt = self.prompts.render("JOB_DETAILS_EXTRACTOR_V2", job_description=job_description)
             response = await self.llm_engine.call_llm(
                 prompt=prompt,
-                response_format={"type": "json_object"}
+                response_format={"type": "json_object"},
+                call_site="extract_job_details_v2"
             )
             try:
                 job_json = json.loads(response)
@@ -226,30 +217,21 @@ class ResumeFlowService:
             elif not job_description:
                 raise ValueError("Either job_description or file must be provided")
             
-            # Chuẩn bị schemas và prompts
-            job_schema = JobDetails.schema()
-            job_schema2 = JobDetailsV2.schema()
-            
-            prompt1 = JOB_DETAILS_EXTRACTOR.format(
-                job_description=job_description,
-                format_instructions=json.dumps(job_schema, indent=2, ensure_ascii=False)
-            )
-            
-            prompt2 = JOB_DETAILS_EXTRACTOR_V2.format(
-                job_description=job_description,
-                format_instructions=json.dumps(job_schema2, indent=2, ensure_ascii=False)
-            )
+            # Chuẩn bị prompts (schema đã được biên dịch sẵn trong registry)
+            prompt1 = self.prompts.render("JOB_DETAILS_EXTRACTOR", job_description=job_description)
+            prompt2 = self.prompts.render("JOB_DETAILS_EXTRACTOR_V2", job_description=job_description)
             
             # Chạy song song 2 LLM calls
             response1, response2 = await asyncio.gather(
                 self.llm_engine.call_llm(
                     prompt=prompt1,
                     response_format={"type": "json_object"},
-                    use_mini=True
+                    call_site="extract_job_details"
                 ),
                 self.llm_engine.call_llm(
                     prompt=prompt2,
-                    response_format={"type": "json_object"}
+                    response_format={"type": "json_object"},
+                    call_site="extract_job_details_v2"
                 )
             )
             
@@ -318,17 +300,18 @@ class ResumeFlowService:
                 return {}
 
             # Create prompt with all skill groups
-            prompt = CALCULATE_MULTIPLE_ALIGNMENT_SCORE_PROMPT.format(
+            prompt = self.prompts.render(
+                "CALCULATE_MULTIPLE_ALIGNMENT_SCORE_PROMPT",
                 all_skill_groups=json.dumps(all_skill_groups, indent=2, ensure_ascii=False),
                 resume_json=json.dumps(resume_data.dict(), indent=2, ensure_ascii=False),
                 job_json=json.dumps(job_data.dict(), indent=2, ensure_ascii=False),
-                format_instructions=json.dumps(MultipleAlignmentScoreSchema.schema(), indent=2, ensure_ascii=False)
             )
 
             # Single LLM call for all groups
             response = await self.llm_engine.call_llm(
                 prompt=prompt,
-                response_format={"type": "json_object"}
+                response_format={"type": "json_object"},
+                call_site="alignment_score"
             )
 
             try:
@@ -383,8 +366,8 @@ class ResumeFlowService:
                     processed_missing_info.append(processed_item)
 
             # Step 2: Create prompt with explicit schema instructions
-            prompt = ADD_MISSING_INFORMATION_PROMPT.format(
-                resume_schema=json.dumps(ResumeSchema.schema(), indent=2, ensure_ascii=False),
+            prompt = self.prompts.render(
+                "ADD_MISSING_INFORMATION_PROMPT",
                 resume_data=json.dumps(resume_data, indent=2, ensure_ascii=False),
                 missing_information=json.dumps(processed_missing_info, indent=2, ensure_ascii=False)
             )
@@ -392,7 +375,8 @@ class ResumeFlowService:
             # Step 3: Call LLM to merge the information
             response = await self.llm_engine.call_llm(
                 prompt=prompt,
-                response_format={"type": "json_object"}
+                response_format={"type": "json_object"},
+                call_site="add_missing_information"
             )
 
             # Step 4: Parse and validate response
@@ -443,17 +427,19 @@ class ResumeFlowService:
                 }
             }
 
-            # Step 3: Define section mapping
+            # Step 3: Define section mapping (prompts are compiled in the registry under the section name)
             section_mapping = {
-                "work_experience": {"prompt": EXPERIENCE, "schema": Experiences},
-                "skill_section": {"prompt": SKILLS, "schema": SkillSections},
-                "projects": {"prompt": PROJECTS, "schema": Projects},
-                "education": {"prompt": EDUCATIONS, "schema": Educations},
-                "certifications": {"prompt": CERTIFICATIONS, "schema": Certifications},
-                "achievements": {"prompt": ACHIEVEMENTS, "schema": Achievements},
+                "work_experience": {"schema": Experiences},
+                "skill_section": {"schema": SkillSections},
+                "projects": {"schema": Projects},
+                "education": {"schema": Educations},
+                "certifications": {"schema": Certifications},
+                "achievements": {"schema": Achievements},
             }
 
             resume_data_dict = resume_data.dict()
+            # Serialized once and shared by all six section prompts
+            job_description_json = json.dumps(job_data.dict(), indent=2, ensure_ascii=False)
             
             # Step 4: Process sections concurrently
             async def process_section(section, config):
@@ -466,22 +452,23 @@ class ResumeFlowService:
                         "achievements": resume_data_dict.get("achievements", [])
                     }
                     
-                    prompt = config["prompt"].format(
+                    prompt = self.prompts.render(
+                        section,
                         section_data=json.dumps(combined_achievements_data, indent=2, ensure_ascii=False),
-                        job_description=json.dumps(job_data.dict(), indent=2, ensure_ascii=False),
-                        format_instructions=json.dumps(config["schema"].schema(), indent=2, ensure_ascii=False)
+                        job_description=job_description_json,
                     )
                 else:
                     # Normal handling for other sections
-                    prompt = config["prompt"].format(
+                    prompt = self.prompts.render(
+                        section,
                         section_data=json.dumps(resume_data_dict[section], indent=2, ensure_ascii=False),
-                        job_description=json.dumps(job_data.dict(), indent=2, ensure_ascii=False),
-                        format_instructions=json.dumps(config["schema"].schema(), indent=2, ensure_ascii=False)
+                        job_description=job_description_json,
                     )
                 
                 response = await self.llm_engine.call_llm(
                     prompt=prompt,
-                    response_format={"type": "json_object"}
+                    response_format={"type": "json_object"},
+                    call_site=f"create_resume.{section}"
                 )
                 
                 try:
@@ -551,15 +538,16 @@ class ResumeFlowService:
     async def give_cv_comment_from_data(self, resume_data: dict, job_data: dict, alignment_scores: dict) -> dict:
         """Provide comments on the resume based on pre-extracted job and resume data and alignment scores."""
         try:
-            prompt = GIVE_CV_COMMENT_PROMPT.format(
+            prompt = self.prompts.render(
+                "GIVE_CV_COMMENT_PROMPT",
                 resume_json=json.dumps(resume_data, indent=2, ensure_ascii=False),
                 job_json=json.dumps(job_data, indent=2, ensure_ascii=False),
                 alignment_scores=json.dumps(alignment_scores, indent=2, ensure_ascii=False),
-                format_instructions=json.dumps(CVCommentSchema.schema(), indent=2, ensure_ascii=False)
             )
             response = await self.llm_engine.call_llm(
                 prompt=prompt,
-                response_format={"type": "json_object"}
+                response_format={"type": "json_object"},
+                call_site="cv_comment"
             )
             try:
                 result = json.loads(response)
@@ -600,9 +588,8 @@ class ResumeFlowService:
             if not text_1.strip() or not text_2.strip():
                 raise ValueError("One or both resume texts are empty after extraction")
             
-            # Get embeddings for both texts
-            embedding_1 = await self.llm_engine.get_embedding(text_1)
-            embedding_2 = await self.llm_engine.get_embedding(text_2)
+            # Get embeddings for both texts in one request
+            embedding_1, embedding_2 = await self.llm_engine.embed_many([text_1, text_2])
             
             # Calculate cosine similarity
             similarity = calculate_cosine_similarity(embedding_1, embedding_2)
@@ -634,7 +621,8 @@ class ResumeFlowService:
                 raise ValueError(f"Invalid resume data format: {str(e)}")
             
             # Create prompt for LLM analysis
-            prompt = RESUME_IMPROVEMENT_ANALYSIS_PROMPT.format(
+            prompt = self.prompts.render(
+                "RESUME_IMPROVEMENT_ANALYSIS_PROMPT",
                 original_resume_data=json.dumps(original_resume.dict(), indent=2, ensure_ascii=False),
                 enhanced_resume_data=json.dumps(enhanced_resume.dict(), indent=2, ensure_ascii=False)
             )
@@ -642,7 +630,8 @@ class ResumeFlowService:
             # Call LLM to analyze improvements
             response = await self.llm_engine.call_llm(
                 prompt=prompt,
-                response_format={"type": "json_object"}
+                response_format={"type": "json_object"},
+                call_site="resume_improvement"
             )
             
             # Parse LLM response
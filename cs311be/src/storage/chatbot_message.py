@@ -3,4 +3,9 @@ from src.storage.mongodb import CRUDDocuments
 class CRUDChatMessage(CRUDDocuments):
     def __init__(self):
         CRUDDocuments.__init__(self)
-        self.collection = CRUDDocuments.connection.db.chatbot_message
\ No newline at end of file
+        self.collection = CRUDDocuments.connection.db.chatbot_message
+
+class CRUDChatSummary(CRUDDocuments):
+    def __init__(self):
+        CRUDDocuments.__init__(self)
+        self.collection = CRUDDocuments.connection.db.chatbot_summary
@@ -0,0 +1,7 @@
+from src.storage.mongodb import CRUDDocuments
+
+
+class CRUDLLMCache(CRUDDocuments):
+    def __init__(self):
+        super().__init__()
+        self.collection = self.connection.db.llm_response_cache
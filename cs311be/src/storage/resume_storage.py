@@ -1,4 +1,5 @@
 from src.storage.mongodb import CRUDDocuments
+from src.storage.session_memory_cache import get_session_memory_cache
 from src.schemas.chatbot import ResumeData, JobData, SessionContext
 from datetime import datetime
 
@@ -24,7 +25,10 @@ class ResumeJobStorage:
             resume_data=resume_data,
             datetime=datetime.now()
         )
-        return self.resume_storage.insert_one_doc(resume_record.model_dump())
+        result = self.resume_storage.insert_one_doc(resume_record.model_dump())
+        # The cached agent memory holds the formatted CV/JD context
+        get_session_memory_cache().invalidate(session_id)
+        return result
     
     def save_job_data(self, session_id: str, job_data: dict):
         """Save job data for a session"""
@@ -33,7 +37,9 @@ class ResumeJobStorage:
             job_data=job_data,
             datetime=datetime.now()
         )
-        return self.job_storage.insert_one_doc(job_record.model_dump())
+        result = self.job_storage.insert_one_doc(job_record.model_dump())
+        get_session_memory_cache().invalidate(session_id)
+        return result
     
     def get_session_context(self, session_id: str) -> SessionContext:
         """Get both resume and job data for a session"""
@@ -97,4 +103,5 @@ class ResumeJobStorage:
                 "status": "active"
             }
             # Store in resume collection as a session tracker
-            self.resume_storage.insert_one_doc(session_record)
\ No newline at end of file
+            self.resume_storage.insert_one_doc(session_record)
+            get_session_memory_cache().invalidate(session_id)
\ No newline at end of file
@@ -0,0 +1,304 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional
+from dotenv import load_dotenv
+from llama_index.core.llms import ChatMessage
+from llama_index.core.utils import get_tokenizer
+load_dotenv()
+
+# Sessions kept in memory per process (0 disables the cache)
+SESSION_MEMORY_CACHE_MAX_SESSIONS = int(os.getenv("SESSION_MEMORY_CACHE_MAX_SESSIONS", "512"))
+# Idle time after which a session is reloaded from Mongo
+SESSION_MEMORY_CACHE_TTL_S = float(os.getenv("SESSION_MEMORY_CACHE_TTL_S", "1800"))
+# Total size of the cached message text across all sessions
+SESSION_MEMORY_CACHE_MAX_BYTES = int(os.getenv("SESSION_MEMORY_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# Tokens of conversation kept per session; older turns are dropped from the
+# cache since no memory window reaches them any more
+SESSION_MEMORY_RETAIN_TOKENS = int(os.getenv("SESSION_MEMORY_RETAIN_TOKENS", "50000"))
+# On a hit, fetch only the records newer than the cached ones (written by other workers)
+SESSION_MEMORY_SYNC = os.getenv("SESSION_MEMORY_SYNC", "1").lower() in ("1", "true", "yes")
+
+# Rough per-message overhead on top of the UTF-8 text
+_MESSAGE_OVERHEAD_BYTES = 200
+
+
+def _message_size(message: ChatMessage) -> int:
+    return len((message.content or "").encode("utf-8")) + _MESSAGE_OVERHEAD_BYTES
+
+
+def count_tokens(text: Optional[str]) -> int:
+    """Tokens as ChatMemoryBuffer counts them, so a window is trimmed exactly as planned."""
+    return len(get_tokenizer()(text or ""))
+
+
+def summary_message(summary: str) -> ChatMessage:
+    return ChatMessage(
+        role="user",
+        content=f"[CONVERSATION_SUMMARY]\n{summary}\n\nThis summarizes the earlier part of the interview; the most recent turns follow verbatim.",
+    )
+
+
+class SessionMemory:
+    """
+    Agent context of one chat session: the formatted CV/JD messages, the rolling summary
+    of compacted turns (if any) and the conversation since, with a token count per
+    message so a turn only looks at the tail.
+    """
+
+    def __init__(self, session_id: str, context_messages: List[ChatMessage], retain_tokens: int = SESSION_MEMORY_RETAIN_TOKENS):
+        self.session_id = session_id
+        self.context_messages = list(context_messages)
+        self.context_tokens = [count_tokens(m.content) for m in self.context_messages]
+        self.messages: List[ChatMessage] = []
+        self.tokens: List[int] = []
+        # Time of each turn, i.e. of messages[2 * i] and messages[2 * i + 1]
+        self.turn_at: List[Optional[datetime]] = []
+        self.summary: Optional[ChatMessage] = None
+        self.summary_tokens = 0
+        self.summary_until: Optional[datetime] = None
+        self.summarized_turns = 0
+        self.history_tokens = 0
+        self.retain_tokens = retain_tokens
+        # Set once old turns were dropped; the CV/JD context then lies outside any window
+        self.trimmed = False
+        self.last_message_at: Optional[datetime] = None
+        self.nbytes = sum(_message_size(m) for m in self.context_messages)
+        self.last_used = time.monotonic()
+
+    def add_turn(self, user_message: str, answer: str, at: Optional[datetime] = None) -> int:
+        """Append one user/assistant pair; returns the change in nbytes."""
+        before = self.nbytes
+        for role, content in (("user", user_message), ("assistant", answer)):
+            message = ChatMessage(role=role, content=content)
+            tokens = count_tokens(content)
+            self.messages.append(message)
+            self.tokens.append(tokens)
+            self.history_tokens += tokens
+            self.nbytes += _message_size(message)
+        self.turn_at.append(at)
+        if at is not None and (self.last_message_at is None or at > self.last_message_at):
+            self.last_message_at = at
+        self._trim()
+        return self.nbytes - before
+
+    def add_records(self, records: Iterable[Any]) -> int:
+        """Append ChatbotMessage records in the order given; returns the change in nbytes."""
+        delta = 0
+        for record in records:
+            delta += self.add_turn(record.chat_message, record.answer, record.datetime)
+        return delta
+
+    def _trim(self):
+        # Drop whole turns from the front, so the history still starts with a user message
+        while self.retain_tokens and self.history_tokens > self.retain_tokens and len(self.messages) > 2:
+            self._drop_first_turn()
+            self.trimmed = True
+
+    def _drop_first_turn(self):
+        self.turn_at.pop(0)
+        for _ in range(2):
+            self.history_tokens -= self.tokens.pop(0)
+            self.nbytes -= _message_size(self.messages.pop(0))
+
+    @property
+    def turns(self) -> int:
+        return len(self.turn_at)
+
+    def set_summary(self, summary: str, until: Optional[datetime], turns: int = 0) -> int:
+        """Replace the turns up to `until` by `summary`; returns the change in nbytes."""
+        before = self.nbytes
+        if self.summary is not None:
+            self.nbytes -= _message_size(self.summary)
+        self.summary = summary_message(summary)
+        self.summary_tokens = count_tokens(self.summary.content)
+        self.summary_until = until
+        self.summarized_turns = turns
+        self.nbytes += _message_size(self.summary)
+        while self.turn_at and until is not None and self.turn_at[0] is not None and self.turn_at[0] <= until:
+            self._drop_first_turn()
+        return self.nbytes - before
+
+    def _tail(self, token_budget: int):
+        """
+        Number of newest messages that fit `token_budget`, and their tokens. Whole
+        user/assistant turns only, so the tail never opens with an orphaned answer.
+        """
+        selected = 0
+        used = 0
+        for end in range(len(self.tokens), 0, -2):
+            tokens = sum(self.tokens[max(0, end - 2):end])
+            if used + tokens > token_budget:
+                break
+            used += tokens
+            selected += end - max(0, end - 2)
+        return selected, used
+
+    def window(self, token_budget: int, pinned_budget: Optional[int] = None) -> List[ChatMessage]:
+        """
+        Messages for the agent memory. Without a summary: the longest suffix of context +
+        conversation (in whole turns) that fits `token_budget`. Once a summary exists, the context and the
+        summary are always kept and the newest turns fill the rest of `pinned_budget`.
+        Walks back from the newest message, so the cost depends on the budget and not
+        on how long the conversation is.
+        """
+        if self.summary is not None:
+            pinned = self.context_messages + [self.summary]
+            remaining = (pinned_budget or token_budget) - sum(self.context_tokens) - self.summary_tokens
+            selected, _ = self._tail(max(0, remaining))
+            return pinned + self.messages[len(self.messages) - selected:]
+        selected, used = self._tail(token_budget)
+        if selected < len(self.messages):
+            return self.messages[len(self.messages) - selected:]
+        if self.trimmed:
+            return list(self.messages)
+        context = 0
+        for tokens in reversed(self.context_tokens):
+            if used + tokens > token_budget:
+                break
+            used += tokens
+            context += 1
+        return self.context_messages[len(self.context_messages) - context:] + self.messages
+
+
+class SessionMemoryCache:
+    """
+    Per-process LRU of SessionMemory objects, bounded by session count, idle TTL and
+    total bytes. Chat records written through this process are appended in place;
+    records written by other workers are picked up by the incremental sync on a hit.
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = SESSION_MEMORY_CACHE_MAX_SESSIONS,
+        ttl_s: float = SESSION_MEMORY_CACHE_TTL_S,
+        max_bytes: int = SESSION_MEMORY_CACHE_MAX_BYTES,
+    ):
+        self.max_sessions = max_sessions
+        self.ttl_s = ttl_s
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, SessionMemory]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.appended_turns = 0
+        self.synced_turns = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_sessions > 0
+
+    def get(self, session_id: str) -> Optional[SessionMemory]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is not None and self.ttl_s and now - entry.last_used > self.ttl_s:
+                self._remove(session_id)
+                self.expired += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            entry.last_used = now
+            self._entries.move_to_end(session_id)
+            return entry
+
+    def put(self, entry: SessionMemory) -> SessionMemory:
+        if not self.enabled:
+            return entry
+        with self._lock:
+            self._remove(entry.session_id)
+            entry.last_used = time.monotonic()
+            self._entries[entry.session_id] = entry
+            self.nbytes += entry.nbytes
+            self._evict()
+        return entry
+
+    def append_turn(self, session_id: str, user_message: str, answer: str, at: Optional[datetime] = None):
+        """Add a turn just persisted for `session_id`; no-op when it is not cached."""
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None:
+                return
+            self.nbytes += entry.add_turn(user_message, answer, at)
+            self.appended_turns += 1
+            self._evict()
+
+    def extend(self, session_id: str, records: List[Any]):
+        """Add records fetched by the incremental sync."""
+        if not records:
+            return
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None:
+                return
+            self.nbytes += entry.add_records(records)
+            self.synced_turns += len(records)
+            self._evict()
+
+    def set_summary(self, session_id: str, summary: str, until: Optional[datetime], turns: int):
+        """Swap the turns a new summary covers for the summary; no-op when not cached."""
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None:
+                return
+            self.nbytes += entry.set_summary(summary, until, turns)
+            self._evict()
+
+    def peek(self, session_id: str) -> Optional[SessionMemory]:
+        """The cached entry without touching recency or the hit counters."""
+        with self._lock:
+            return self._entries.get(session_id)
+
+    def invalidate(self, session_id: str):
+        with self._lock:
+            if self._remove(session_id):
+                self.invalidations += 1
+
+    def _remove(self, session_id: str) -> bool:
+        entry = self._entries.pop(session_id, None)
+        if entry is None:
+            return False
+        self.nbytes -= entry.nbytes
+        return True
+
+    def _evict(self):
+        # Least recently used first; the newest session always stays, even if it alone
+        # exceeds the byte budget
+        while len(self._entries) > 1 and (len(self._entries) > self.max_sessions or self.nbytes > self.max_bytes):
+            session_id, entry = self._entries.popitem(last=False)
+            self.nbytes -= entry.nbytes
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "sessions": len(self._entries),
+                "max_sessions": self.max_sessions,
+                "bytes": self.nbytes,
+                "max_bytes": self.max_bytes,
+                "ttl_s": self.ttl_s,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "expired": self.expired,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "appended_turns": self.appended_turns,
+                "synced_turns": self.synced_turns,
+            }
+
+
+@lru_cache(maxsize=1)
+def get_session_memory_cache() -> SessionMemoryCache:
+    return SessionMemoryCache()
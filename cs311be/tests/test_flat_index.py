@@ -0,0 +1,66 @@
+import os
+import numpy as np
+from src.engines.flat_index import CURRENT_FILE, FlatIndex, export_path, has_flat_index, write_flat_index
+
+SOURCES = ["Backend_QA", "Backend_QA", "Backend_QA", "Fontend_QA", "Fontend_QA", "SQL"]
+
+
+def _export(directory, count=len(SOURCES), offset=0):
+    rng = np.random.default_rng(offset)
+    ids = [f"q{offset + i}" for i in range(count)]
+    metadatas = [{"source": SOURCES[i % len(SOURCES)], "index": i} for i in range(count)]
+    vectors = rng.normal(size=(count, 8)).astype(np.float32)
+    write_flat_index(str(directory), ids, [f"question {i}" for i in ids], metadatas, vectors)
+    return ids, vectors
+
+
+def test_search_returns_best_rows_first(tmp_path):
+    ids, vectors = _export(tmp_path)
+    index = FlatIndex(str(tmp_path))
+    rows = index.search(vectors[4], top_k=3)
+    assert rows[0][0] == 4
+    assert abs(rows[0][1] - 1.0) < 1e-5
+    assert [score for _, score in rows] == sorted((score for _, score in rows), reverse=True)
+
+
+def test_search_with_filters_only_returns_matching_rows(tmp_path):
+    _, vectors = _export(tmp_path)
+    index = FlatIndex(str(tmp_path))
+    # Contiguous rows (a slice) and scattered rows (an index array) map back to global rows
+    assert {row for row, _ in index.search(vectors[4], 10, {"source": "Fontend_QA"})} == {3, 4}
+    assert {row for row, _ in index.search(vectors[0], 10, {"source": ["Backend_QA", "SQL"]})} == {0, 1, 2, 5}
+    assert index.search(vectors[4], 1, {"source": ["SQL", "Fontend_QA"]})[0][0] == 4
+    assert index.search(vectors[0], 10, {"source": "missing"}) == []
+    assert [row for row, _ in index.search(vectors[0], 10, {"source": "Backend_QA", "index": 1})] == [1]
+
+
+def test_reexport_switches_both_files_together(tmp_path):
+    _export(tmp_path, offset=0)
+    old = FlatIndex(str(tmp_path))
+    _export(tmp_path, offset=100)
+    _export(tmp_path, offset=200)
+    new = FlatIndex(str(tmp_path))
+    assert new.export_id != old.export_id
+    assert new.ids[0] == "q200"
+    # The mapping held by a running worker stays intact
+    assert old.ids[0] == "q0" and old.vectors.shape == (len(SOURCES), 8)
+    versions = sorted(e for e in os.listdir(tmp_path) if e.startswith("v-"))
+    assert len(versions) == 2
+    with open(os.path.join(tmp_path, CURRENT_FILE)) as f:
+        live = f.read()
+    assert live == f"v-{new.export_id}" and live in versions
+    assert export_path(str(tmp_path)) == os.path.join(str(tmp_path), live)
+    assert not [e for e in os.listdir(tmp_path) if e.endswith(".tmp")]
+
+
+def test_unexported_directory(tmp_path):
+    assert not has_flat_index(str(tmp_path))
+    _export(tmp_path)
+    assert has_flat_index(str(tmp_path))
+
+
+def test_from_rows_builds_in_memory_index():
+    index = FlatIndex.from_rows(["a", "b"], ["A", "B"], [{"source": "x"}, {"source": "y"}], [[1, 0], [0, 2]])
+    assert index.search([0, 1], 1) == [(1, 1.0)]
+    assert index.node(1).metadata == {"source": "y"}
+    assert len(FlatIndex.from_rows([], [], [], [])) == 0
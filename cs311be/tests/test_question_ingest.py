@@ -0,0 +1,52 @@
+from src.engines.question_bank import question_nodes
+from src.engines.question_ingest import QuestionIngestor, _chroma_record
+from src.engines.vector_store import VectorStoreManager
+
+
+def _records(source, count, answer="answer"):
+    return [{"source": source, "question": f"{source} question {i}", "answer": f"{answer} {i}", "index": i} for i in range(count)]
+
+
+def _ingestor(tmp_path, nodes):
+    manager = VectorStoreManager(path=str(tmp_path))
+    ingestor = QuestionIngestor("test_collection", manager=manager, embedding_service=object())
+    records = [_chroma_record(node) for node in nodes]
+    ingestor.collection.upsert(
+        ids=[r["id"] for r in records],
+        documents=[r["document"] for r in records],
+        metadatas=[r["metadata"] for r in records],
+        embeddings=[[float(i), 1.0] for i in range(len(records))],
+    )
+    return ingestor
+
+
+def test_plan_of_an_unchanged_bank_is_empty(tmp_path):
+    nodes = question_nodes(_records("Backend_QA", 3))
+    plan = _ingestor(tmp_path, nodes).plan(nodes)
+    assert plan == {"embed": [], "update": [], "delete": [], "unchanged": 3}
+
+
+def test_plan_sorts_changes_by_what_they_touch(tmp_path):
+    stored = question_nodes(_records("Backend_QA", 4))
+    ingestor = _ingestor(tmp_path, stored)
+    records = _records("Backend_QA", 3)
+    records[0]["answer"] = "rewritten"          # embedded text changed
+    records[1]["index"] = 40                    # metadata only
+    records.append({"source": "Backend_QA", "question": "brand new", "answer": "a", "index": 9})
+    nodes = question_nodes(records)
+    plan = ingestor.plan(nodes)
+    assert [n.node_id for n in plan["embed"]] == [nodes[0].node_id, nodes[3].node_id]
+    assert [n.node_id for n in plan["update"]] == [nodes[1].node_id]
+    assert plan["delete"] == [stored[3].node_id]
+    assert plan["unchanged"] == 1
+
+
+def test_plan_only_deletes_from_the_given_sources(tmp_path):
+    backend, sql = question_nodes(_records("Backend_QA", 2)), question_nodes(_records("SQL", 2))
+    ingestor = _ingestor(tmp_path, backend + sql)
+    # A partial sync of Backend_QA without its second question leaves SQL alone
+    plan = ingestor.plan(backend[:1], sources={"Backend_QA"})
+    assert plan["delete"] == [backend[1].node_id]
+    assert plan["unchanged"] == 1
+    # A full sync prunes every id the banks no longer carry
+    assert sorted(ingestor.plan(backend[:1])["delete"]) == sorted([backend[1].node_id] + [n.node_id for n in sql])
@@ -0,0 +1,65 @@
+from datetime import datetime, timedelta
+from llama_index.core.llms import ChatMessage
+from src.storage.session_memory_cache import SessionMemory, count_tokens
+
+T0 = datetime(2026, 1, 1, 9, 0)
+
+
+def _memory(turns=6, words=20, retain_tokens=0):
+    memory = SessionMemory("s1", [ChatMessage(role="user", content="CV and JD")], retain_tokens=retain_tokens)
+    for i in range(turns):
+        memory.add_turn(f"question {i} " + "word " * words, f"answer {i} " + "word " * words, T0 + timedelta(minutes=i))
+    return memory
+
+
+def test_window_with_summary_keeps_whole_turns():
+    memory = _memory()
+    memory.set_summary("earlier turns", T0 + timedelta(minutes=1), turns=2)
+    pinned = sum(memory.context_tokens) + memory.summary_tokens
+    # Room for one answer more than three whole turns: the extra answer must not be included
+    budget = pinned + sum(memory.tokens[-6:]) + memory.tokens[-7]
+    window = memory.window(budget, pinned_budget=budget)
+    assert window[0].content == "CV and JD"
+    assert window[1].content.startswith("[CONVERSATION_SUMMARY]")
+    tail = window[2:]
+    assert len(tail) == 6
+    assert tail[0].role == "user" and tail[0].content.startswith("question 3")
+
+
+def test_window_without_summary_includes_context_when_everything_fits():
+    memory = _memory(turns=2)
+    window = memory.window(10_000)
+    assert [m.content for m in window[:1]] == ["CV and JD"]
+    assert len(window) == 5
+
+
+def test_window_without_summary_is_the_newest_whole_turns():
+    memory = _memory(turns=4)
+    budget = sum(memory.tokens[-4:]) + 1
+    window = memory.window(budget)
+    assert len(window) == 4
+    assert window[0].role == "user" and window[0].content.startswith("question 2")
+
+
+def test_set_summary_drops_the_turns_it_covers():
+    memory = _memory(turns=5)
+    before_bytes = memory.nbytes
+    delta = memory.set_summary("turns 0-2", T0 + timedelta(minutes=2), turns=3)
+    assert memory.turns == 2
+    assert memory.messages[0].content.startswith("question 3")
+    assert memory.history_tokens == sum(memory.tokens)
+    assert memory.nbytes == before_bytes + delta
+    assert memory.summary_tokens == count_tokens(memory.summary.content)
+    # A newer summary replaces the old one instead of stacking
+    memory.set_summary("turns 0-3", T0 + timedelta(minutes=3), turns=4)
+    assert memory.turns == 1 and memory.summarized_turns == 4
+    assert memory.window(10_000)[1].content.count("[CONVERSATION_SUMMARY]") == 1
+
+
+def test_retain_tokens_trims_whole_turns_and_hides_context():
+    memory = _memory(turns=6, retain_tokens=120)
+    assert memory.trimmed
+    assert memory.history_tokens <= 120
+    assert len(memory.messages) % 2 == 0 and memory.messages[0].role == "user"
+    assert memory.window(10_000)[0].role == "user"
+    assert "CV and JD" not in [m.content for m in memory.window(10_000)]
@@ -0,0 +1,113 @@
+import asyncio
+import pytest
+from src.engines.single_flight import SingleFlight
+
+
+def test_concurrent_callers_share_one_call():
+    async def scenario():
+        flight, calls = SingleFlight("test"), []
+
+        async def call():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "answer"
+
+        results = await asyncio.gather(*(flight.do("k", call) for _ in range(5)))
+        return results, calls, flight.stats()
+
+    results, calls, stats = asyncio.run(scenario())
+    assert results == ["answer"] * 5
+    assert len(calls) == 1
+    assert stats == {"leaders": 1, "coalesced": 4, "in_flight": 0}
+
+
+def test_cancelled_waiter_leaves_shared_call_running():
+    async def scenario():
+        flight = SingleFlight("test")
+
+        async def call():
+            await asyncio.sleep(0.02)
+            return "answer"
+
+        a = asyncio.ensure_future(flight.do("k", call))
+        b = asyncio.ensure_future(flight.do("k", call))
+        await asyncio.sleep(0)
+        a.cancel()
+        return await b, a
+
+    result, cancelled = asyncio.run(scenario())
+    assert result == "answer"
+    assert cancelled.cancelled()
+
+
+def test_last_waiter_cancelling_cancels_the_call():
+    async def scenario():
+        flight, started = SingleFlight("test"), asyncio.Event()
+        cancelled = []
+
+        async def call():
+            started.set()
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+
+        a = asyncio.ensure_future(flight.do("k", call))
+        await started.wait()
+        a.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await a
+        await asyncio.sleep(0)
+        return cancelled, flight.stats()
+
+    cancelled, stats = asyncio.run(scenario())
+    assert cancelled == [True]
+    assert stats["in_flight"] == 0
+
+
+def test_waiters_of_a_finished_flight_do_not_affect_the_next_one():
+    async def scenario():
+        flight = SingleFlight("test")
+        first_done = asyncio.Event()
+
+        async def first():
+            await first_done.wait()
+            return 1
+
+        async def second():
+            await asyncio.sleep(0.02)
+            return 2
+
+        # Two callers wait on flight 1; it finishes and is forgotten before they wake up
+        old = [asyncio.ensure_future(flight.do("k", first)) for _ in range(2)]
+        await asyncio.sleep(0)
+        first_done.set()
+        await asyncio.sleep(0)
+        # Flight 2 starts (A) and is joined (B) while flight 1's callers are still unwinding
+        a = asyncio.ensure_future(flight.do("k", second))
+        b = asyncio.ensure_future(flight.do("k", second))
+        await asyncio.sleep(0)
+        assert [await t for t in old] == [1, 1]
+        a.cancel()
+        return await b, a
+
+    result, a = asyncio.run(scenario())
+    assert result == 2
+    assert a.cancelled()
+
+
+def test_failure_reaches_every_waiter_and_is_forgotten():
+    async def scenario():
+        flight = SingleFlight("test")
+
+        async def call():
+            await asyncio.sleep(0.01)
+            raise ValueError("boom")
+
+        results = await asyncio.gather(*(flight.do("k", call) for _ in range(3)), return_exceptions=True)
+        return results, flight.stats()
+
+    results, stats = asyncio.run(scenario())
+    assert all(isinstance(r, ValueError) for r in results)
+    assert stats["in_flight"] == 0